@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.db.supabase import supabase_admin
 from app.db.auth import verify_user
+from app.db.queries import fetch_prediction_access
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any
 from fastapi import Request
@@ -29,34 +30,17 @@ async def submit_feedback(
     request: Request,
     user=Depends(verify_user)
 ):
-    # 1️⃣ Ensure prediction exists
-    pred_res = supabase_admin.table("predictions") \
-        .select("id, raw_image_id") \
-        .eq("id", prediction_id) \
-        .single() \
-        .execute()
-
-    prediction = pred_res.data
-    if not prediction:
+    # 1️⃣ Prediction + owner + existing feedback (single query)
+    access = fetch_prediction_access(prediction_id)
+    if not access:
         raise HTTPException(status_code=404, detail="Prediction not found")
 
     # 2️⃣ Ownership check (doctor can only give feedback on their own cases)
-    raw_res = supabase_admin.table("raw_images") \
-        .select("doctor_id") \
-        .eq("id", prediction["raw_image_id"]) \
-        .single() \
-        .execute()
-
-    if not raw_res.data or raw_res.data["doctor_id"] != user.id:
+    if access["doctor_id"] != user.id:
         raise HTTPException(status_code=403, detail="Not authorized to submit feedback")
 
     # 3️⃣ Prevent duplicate feedback
-    existing = supabase_admin.table("prediction_feedback") \
-        .select("id") \
-        .eq("prediction_id", prediction_id) \
-        .execute()
-
-    if existing.data:
+    if access["feedback"]:
         raise HTTPException(
             status_code=400,
             detail="Feedback already submitted for this prediction"
@@ -134,37 +118,16 @@ async def get_feedback(
     prediction_id: str,
     user=Depends(verify_user)
 ):
-    # 1️⃣ Check prediction exists
-    pred_res = supabase_admin.table("predictions") \
-        .select("id, raw_image_id") \
-        .eq("id", prediction_id) \
-        .single() \
-        .execute()
-
-    prediction = pred_res.data
-    if not prediction:
+    # 1️⃣ Prediction + owner + feedback (single query)
+    access = fetch_prediction_access(prediction_id)
+    if not access:
         raise HTTPException(status_code=404, detail="Prediction not found")
 
     # 2️⃣ Ownership check
-    raw_res = supabase_admin.table("raw_images") \
-        .select("doctor_id") \
-        .eq("id", prediction["raw_image_id"]) \
-        .single() \
-        .execute()
-
-    if not raw_res.data or raw_res.data["doctor_id"] != user.id:
+    if access["doctor_id"] != user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view feedback")
 
-    # 3️⃣ Fetch feedback
-    res = supabase_admin.table("prediction_feedback") \
-        .select("*") \
-        .eq("prediction_id", prediction_id) \
-        .execute()
-
-    if not res.data:
-        return {"success": True, "feedback": None}
-
     return {
         "success": True,
-        "feedback": res.data[0]
+        "feedback": access["feedback"]
     }
@@ -83,6 +83,51 @@ import uuid
 router = APIRouter(prefix="/images", tags=["Images"])
 
 
+def build_raw_image_path(doctor_id: str, patient_id: str, image_id: str, filename: str) -> str:
+    """Storage path for a raw upload."""
+    ext = filename.split(".")[-1]
+    #raw images path with out raw prefix
+    # file_path = f"raw/{doctor_id}/{patient_id}/{image_id}.{ext}"
+    #raw images path with out raw prefix
+    return f"raw/doctor_{doctor_id}/patient_{patient_id}/image_{image_id}.{ext}"
+
+
+def is_supported_upload(content_type: str, filename: str) -> bool:
+    """Images, plus DICOM (browsers often send .dcm as application/octet-stream)."""
+    if content_type and (content_type.startswith("image/") or content_type == "application/dicom"):
+        return True
+    return (filename or "").lower().endswith(".dcm")
+
+
+def upload_raw_to_storage(file_path: str, file_bytes: bytes, content_type: str) -> str:
+    """
+    Uploads raw image bytes to Supabase Storage and returns a signed URL.
+    Blocking (network I/O) - call from a worker thread inside async routes.
+    """
+    bucket = supabase_admin.storage.from_(STORAGE_BUCKET)
+    bucket.upload(file_path, file_bytes, {"content-type": content_type})
+
+    signed_url = bucket.create_signed_url(file_path, 3600 * 24 * 7) # 1 week expiration
+
+    if isinstance(signed_url, dict):
+        signed_url = signed_url.get("signedURL") or signed_url.get("signed_url")
+
+    return signed_url
+
+
+def insert_raw_image_record(image_id: str, doctor_id: str, patient_id: str, file_path: str, signed_url: str) -> dict:
+    """Inserts the raw_images row and returns it."""
+    record = {
+        "id": image_id,
+        "doctor_id": doctor_id,
+        "patient_id": patient_id,
+        "file_path": file_path,
+        "file_url": signed_url
+    }
+    res = supabase_admin.table("raw_images").insert(record).execute()
+    return res.data[0] if res.data else record
+
+
 @router.post("/upload-raw")
 async def upload_raw_image(
     request: Request,
@@ -92,31 +137,16 @@ async def upload_raw_image(
 ):
     doctor_id = user.id
 
-    # Validate image
-    if not file.content_type or not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Only image files allowed")
+    # Validate image (or DICOM)
+    if not is_supported_upload(file.content_type, file.filename):
+        raise HTTPException(status_code=400, detail="Only image or DICOM files allowed")
 
     image_id = str(uuid.uuid4())
-    ext = file.filename.split(".")[-1]
-    #raw images path with out raw prefix
-    # file_path = f"raw/{doctor_id}/{patient_id}/{image_id}.{ext}"
-    #raw images path with out raw prefix
-    file_path = f"raw/doctor_{doctor_id}/patient_{patient_id}/image_{image_id}.{ext}"
+    file_path = build_raw_image_path(doctor_id, patient_id, image_id, file.filename)
     file_bytes = await file.read()
 
     try:
-        supabase_admin.storage.from_(STORAGE_BUCKET).upload(
-            file_path,
-            file_bytes,
-            {"content-type": file.content_type}
-        )
-
-        signed_url = supabase_admin.storage.from_(STORAGE_BUCKET) \
-            .create_signed_url(file_path, 3600 * 24 * 7) # 1 week expiration
-
-        if isinstance(signed_url, dict):
-            signed_url = signed_url.get("signedURL") or signed_url.get("signed_url")
-
+        signed_url = upload_raw_to_storage(file_path, file_bytes, file.content_type)
     except Exception as e:
         error_msg = str(e)
         log_event(
@@ -131,13 +161,7 @@ async def upload_raw_image(
         )
         raise HTTPException(status_code=500, detail=f"Storage failed: {error_msg}")
 
-    supabase_admin.table("raw_images").insert({
-        "id": image_id,
-        "doctor_id": doctor_id,
-        "patient_id": patient_id,
-        "file_path": file_path,
-        "file_url": signed_url
-    }).execute()
+    insert_raw_image_record(image_id, doctor_id, patient_id, file_path, signed_url)
 
     # 4️⃣ Log success
     log_event(
@@ -1,18 +1,29 @@
 # backend/app/api/inference.py
 
-from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from fastapi import APIRouter, Depends, HTTPException, Body, Request, UploadFile, File, Form, BackgroundTasks, WebSocket, WebSocketDisconnect, Query, status
+from fastapi.responses import StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from PIL import Image
+import asyncio
+import json
+import time
 import uuid
 import io
 
 from app.db.auth import verify_user
 from app.db.supabase import supabase_admin, STORAGE_BUCKET
-from app.services.inference.inference_pipeline import InferencePipeline
+from app.api.images import build_raw_image_path, upload_raw_to_storage, insert_raw_image_record, is_supported_upload
+from app.api.reports import prerender_report
+from app.services.inference.model_registry import model_registry
+from app.services.inference.live import LatestFrame, LiveSession
+from app.services.inference.shadow import SHADOW_ENABLED, shadow_evaluator
+from app.services.preprocessing.dicom import DicomClip, is_dicom
+from app.utils.latency import request_latency
 from app.utils.logger import log_event
 from app.services.explainability.response_generator import ResponseGenerator
 
 router = APIRouter(prefix="/inference", tags=["Inference"])
-pipeline = InferencePipeline()
 
 
 def convert_to_grayscale(image_bytes: bytes) -> bytes:
@@ -28,60 +39,41 @@ def convert_to_grayscale(image_bytes: bytes) -> bytes:
     return out.getvalue()
 
 
-# ─────────────────────────────────────────────
-# PRIMARY INFERENCE ENDPOINT (FAST - NO LLM)
-# ─────────────────────────────────────────────
+async def run_pipeline(raw_bytes: bytes) -> dict:
+    """Single image, or the aggregated assessment of a DICOM clip."""
+    # The whole run uses the models active when it started (see model_registry.py)
+    with model_registry.lease() as pipeline:
+        if is_dicom(raw_bytes):
+            return await pipeline.run_clip(DicomClip(raw_bytes))
+        return await pipeline.run(raw_bytes)
 
-@router.post("/run")
-async def run_inference(
-    request: Request,
-    image_id: uuid.UUID = Body(..., embed=True),
-    user=Depends(verify_user)
-):
-    """
-    Run ML inference pipeline on an uploaded raw image.
 
-    - Fetch image
-    - Run ROI + Feature classifier + TI-RADS engine
-    - Store processed image
-    - Save prediction (WITHOUT AI explanation)
-    """
+def report_image_bytes(raw_bytes: bytes, inference: dict) -> bytes:
+    """Image the report is drawn on - for a DICOM clip, its representative frame."""
+    if is_dicom(raw_bytes):
+        return inference["processed_image"]
+    return raw_bytes
 
-    # 1️⃣ Fetch raw image record
-    res = (
-        supabase_admin.table("raw_images")
-        .select("*")
-        .eq("id", str(image_id))
-        .single()
-        .execute()
-    )
-
-    raw_image = res.data
-    if not raw_image:
-        raise HTTPException(status_code=404, detail="Raw image not found")
 
-    # 2️⃣ Download raw image bytes from Supabase Storage
+def _store_inference_result(
+    request: Request,
+    user,
+    raw_image: dict,
+    raw_bytes: bytes,
+    inference: dict
+) -> dict:
+    """
+    Persists a finished pipeline run for `raw_image`:
+    processed (grayscale) image, processed_images row, prediction row and log.
+    Returns the inserted prediction.
+    """
     bucket = supabase_admin.storage.from_(STORAGE_BUCKET)
-    try:
-        raw_bytes = bucket.download(raw_image["file_path"])
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to download image: {str(e)}"
-        )
+    image_id = raw_image["id"]
 
-    # 3️⃣ Run inference pipeline (FAST LOCAL ML)
+    # 4️⃣ Optional preprocessing (grayscale) - the pipeline already encoded
+    # it from its decoded frame; only decode again if it did not
     try:
-        inference = await pipeline.run(raw_bytes)
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Inference pipeline failed: {str(e)}"
-        )
-
-    # 4️⃣ Optional preprocessing (grayscale)
-    try:
-        processed_bytes = convert_to_grayscale(raw_bytes)
+        processed_bytes = inference.get("processed_image") or convert_to_grayscale(raw_bytes)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -176,11 +168,77 @@ async def run_inference(
             "tirads": inference["tirads"],
             "confidence": inference["confidence"],
             "roi_score": inference.get("roi_score", 0.0),
-            "inference_time_ms": inference["inference_time_ms"]
+            "inference_time_ms": inference["inference_time_ms"],
+            "stages": inference.get("stages")
         },
         error_code="INFERENCE_OK"
     )
 
+    return prediction
+
+
+# ─────────────────────────────────────────────
+# PRIMARY INFERENCE ENDPOINT (FAST - NO LLM)
+# ─────────────────────────────────────────────
+
+@router.post("/run")
+async def run_inference(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    image_id: uuid.UUID = Body(..., embed=True),
+    user=Depends(verify_user)
+):
+    """
+    Run ML inference pipeline on an uploaded raw image.
+
+    - Fetch image
+    - Run ROI + Feature classifier + TI-RADS engine
+    - Store processed image
+    - Save prediction (WITHOUT AI explanation)
+    """
+
+    # 1️⃣ Fetch raw image record
+    res = (
+        supabase_admin.table("raw_images")
+        .select("*")
+        .eq("id", str(image_id))
+        .single()
+        .execute()
+    )
+
+    raw_image = res.data
+    if not raw_image:
+        raise HTTPException(status_code=404, detail="Raw image not found")
+
+    # 2️⃣ Download raw image bytes from Supabase Storage
+    bucket = supabase_admin.storage.from_(STORAGE_BUCKET)
+    try:
+        raw_bytes = bucket.download(raw_image["file_path"])
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to download image: {str(e)}"
+        )
+
+    # 3️⃣ Run inference pipeline (FAST LOCAL ML)
+    try:
+        inference = await run_pipeline(raw_bytes)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Inference pipeline failed: {str(e)}"
+        )
+
+    # 4️⃣ - 9️⃣ Persist processed image + prediction
+    prediction = _store_inference_result(request, user, raw_image, raw_bytes, inference)
+
+    # 🔟 Pre-render the PDF report after the response is sent
+    background_tasks.add_task(prerender_report, prediction["id"], report_image_bytes(raw_bytes, inference))
+
+    # 1️⃣1️⃣ Candidate models re-run a sample of requests (dropped under load)
+    if SHADOW_ENABLED:
+        background_tasks.add_task(shadow_evaluator.submit, raw_bytes, inference, prediction["id"])
+
     return {
         "success": True,
         "prediction": prediction,
@@ -188,13 +246,244 @@ async def run_inference(
     }
 
 
+# ─────────────────────────────────────────────
+# COMBINED UPLOAD + INFERENCE ENDPOINT
+# ─────────────────────────────────────────────
+
+@router.post("/upload-and-run")
+async def upload_and_run_inference(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    patient_id: str = Form(...),
+    file: UploadFile = File(...),
+    user=Depends(verify_user)
+):
+    """
+    Upload a raw image and run inference on it in a single request.
+
+    - Inference runs on the in-memory upload bytes
+    - The raw object is written to storage concurrently (worker thread)
+    - No storage download on the critical path
+    - Returns both the raw image record and the prediction
+    """
+    doctor_id = user.id
+
+    # 1️⃣ Validate image (or DICOM)
+    if not is_supported_upload(file.content_type, file.filename):
+        raise HTTPException(status_code=400, detail="Only image or DICOM files allowed")
+
+    image_id = str(uuid.uuid4())
+    file_path = build_raw_image_path(doctor_id, patient_id, image_id, file.filename)
+    raw_bytes = await file.read()
+
+    # 2️⃣ Start the raw storage upload right away (run_in_executor submits
+    # immediately, so it overlaps with the CPU-bound pipeline below)
+    loop = asyncio.get_running_loop()
+    upload_future = loop.run_in_executor(
+        None, upload_raw_to_storage, file_path, raw_bytes, file.content_type
+    )
+
+    # 3️⃣ Run inference pipeline on the uploaded bytes
+    inference = None
+    inference_error = None
+    try:
+        inference = await run_pipeline(raw_bytes)
+    except Exception as e:
+        inference_error = e
+
+    # 4️⃣ Wait for the raw upload and record it
+    try:
+        signed_url = await upload_future
+    except Exception as e:
+        error_msg = str(e)
+        log_event(
+            level="ERROR",
+            action="UPLOAD_IMAGE_ERROR",
+            request_id=request.state.request_id,
+            actor_id=user.id,
+            actor_role="doctor",
+            resource_type="patient",
+            resource_id=patient_id,
+            error_message=error_msg
+        )
+        raise HTTPException(status_code=500, detail=f"Storage failed: {error_msg}")
+
+    raw_image = insert_raw_image_record(image_id, doctor_id, patient_id, file_path, signed_url)
+
+    log_event(
+        level="INFO",
+        action="UPLOAD_RAW_IMAGE",
+        request_id=request.state.request_id,
+        actor_id=user.id,
+        actor_role="doctor",
+        resource_type="raw_image",
+        resource_id=image_id,
+        metadata={
+            "patient_id": patient_id,
+            "filename": file.filename
+        },
+        error_code="UPLOAD_OK"
+    )
+
+    # The raw image is stored either way, so a failed run can be retried via /inference/run
+    if inference_error is not None:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Inference pipeline failed: {str(inference_error)}"
+        )
+
+    # 5️⃣ Persist processed image + prediction
+    prediction = _store_inference_result(request, user, raw_image, raw_bytes, inference)
+
+    # 🔟 Pre-render the PDF report after the response is sent
+    background_tasks.add_task(prerender_report, prediction["id"], report_image_bytes(raw_bytes, inference))
+
+    # 1️⃣1️⃣ Candidate models re-run a sample of requests (dropped under load)
+    if SHADOW_ENABLED:
+        background_tasks.add_task(shadow_evaluator.submit, raw_bytes, inference, prediction["id"])
+
+    return {
+        "success": True,
+        "image_id": image_id,
+        "image_url": signed_url,
+        "raw_image": raw_image,
+        "prediction": prediction,
+        "bounding_box": inference["bounding_box"]
+    }
+
+
+# ─────────────────────────────────────────────
+# LIVE PROBE FEED (WEBSOCKET)
+# ─────────────────────────────────────────────
+
+@router.websocket("/live")
+async def live_inference(websocket: WebSocket, token: str = Query(...)):
+    """
+    Real-time TI-RADS feedback on a probe feed.
+
+    - Client -> server: binary messages, one encoded frame (JPEG / PNG) each
+    - Server -> client: {"type": "result", "seq", "tirads", "bounding_box",
+      "roi_source", "classified_seq", "latency_ms", "dropped", ...} per
+      frame, or {"type": "error", "seq", "detail"}. The box is tracked on
+      frame `seq`; the TI-RADS result is the newest classifier pass, run on
+      frame `classified_seq` (the classifier runs behind the feed)
+    - Latest frame wins: frames arriving during an inference replace each
+      other; `seq` is the frame's position in the stream so the client can
+      match results to what it sent
+    - Nothing is stored - upload the capture through /inference/run
+
+    Browsers can't set headers on a WebSocket, so the access token is the
+    `token` query parameter.
+    """
+    # 1️⃣ Authenticate before accepting
+    try:
+        user = await run_in_threadpool(
+            verify_user, HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+        )
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    frames = LatestFrame()
+    # Leased for the session, renewed when new models are activated
+    models = model_registry.acquire()
+    session = LiveSession(models.pipeline.roi_detector, models.pipeline.feature_classifier)
+    detector_runs = classifier_runs = 0
+
+    # 2️⃣ Receive continuously - never blocked behind inference
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    frames.put(message["bytes"])
+        finally:
+            frames.close()
+
+    receiver = asyncio.create_task(receive())
+    processed = 0
+    started = time.perf_counter()
+
+    # 3️⃣ Score the newest frame, push the result
+    try:
+        while (item := await frames.get()) is not None:
+            seq, received_at, data = item
+            if models is not model_registry.active:
+                # Continue on the new models (the ROI is re-detected)
+                session.cancel()
+                detector_runs += session.detector_runs
+                classifier_runs += session.classifier_runs
+                model_registry.release(models)
+                models = model_registry.acquire()
+                session = LiveSession(models.pipeline.roi_detector, models.pipeline.feature_classifier)
+            # In flight for the background jobs' throttles (not a latency sample)
+            request_latency.started()
+            try:
+                result = await session.process(data, seq)
+            except Exception as e:
+                await websocket.send_json({"type": "error", "seq": seq, "detail": f"Inference failed: {str(e)}"})
+                continue
+            finally:
+                request_latency.finished()
+
+            processed += 1
+            await websocket.send_json({
+                "type": "result",
+                "seq": seq,
+                **result,
+                "latency_ms": round((time.perf_counter() - received_at) * 1000, 1),
+                "dropped": frames.dropped,
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        session.cancel()
+        model_registry.release(models)
+
+        log_event(
+            level="INFO",
+            action="LIVE_INFERENCE_SESSION",
+            actor_id=user.id,
+            actor_role="doctor",
+            metadata={
+                "frames_received": frames.received,
+                "frames_processed": processed,
+                "frames_dropped": frames.dropped,
+                "detector_runs": detector_runs + session.detector_runs,
+                "classifier_runs": classifier_runs + session.classifier_runs,
+                "duration_s": round(time.perf_counter() - started, 1)
+            },
+            error_code="INFERENCE_OK"
+        )
+
+
 # ─────────────────────────────────────────────
 # ON-DEMAND AI EXPLANATION ENDPOINT
 # ─────────────────────────────────────────────
 
+def save_explanation(prediction: dict, result: dict):
+    """Persist a generated explanation on its prediction row."""
+    # ⚠️ FIX: Merge with existing explanation_metadata to preserve Grad-CAM
+    existing_metadata = prediction.get("explanation_metadata") or {}
+    updated_metadata = {
+        **existing_metadata,
+        **result["explanation_metadata"]
+    }
+
+    supabase_admin.table("predictions").update({
+        "ai_explanation": result["ai_explanation"],
+        "explanation_metadata": updated_metadata
+    }).eq("id", prediction["id"]).execute()
+
+
 @router.post("/{prediction_id}/explain")
 async def generate_prediction_explanation(
     request: Request,
+    background_tasks: BackgroundTasks,
     prediction_id: uuid.UUID,
     use_llm: bool = Body(True, embed=True),
     user=Depends(verify_user)
@@ -244,17 +533,10 @@ async def generate_prediction_explanation(
         )
 
     # 4️⃣ Store explanation in DB
-    # ⚠️ FIX: Merge with existing explanation_metadata to preserve Grad-CAM
-    existing_metadata = prediction.get("explanation_metadata") or {}
-    updated_metadata = {
-        **existing_metadata,
-        **result["explanation_metadata"]
-    }
+    save_explanation(prediction, result)
 
-    supabase_admin.table("predictions").update({
-        "ai_explanation": result["ai_explanation"],
-        "explanation_metadata": updated_metadata
-    }).eq("id", str(prediction_id)).execute()
+    # The explanation is part of the report - refresh the cached PDF
+    background_tasks.add_task(prerender_report, str(prediction_id))
 
     # 5️⃣ Log explanation event
     log_event(
@@ -277,3 +559,106 @@ async def generate_prediction_explanation(
         "prediction_id": str(prediction_id),
         **result
     }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/{prediction_id}/explain/stream")
+async def stream_prediction_explanation(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    prediction_id: uuid.UUID,
+    use_llm: bool = Body(True, embed=True),
+    user=Depends(verify_user)
+):
+    """
+    Streaming variant of /explain over Server-Sent Events.
+
+    Events:
+    - delta:    {"text"} explanation tokens as Gemini produces them
+    - fallback: {"text"} stream failed - replace the partial text with this
+    - done:     {"ai_explanation", "explanation_metadata"} once persisted
+
+    Read it with fetch() (EventSource can't send the Authorization header).
+    """
+
+    # 1️⃣ Fetch prediction
+    res = (
+        supabase_admin.table("predictions")
+        .select("*")
+        .eq("id", str(prediction_id))
+        .single()
+        .execute()
+    )
+
+    prediction = res.data
+    if not prediction:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+
+    request_id = request.state.request_id
+
+    async def events():
+        # 2️⃣ Already explained - replay it as a single chunk
+        if prediction.get("ai_explanation"):
+            yield _sse("delta", {"text": prediction["ai_explanation"]})
+            yield _sse("done", {
+                "ai_explanation": prediction["ai_explanation"],
+                "explanation_metadata": prediction.get("explanation_metadata")
+            })
+            return
+
+        # 3️⃣ Stream from LLM (rule-based fallback on failure)
+        result = None
+        async for event in ResponseGenerator.stream(
+            features=prediction["features"],
+            tirads=prediction["tirads"],
+            confidence=prediction["confidence"],
+            use_llm=use_llm
+        ):
+            if event["type"] == "done":
+                result = {k: v for k, v in event.items() if k != "type"}
+                continue
+            yield _sse(event["type"], {"text": event["text"]})
+
+        # 4️⃣ Store explanation in DB
+        try:
+            await run_in_threadpool(save_explanation, prediction, result)
+        except Exception as e:
+            yield _sse("error", {"detail": f"Failed to save explanation: {str(e)}"})
+            return
+
+        background_tasks.add_task(prerender_report, str(prediction_id))
+
+        # 5️⃣ Log explanation event (time-to-first-token is the tracked metric)
+        metadata = result["explanation_metadata"]
+        log_event(
+            level="INFO",
+            action="GENERATE_EXPLANATION",
+            request_id=request_id,
+            actor_id=user.id,
+            actor_role="doctor",
+            resource_type="prediction",
+            resource_id=str(prediction_id),
+            metadata={
+                "engine": metadata["engine"],
+                "is_fallback": metadata["is_fallback"],
+                "streamed": True,
+                "time_to_first_token_ms": metadata["time_to_first_token_ms"],
+                "generation_time_ms": metadata["generation_time_ms"]
+            },
+            error_code="EXPLANATION_OK"
+        )
+
+        yield _sse("done", result)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        background=background_tasks,
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy buffering
+        }
+    )
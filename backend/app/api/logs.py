@@ -1,11 +1,53 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import Optional, List
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Optional, List, Tuple
 from app.db.supabase import supabase_admin
 from app.utils.logger import LOGGING_ENABLED
+from app.utils.log_stream import log_broadcaster
+import asyncio
+import base64
+import datetime
+import json
 import os
+import uuid
+
+LOG_STREAM_KEEPALIVE_SECONDS = float(os.getenv("LOG_STREAM_KEEPALIVE_SECONDS", "15"))
+LOG_STREAM_CATCHUP_LIMIT = int(os.getenv("LOG_STREAM_CATCHUP_LIMIT", "500"))
 
 router = APIRouter(prefix="/api/logs", tags=["System Logs"])
 
+
+def encode_log_cursor(row: dict) -> str:
+    """Opaque keyset cursor for a log row: (created_at, id)."""
+    raw = f"{row['created_at']}|{row['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_log_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    (created_at, id) of a cursor. Both end up inside PostgREST or_()
+    filters, so anything but an ISO timestamp and a UUID is a 400.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, log_id = base64.urlsafe_b64decode(padded).decode().split("|", 1)
+        datetime.datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(log_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def apply_log_filters(query, level: Optional[str], action: Optional[str]):
+    if level and level != "ALL":
+        query = query.eq("level", level.upper())
+
+    if action and action != "ALL":
+        query = query.eq("action", action)
+
+    return query
+
+
 @router.get("/config")
 async def get_logs_config():
     """
@@ -20,33 +62,216 @@ async def get_logs(
     level: Optional[str] = None,
     action: Optional[str] = None,
     limit: int = Query(50, ge=1, le=1000),
-    offset: int = 0
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    count: bool = Query(False, description="Include an approximate total count")
 ):
     """
     Fetch system logs with optional filtering.
+
+    Keyset pagination on (created_at, id) - newest first. Each page costs
+    the same index range scan no matter how deep it is.
     """
     if not LOGGING_ENABLED:
-        return {"logs": [], "total": 0, "message": "Logging is currently disabled."}
+        return {"logs": [], "total": 0, "next_cursor": None, "message": "Logging is currently disabled."}
 
     try:
-        query = supabase_admin.table("system_logs").select("*", count="exact").order("created_at", desc=True)
+        # "estimated" = exact for small results, planner estimate for large ones
+        query = supabase_admin.table("system_logs").select("*", count="estimated" if count else None)
+        query = apply_log_filters(query, level, action)
 
-        if level and level != "ALL":
-            query = query.eq("level", level.upper())
-        
-        if action and action != "ALL":
-            query = query.eq("action", action)
+        # Keyset: (created_at, id) < (cursor_created_at, cursor_id)
+        if cursor:
+            created_at, log_id = decode_log_cursor(cursor)
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt."{log_id}")'
+            )
+
+        # One extra row tells us whether there is a next page
+        result = (
+            query.order("created_at", desc=True)
+            .order("id", desc=True)
+            .limit(limit + 1)
+            .execute()
+        )
+
+        rows = result.data or []
+        has_more = len(rows) > limit
+        rows = rows[:limit]
 
-        # Pagination
-        query = query.range(offset, offset + limit - 1)
-        
-        result = query.execute()
-        
         return {
-            "logs": result.data,
-            "total": result.count,
+            "logs": rows,
+            "total": result.count if count else None,
             "limit": limit,
-            "offset": offset
+            "next_cursor": encode_log_cursor(rows[-1]) if has_more else None,
+            "has_more": has_more
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/stats")
+async def get_log_stats(
+    hours: int = Query(24, ge=1, le=24 * 90),
+    action: Optional[str] = None,
+    bucket: str = Query("hour", pattern="^(hour|day)$")
+):
+    """
+    Dashboard chart series from the system_logs_hourly rollup
+    (never scans raw system_logs).
+
+    - Event / error counts and error rate
+    - Exact mean inference_time_ms; p50/p95/p99 are exact per (hour, action)
+      and a count-weighted mean of those when several are merged
+    - Event counts per actor (e.g. inference volume per doctor)
+    """
+    since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=hours)
+
+    try:
+        query = (
+            supabase_admin.table("system_logs_hourly")
+            .select("*")
+            .gte("bucket", since.isoformat())
+        )
+        if action and action != "ALL":
+            query = query.eq("action", action)
+        rows = query.order("bucket").execute().data or []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    series = {}
+    for row in rows:
+        key = row["bucket"][:10] if bucket == "day" else row["bucket"]
+        point = series.setdefault(key, {
+            "bucket": key,
+            "event_count": 0,
+            "error_count": 0,
+            "latency_count": 0,
+            "latency_sum_ms": 0.0,
+            "_weighted": {"p50": 0.0, "p95": 0.0, "p99": 0.0},
+            "actor_counts": {},
+        })
+        point["event_count"] += row["event_count"]
+        point["error_count"] += row["error_count"]
+        point["latency_count"] += row["latency_count"]
+        point["latency_sum_ms"] += row["latency_sum_ms"]
+        for p in ("p50", "p95", "p99"):
+            if row.get(f"latency_{p}_ms") is not None:
+                point["_weighted"][p] += row[f"latency_{p}_ms"] * row["latency_count"]
+        for actor_id, n in (row.get("actor_counts") or {}).items():
+            point["actor_counts"][actor_id] = point["actor_counts"].get(actor_id, 0) + n
+
+    points = []
+    for point in series.values():
+        weighted = point.pop("_weighted")
+        n = point["latency_count"]
+        point["error_rate"] = round(point["error_count"] / point["event_count"], 4) if point["event_count"] else 0.0
+        point["latency_mean_ms"] = round(point["latency_sum_ms"] / n, 1) if n else None
+        for p in ("p50", "p95", "p99"):
+            point[f"latency_{p}_ms"] = round(weighted[p] / n, 1) if n else None
+        points.append(point)
+
+    return {
+        "bucket": bucket,
+        "hours": hours,
+        "action": action or "ALL",
+        "percentiles_exact": bucket == "hour" and bool(action and action != "ALL"),
+        "series": points
+    }
+
+
+def fetch_logs_after(cursor: str, level: Optional[str], action: Optional[str], limit: int) -> List[dict]:
+    """Rows newer than `cursor`, oldest first (live-tail catch-up)."""
+    created_at, log_id = decode_log_cursor(cursor)
+    query = apply_log_filters(supabase_admin.table("system_logs").select("*"), level, action)
+    result = (
+        query.or_(
+            f'created_at.gt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.gt."{log_id}")'
+        )
+        .order("created_at")
+        .order("id")
+        .limit(limit)
+        .execute()
+    )
+    return result.data or []
+
+
+def _log_matches(row: dict, level: Optional[str], action: Optional[str]) -> bool:
+    if level and level != "ALL" and row.get("level") != level.upper():
+        return False
+    if action and action != "ALL" and row.get("action") != action:
+        return False
+    return True
+
+
+def _sse_event(row: dict) -> str:
+    return f"id: {encode_log_cursor(row)}\nevent: log\ndata: {json.dumps(row, default=str)}\n\n"
+
+
+@router.get("/stream")
+async def stream_logs(
+    request: Request,
+    level: Optional[str] = None,
+    action: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="Resume after this log cursor")
+):
+    """
+    Live tail of system_logs over Server-Sent Events.
+
+    - New rows are pushed as they are written (no DB polling) - by any
+      worker with LOG_STREAM_DATABASE_URL set, else by this one
+    - Resumes from `cursor` or the Last-Event-ID header with one catch-up query
+    - Sends a keepalive comment every LOG_STREAM_KEEPALIVE_SECONDS
+    """
+    if not LOGGING_ENABLED:
+        raise HTTPException(status_code=404, detail="Logging is currently disabled.")
+
+    resume_from = request.headers.get("last-event-id") or cursor
+    if resume_from:
+        decode_log_cursor(resume_from)  # 400 early on a bad cursor
+
+    # Subscribe before catch-up so nothing written in between is missed
+    subscription = log_broadcaster.subscribe()
+
+    async def events():
+        # Live rows at or before this key were already covered by catch-up
+        seen_until = decode_log_cursor(resume_from) if resume_from else None
+        try:
+            yield "retry: 3000\n\n"
+
+            if resume_from:
+                backlog = await run_in_threadpool(
+                    fetch_logs_after, resume_from, level, action, LOG_STREAM_CATCHUP_LIMIT
+                )
+                for row in backlog:
+                    seen_until = (str(row["created_at"]), str(row["id"]))
+                    yield _sse_event(row)
+
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    row = await subscription.get(timeout=LOG_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                if not _log_matches(row, level, action):
+                    continue
+                if seen_until and (str(row["created_at"]), str(row["id"])) <= seen_until:
+                    continue  # already sent during catch-up
+                yield _sse_event(row)
+        finally:
+            log_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy buffering
+        }
+    )
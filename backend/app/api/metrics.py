@@ -0,0 +1,38 @@
+from fastapi import APIRouter
+from app.services.explainability.llm_client import get_llm_metrics
+from app.services.explainability.explanation_cache import explanation_cache
+from app.utils.latency import request_latency
+from app.services.inference.shadow import shadow_evaluator
+
+router = APIRouter(prefix="/api/metrics", tags=["Metrics"])
+
+
+@router.get("/llm")
+async def llm_metrics():
+    """
+    Upstream LLM health: circuit breaker state, rate limiter tokens,
+    in-flight calls and fallback counters (per worker process).
+    """
+    return {
+        **get_llm_metrics(),
+        "explanation_cache": explanation_cache.stats(),
+    }
+
+
+@router.get("/latency")
+async def latency_metrics():
+    """
+    Request latencies over the last LATENCY_WINDOW_SECONDS (per worker
+    process) - the p99 the re-scoring job throttles on.
+    """
+    return request_latency.snapshot()
+
+
+@router.get("/shadow")
+async def shadow_metrics():
+    """
+    Candidate vs production on sampled /inference/run traffic: TI-RADS
+    mismatch rate, per-feature flip rates, box IoU, dropped samples
+    (per worker process).
+    """
+    return shadow_evaluator.stats()
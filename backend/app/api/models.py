@@ -0,0 +1,101 @@
+from typing import Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+from pydantic import BaseModel
+
+from app.db.auth import verify_admin
+from app.services.inference.model_registry import model_registry, resolve_weights
+from app.utils.logger import log_event
+
+router = APIRouter(prefix="/api/admin/models", tags=["Admin"])
+
+
+# ============================
+# Pydantic Schema
+# ============================
+class ModelWeights(BaseModel):
+    path: str       # relative to MODEL_REGISTRY_DIR
+    version: str    # MODEL_VERSION of the new weights (keys the stage cache and predictions)
+
+
+class ModelLoad(BaseModel):
+    roi_detector: Optional[ModelWeights] = None
+    feature_classifier: Optional[ModelWeights] = None
+    pipeline_version: Optional[str] = None
+
+
+# ============================
+# Active versions
+# ============================
+@router.get("")
+async def model_status(user=Depends(verify_admin)):
+    """
+    Active model set, sets still draining in-flight requests, and the
+    current / last load (this worker process).
+    """
+    return model_registry.status()
+
+
+# ============================
+# Hot swap
+# ============================
+def _load_models(request_id, user_id: str, body: ModelLoad):
+    try:
+        models = model_registry.load(
+            detector=(body.roi_detector.path, body.roi_detector.version) if body.roi_detector else None,
+            classifier=(body.feature_classifier.path, body.feature_classifier.version) if body.feature_classifier else None,
+            pipeline_version=body.pipeline_version,
+        )
+        log_event(
+            level="INFO",
+            action="MODELS_ACTIVATED",
+            request_id=request_id,
+            actor_id=user_id,
+            # system_logs.actor_role only allows doctor / radiologist / system
+            actor_role="system",
+            resource_type="model",
+            metadata={**models.describe(), **model_registry.last_load, "admin_id": user_id}
+        )
+    except Exception as e:
+        log_event(
+            level="ERROR",
+            action="MODELS_LOAD_FAILED",
+            request_id=request_id,
+            actor_id=user_id,
+            actor_role="system",
+            resource_type="model",
+            metadata={**body.model_dump(), "admin_id": user_id},
+            exception=e
+        )
+
+
+@router.post("/load", status_code=202)
+async def load_models(
+    body: ModelLoad,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user=Depends(verify_admin)
+):
+    """
+    Loads new weights in the background, warms them up and switches over;
+    requests already running finish on the current models. Poll GET
+    /api/admin/models for the outcome.
+    """
+    # 1️⃣ Validate before taking the load slot
+    if not body.roi_detector and not body.feature_classifier:
+        raise HTTPException(status_code=400, detail="Nothing to load")
+    try:
+        for weights in (body.roi_detector, body.feature_classifier):
+            if weights:
+                resolve_weights(weights.path)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 2️⃣ One load at a time (the new set is built next to the active one)
+    if not model_registry.begin_load(body.model_dump()):
+        raise HTTPException(status_code=409, detail="A model load is already in progress")
+
+    # 3️⃣ Load + warm-up + switch after the response
+    background_tasks.add_task(_load_models, getattr(request.state, "request_id", None), user.id, body)
+
+    return {"success": True, "status": "loading", "active": model_registry.active.describe()}
@@ -1,80 +1,163 @@
+import asyncio
+import datetime
+import os
+import zipfile
+from typing import Optional, List
+from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException, Response, Depends, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from app.db.supabase import supabase_admin, STORAGE_BUCKET
-from app.services.reports.pdf_generator import PDFReportGenerator
+from app.services.reports.pdf_generator import render_pdf
+from app.services.preprocessing.dicom import DicomClip, frame_to_jpeg, is_dicom
+from app.services.reports.report_cache import report_cache, compute_report_version
 from app.db.auth import verify_user
+from app.db.queries import fetch_report_bundle, fetch_report_bundles
 from app.utils.logger import log_event
 
+# Render every new prediction's PDF ahead of the first export. Kill switch
+# for when render CPU competes with inference; exports render on demand either way.
+REPORT_PRERENDER_ENABLED = os.getenv("REPORT_PRERENDER_ENABLED", "true").lower() == "true"
+
 router = APIRouter(prefix="/export", tags=["Export"])
 
 
-@router.get("/pdf/{prediction_id}")
-async def export_pdf(
-    prediction_id: str,
-    request: Request,
-    user=Depends(verify_user)
-):
-    try:
-        # 1️⃣ Fetch prediction
-        res = (
-            supabase_admin.table("predictions")
-            .select("*")
-            .eq("id", prediction_id)
-            .single()
-            .execute()
-        )
+def build_report_context(bundle: dict) -> dict:
+    """Report context (rows + content version) from a query-layer bundle."""
+    pred = bundle["prediction"]
+    raw_image = bundle["raw_image"]
+    patient = bundle["patient"] or {}
+    feedback = bundle["feedback"]
 
-        if not res.data:
-            raise HTTPException(404, "Prediction not found")
+    return {
+        "prediction": pred,
+        "raw_image": raw_image,
+        "patient": patient,
+        "feedback": feedback,
+        "version": compute_report_version(pred, raw_image, patient, feedback),
+    }
 
-        pred = res.data
 
-        # 2️⃣ Fetch raw image record
-        raw_res = (
-            supabase_admin.table("raw_images")
-            .select("*")
-            .eq("id", pred["raw_image_id"])
-            .single()
-            .execute()
-        )
+def load_report_context(prediction_id: str) -> dict:
+    """
+    Fetches everything a report depends on and computes its content version.
+    """
+    # 1️⃣ prediction -> raw_image -> patient (+ feedback) in one round trip
+    bundle = fetch_report_bundle(prediction_id)
 
-        if not raw_res.data:
-            raise HTTPException(404, "Raw image not found")
-            
-        raw_image = raw_res.data
-
-        # 3️⃣ Fetch Patient details
-        patient_res = (
-            supabase_admin.table("patients")
-            .select("*")
-            .eq("id", raw_image["patient_id"])
-            .single()
-            .execute()
-        )
-        
-        patient = patient_res.data if patient_res.data else {}
-        name = f"{patient.get('first_name', 'Unknown')} {patient.get('last_name', '')}".strip() or "N/A"
+    if not bundle:
+        raise HTTPException(404, "Prediction not found")
+
+    if not bundle["raw_image"]:
+        raise HTTPException(404, "Raw image not found")
+
+    return build_report_context(bundle)
+
+
+def render_report(context: dict, image_bytes: Optional[bytes] = None) -> bytes:
+    """
+    Renders the PDF for a loaded report context and stores it in the report cache.
+    Downloads the raw image unless its bytes are passed in.
+    """
+    pred = context["prediction"]
+    raw_image = context["raw_image"]
+    patient = context["patient"]
+    version = context["version"]
 
-        # 4️⃣ Download raw image bytes
+    name = f"{patient.get('first_name', 'Unknown')} {patient.get('last_name', '')}".strip() or "N/A"
+
+    # 4️⃣ Download raw image bytes
+    if image_bytes is None:
         try:
             bucket = supabase_admin.storage.from_(STORAGE_BUCKET)
             image_bytes = bucket.download(raw_image["file_path"])
         except Exception as e:
             raise HTTPException(500, f"Failed to download image: {str(e)}")
 
-        # 5️⃣ Generate PDF
-        pdf_bytes = PDFReportGenerator.generate_pdf(
-            data={
-                "patient": {
-                    "name": name,
-                    "age": str(patient.get("age", "N/A")),
-                    "gender": patient.get("gender", "N/A"),
-                    "date": raw_image.get("created_at", "").split("T")[0]
-                },
-                "prediction": pred
+        # DICOM: the report shows the keyframe the bounding box was taken from
+        if is_dicom(image_bytes):
+            clip_info = (pred.get("features") or {}).get("clip") or {}
+            try:
+                clip = DicomClip(image_bytes)
+                image_bytes = frame_to_jpeg(clip.frame(clip_info.get("representative_frame", 0)))
+            except Exception as e:
+                raise HTTPException(500, f"Failed to decode DICOM: {str(e)}")
+
+    # 5️⃣ Generate PDF (process pool)
+    pdf_bytes = render_pdf(
+        data={
+            "patient": {
+                "name": name,
+                "age": str(patient.get("age", "N/A")),
+                "gender": patient.get("gender", "N/A"),
+                "date": (raw_image.get("created_at") or "").split("T")[0]
             },
-            raw_image_bytes=image_bytes
+            "prediction": pred
+        },
+        raw_image_bytes=image_bytes,
+        report_id=f"THY-{version[:8].upper()}"
+    )
+
+    report_cache.put(pred["id"], version, pdf_bytes)
+    return pdf_bytes
+
+
+def prerender_report(prediction_id: str, image_bytes: Optional[bytes] = None):
+    """
+    Background task: warms the report cache for a new prediction (unless
+    REPORT_PRERENDER_ENABLED is off). Failures are only logged - the export
+    endpoint renders on demand anyway.
+    """
+    if not REPORT_PRERENDER_ENABLED:
+        return
+    try:
+        context = load_report_context(prediction_id)
+        if report_cache.get(prediction_id, context["version"]) is None:
+            render_report(context, image_bytes)
+    except Exception as e:
+        log_event(
+            level="WARN",
+            action="PRERENDER_PDF_ERROR",
+            resource_type="prediction",
+            resource_id=prediction_id,
+            exception=e
         )
 
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+
+@router.get("/pdf/{prediction_id}")
+async def export_pdf(
+    prediction_id: str,
+    request: Request,
+    user=Depends(verify_user)
+):
+    try:
+        context = load_report_context(prediction_id)
+        etag = f'"{context["version"]}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Content-Disposition": f"attachment; filename=report_{prediction_id}.pdf"
+        }
+
+        # 🔁 Client already has this exact report
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        # 🗂️ Serve from cache, render on miss
+        pdf_bytes = report_cache.get(prediction_id, context["version"])
+        cache_hit = pdf_bytes is not None
+        if not cache_hit:
+            # Download + render block, keep them off the event loop
+            pdf_bytes = await run_in_threadpool(render_report, context)
+
         # 6️⃣ Log success
         log_event(
             level="INFO",
@@ -84,15 +167,14 @@ async def export_pdf(
             actor_role="doctor",
             resource_type="prediction",
             resource_id=prediction_id,
+            metadata={"cache_hit": cache_hit},
             error_code="EXPORT_PDF_OK"
         )
 
         return Response(
             content=pdf_bytes,
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=report_{prediction_id}.pdf"
-            }
+            headers=headers
         )
     except Exception as e:
         # 7️⃣ Log error
@@ -109,3 +191,171 @@ async def export_pdf(
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============================
+# Bulk export (streamed ZIP)
+# ============================
+
+# Reports fetched per query page and rendered concurrently.
+# Together they bound memory: at most one page of rows plus
+# BULK_EXPORT_WINDOW images / PDFs are alive at any time.
+BULK_EXPORT_PAGE_SIZE = int(os.getenv("BULK_EXPORT_PAGE_SIZE", "50"))
+BULK_EXPORT_WINDOW = int(os.getenv("BULK_EXPORT_WINDOW", "4"))
+BULK_EXPORT_MAX_REPORTS = int(os.getenv("BULK_EXPORT_MAX_REPORTS", "1000"))
+
+
+class BulkExportRequest(BaseModel):
+    patient_id: Optional[str] = None
+    prediction_ids: Optional[List[str]] = Field(None, max_length=BULK_EXPORT_MAX_REPORTS)
+    created_from: Optional[datetime.date] = None
+    created_to: Optional[datetime.date] = None
+
+
+class _ZipChunkSink:
+    """Write-only, non-seekable file object; zipfile streams into it."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _report_filename(context: dict) -> str:
+    pred = context["prediction"]
+    date = (pred.get("created_at") or "").split("T")[0] or "undated"
+    return f"report_{date}_{pred['id']}.pdf"
+
+
+async def _render_cached(context: dict) -> bytes:
+    pdf_bytes = report_cache.get(context["prediction"]["id"], context["version"])
+    if pdf_bytes is None:
+        pdf_bytes = await run_in_threadpool(render_report, context)
+    return pdf_bytes
+
+
+async def _render_window(contexts: List[dict]):
+    """
+    Renders contexts with at most BULK_EXPORT_WINDOW in flight and yields
+    (context, pdf_bytes | exception) in completion order.
+    """
+    remaining = iter(contexts)
+    pending = {}
+
+    def start_next():
+        context = next(remaining, None)
+        if context is not None:
+            pending[asyncio.ensure_future(_render_cached(context))] = context
+
+    for _ in range(BULK_EXPORT_WINDOW):
+        start_next()
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                context = pending.pop(task)
+                start_next()
+                try:
+                    yield context, task.result()
+                except Exception as e:
+                    yield context, e
+    finally:
+        # Client went away - stop outstanding renders
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_report_zip(first_page: List[dict], fetch_page, request_id, user_id):
+    sink = _ZipChunkSink()
+    archive = zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED)
+    page, offset, written, failed = first_page, 0, 0, 0
+
+    while page:
+        contexts = [build_report_context(b) for b in page if b["raw_image"]]
+
+        async for context, result in _render_window(contexts):
+            if isinstance(result, Exception):
+                failed += 1
+                archive.writestr(
+                    _report_filename(context).replace(".pdf", ".error.txt"),
+                    f"Report generation failed: {result}"
+                )
+            else:
+                written += 1
+                # PDFs are already compressed - store as-is
+                archive.writestr(_report_filename(context), result)
+            yield sink.drain()
+
+        offset += len(page)
+        if len(page) < BULK_EXPORT_PAGE_SIZE or offset >= BULK_EXPORT_MAX_REPORTS:
+            break
+        page = await run_in_threadpool(fetch_page, offset)
+
+    archive.close()
+    yield sink.drain()
+
+    log_event(
+        level="INFO" if not failed else "WARN",
+        action="EXPORT_ZIP",
+        request_id=request_id,
+        actor_id=user_id,
+        actor_role="doctor",
+        resource_type="prediction",
+        metadata={"reports": written, "failed": failed},
+        error_code="EXPORT_ZIP_OK" if not failed else "EXPORT_ZIP_PARTIAL"
+    )
+
+
+@router.post("/zip")
+async def export_zip(
+    body: BulkExportRequest,
+    request: Request,
+    user=Depends(verify_user)
+):
+    """
+    Export many reports as one ZIP archive.
+
+    - Select by patient, date range (created_at) and/or explicit prediction ids
+    - Rows are fetched page by page with embedded raw_image / patient
+    - PDFs render in parallel workers and stream out as they finish
+    """
+    if not (body.patient_id or body.prediction_ids or body.created_from or body.created_to):
+        raise HTTPException(400, "Provide patient_id, prediction_ids or a date range")
+
+    created_to = None
+    if body.created_to:
+        # Inclusive end date
+        created_to = (body.created_to + datetime.timedelta(days=1)).isoformat()
+
+    def fetch_page(offset: int):
+        return fetch_report_bundles(
+            user.id,
+            patient_id=body.patient_id,
+            prediction_ids=body.prediction_ids,
+            created_from=body.created_from.isoformat() if body.created_from else None,
+            created_to=created_to,
+            offset=offset,
+            limit=BULK_EXPORT_PAGE_SIZE,
+        )
+
+    first_page = await run_in_threadpool(fetch_page, 0)
+    if not first_page:
+        raise HTTPException(404, "No predictions match the export filters")
+
+    filename = f"reports_{datetime.date.today().isoformat()}.zip"
+    return StreamingResponse(
+        _stream_report_zip(first_page, fetch_page, request.state.request_id, user.id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
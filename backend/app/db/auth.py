@@ -10,23 +10,192 @@
 #     except Exception as e:
 #         raise HTTPException(status_code=401, detail=str(e))
 
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any
+
+import jwt
 from fastapi import HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.db.supabase import supabase_auth
+from app.db.supabase import supabase_auth, SUPABASE_URL
 
 security = HTTPBearer()
 
+# ---------------------------
+# Local verification config
+# ---------------------------
+# Legacy (HS256) projects sign with the shared JWT secret, newer projects
+# publish asymmetric signing keys on the JWKS endpoint.
+JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+JWKS_URL = os.getenv("SUPABASE_JWKS_URL", f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+JWKS_REFRESH_SECONDS = int(os.getenv("SUPABASE_JWKS_REFRESH_SECONDS", "600"))
+JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+# Algorithms accepted for JWKS keys. The token header never chooses the
+# algorithm: HS256 is only tried against the shared secret, and a JWKS key
+# is verified with the algorithm it declares.
+JWT_ASYMMETRIC_ALGORITHMS = [
+    a.strip() for a in os.getenv("SUPABASE_JWT_ALGORITHMS", "RS256,ES256").split(",") if a.strip()
+]
+
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_MAX_SIZE", "1024"))
+
+# PyJWKClient fetches the key set once, keeps it for `lifespan` seconds and
+# re-fetches when it sees an unknown `kid` (key rotation).
+_jwks_client = jwt.PyJWKClient(JWKS_URL, cache_jwk_set=True, lifespan=JWKS_REFRESH_SECONDS)
+
+
+@dataclass
+class AuthenticatedUser:
+    """Minimal user built from verified JWT claims (mirrors the fields routers use)."""
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+    app_metadata: Dict[str, Any] = field(default_factory=dict)
+    user_metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> "AuthenticatedUser":
+        return cls(
+            id=claims["sub"],
+            email=claims.get("email"),
+            role=claims.get("role"),
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+        )
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified users keyed by token hash.
+    Entries expire at min(token exp, now + ttl).
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, token: str, user, token_exp: Optional[float] = None):
+        expires_at = time.time() + self.ttl_seconds
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+token_cache = TokenCache(TOKEN_CACHE_MAX_SIZE, TOKEN_CACHE_TTL_SECONDS)
+
+
+def _decode_locally(token: str) -> Dict[str, Any]:
+    """
+    Verifies signature, expiry and audience without a network call
+    (apart from the occasional JWKS refresh).
+    """
+    header = jwt.get_unverified_header(token)
+
+    if header.get("alg") == "HS256":
+        if not JWT_SECRET:
+            raise jwt.InvalidTokenError("SUPABASE_JWT_SECRET not configured")
+        key, algorithm = JWT_SECRET, "HS256"
+    else:
+        signing_key = _jwks_client.get_signing_key_from_jwt(token)
+        # The key's own alg (or the one implied by its kty/crv)
+        algorithm = getattr(signing_key, "algorithm_name", None)
+        if algorithm not in JWT_ASYMMETRIC_ALGORITHMS:
+            raise jwt.InvalidAlgorithmError(f"Signing key algorithm {algorithm} not allowed")
+        key = signing_key.key
+
+    return jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+
+
+def _unverified_exp(token: str) -> Optional[float]:
+    """exp claim of a token Supabase has already verified (bounds its cache entry)."""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+def _verify_remote(token: str):
+    """Network verification through Supabase Auth (fallback path)."""
+    res = supabase_auth.auth.get_user(token)
+    if not res or not res.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return res.user
+
+
 def verify_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     token = credentials.credentials
 
-    try:
-        res = supabase_auth.auth.get_user(token)
-        if not res or not res.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
+    # 1️⃣ Cached verification
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
 
-        return res.user
+    # 2️⃣ Local verification (JWT secret / JWKS)
+    try:
+        claims = _decode_locally(token)
+        user = AuthenticatedUser.from_claims(claims)
+        token_cache.set(token, user, token_exp=claims.get("exp"))
+        return user
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    except Exception:
+        # Unknown key / missing secret / unexpected format -> ask Supabase
+        pass
 
+    # 3️⃣ Network fallback
+    try:
+        user = _verify_remote(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Unauthorized")
+
+    token_cache.set(token, user, token_exp=_unverified_exp(token))
+    return user
+
+
+def verify_admin(user=Depends(verify_user)):
+    """
+    Admin-only endpoints. The role is read from app_metadata, which only
+    the service role can write (user_metadata is user-editable).
+    """
+    app_metadata = getattr(user, "app_metadata", None) or {}
+    if app_metadata.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
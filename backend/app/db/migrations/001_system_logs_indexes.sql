@@ -0,0 +1,20 @@
+-- 001_system_logs_indexes.sql
+-- Indexes backing keyset pagination of GET /api/logs.
+-- Every index ends in (created_at DESC, id DESC) so a page is a single
+-- index range scan: WHERE (created_at, id) < (:ts, :id) ORDER BY ... LIMIT n.
+-- CONCURRENTLY avoids locking system_logs against inserts (run outside a transaction).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS system_logs_created_at_id_idx
+    ON system_logs (created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS system_logs_level_created_at_idx
+    ON system_logs (level, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS system_logs_action_created_at_idx
+    ON system_logs (action, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS system_logs_request_id_idx
+    ON system_logs (request_id);
+
+-- Keep planner statistics fresh so count=estimated stays close
+ANALYZE system_logs;
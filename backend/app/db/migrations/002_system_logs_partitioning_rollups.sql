@@ -0,0 +1,297 @@
+-- 002_system_logs_partitioning_rollups.sql
+-- 1. system_logs becomes RANGE-partitioned by month on created_at, so
+--    retention is DROP TABLE on an old partition instead of a huge DELETE.
+-- 2. system_logs_hourly holds per-(hour, action) rollups that dashboards
+--    read instead of scanning raw rows + metadata JSONB.
+-- Requires pg_cron (enabled by default on Supabase) for the schedules at the end.
+
+BEGIN;
+
+-- ─────────────────────────────────────────────
+-- 1️⃣ Partitioned system_logs
+-- ─────────────────────────────────────────────
+ALTER TABLE system_logs RENAME TO system_logs_legacy;
+
+CREATE TABLE system_logs (
+    LIKE system_logs_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+    PRIMARY KEY (id, created_at)          -- partition key must be part of the PK
+) PARTITION BY RANGE (created_at);
+
+-- Partitions are plain tables: Supabase's default privileges would expose
+-- them through the API with no RLS. Lock each one down - clients only ever
+-- go through the parent (whose policies apply) or the service role.
+CREATE OR REPLACE FUNCTION protect_system_logs_partition(part text)
+RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part);
+    EXECUTE format('REVOKE ALL ON %I FROM PUBLIC, anon, authenticated', part);
+END $$;
+
+-- Catches rows outside every monthly partition (clock skew, late backfills)
+CREATE TABLE system_logs_default PARTITION OF system_logs DEFAULT;
+SELECT protect_system_logs_partition('system_logs_default');
+
+-- Creating a partition fails while the default partition holds rows of its
+-- range, so those rows are moved out first (same transaction: the new
+-- partition's check no longer sees them) and re-inserted through the parent.
+CREATE OR REPLACE FUNCTION create_system_logs_partition(month_start date)
+RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    start_ts date := date_trunc('month', month_start)::date;
+    end_ts   date := (date_trunc('month', month_start) + interval '1 month')::date;
+    part     text := format('system_logs_%s', to_char(start_ts, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    DROP TABLE IF EXISTS pg_temp.system_logs_moved;
+    CREATE TEMP TABLE system_logs_moved ON COMMIT DROP AS
+        SELECT * FROM system_logs_default WITH NO DATA;
+    WITH moved AS (
+        DELETE FROM system_logs_default
+        WHERE created_at >= start_ts AND created_at < end_ts
+        RETURNING *
+    )
+    INSERT INTO system_logs_moved SELECT * FROM moved;
+
+    EXECUTE format(
+        'CREATE TABLE %I PARTITION OF system_logs FOR VALUES FROM (%L) TO (%L)',
+        part, start_ts, end_ts
+    );
+    PERFORM protect_system_logs_partition(part);
+
+    INSERT INTO system_logs SELECT * FROM system_logs_moved;
+    DROP TABLE system_logs_moved;
+END $$;
+
+-- Rows in the default partition mean a monthly partition is missing;
+-- the system-logs-default-check schedule below warns when this is > 0
+CREATE OR REPLACE FUNCTION system_logs_default_rows()
+RETURNS bigint LANGUAGE sql STABLE AS $$
+    SELECT count(*) FROM system_logs_default;
+$$;
+
+-- Partitions for every month that already has data, plus the next two
+DO $$
+DECLARE m date;
+BEGIN
+    FOR m IN
+        SELECT generate_series(
+            date_trunc('month', COALESCE((SELECT min(created_at) FROM system_logs_legacy), now())),
+            date_trunc('month', now()) + interval '2 months',
+            interval '1 month'
+        )::date
+    LOOP
+        PERFORM create_system_logs_partition(m);
+    END LOOP;
+END $$;
+
+INSERT INTO system_logs SELECT * FROM system_logs_legacy;
+
+-- The new table starts without the legacy table's RLS, policies and
+-- grants (LIKE copies none of them): re-create them before the drop.
+DO $$
+DECLARE
+    legacy record;
+    pol    record;
+    grt    record;
+BEGIN
+    SELECT relrowsecurity, relforcerowsecurity INTO legacy
+    FROM pg_class WHERE oid = 'system_logs_legacy'::regclass;
+    IF legacy.relrowsecurity THEN
+        ALTER TABLE system_logs ENABLE ROW LEVEL SECURITY;
+    END IF;
+    IF legacy.relforcerowsecurity THEN
+        ALTER TABLE system_logs FORCE ROW LEVEL SECURITY;
+    END IF;
+
+    FOR pol IN
+        SELECT * FROM pg_policies
+        WHERE schemaname = 'public' AND tablename = 'system_logs_legacy'
+    LOOP
+        EXECUTE format(
+            'CREATE POLICY %I ON system_logs AS %s FOR %s TO %s%s%s',
+            pol.policyname, pol.permissive, pol.cmd,
+            array_to_string(ARRAY(
+                SELECT CASE WHEN r = 'public' THEN 'PUBLIC' ELSE quote_ident(r) END
+                FROM unnest(pol.roles) AS r
+            ), ', '),
+            COALESCE(' USING (' || pol.qual || ')', ''),
+            COALESCE(' WITH CHECK (' || pol.with_check || ')', '')
+        );
+    END LOOP;
+
+    -- Exactly the legacy grants (not the schema's default privileges)
+    REVOKE ALL ON system_logs FROM PUBLIC, anon, authenticated;
+    FOR grt IN
+        SELECT grantee, privilege_type
+        FROM information_schema.role_table_grants
+        WHERE table_schema = 'public' AND table_name = 'system_logs_legacy'
+    LOOP
+        EXECUTE format(
+            'GRANT %s ON system_logs TO %s',
+            grt.privilege_type,
+            CASE WHEN grt.grantee = 'PUBLIC' THEN 'PUBLIC' ELSE quote_ident(grt.grantee) END
+        );
+    END LOOP;
+END $$;
+
+DROP TABLE system_logs_legacy;
+
+-- Indexes from 001 (names freed by the drop above) are declared on the
+-- parent and cascade to every existing and future partition
+CREATE INDEX system_logs_created_at_id_idx ON system_logs (created_at DESC, id DESC);
+CREATE INDEX system_logs_level_created_at_idx ON system_logs (level, created_at DESC, id DESC);
+CREATE INDEX system_logs_action_created_at_idx ON system_logs (action, created_at DESC, id DESC);
+CREATE INDEX system_logs_request_id_idx ON system_logs (request_id);
+
+-- Retention: drop whole monthly partitions older than keep_months
+CREATE OR REPLACE FUNCTION drop_old_system_logs_partitions(keep_months int DEFAULT 6)
+RETURNS int LANGUAGE plpgsql AS $$
+DECLARE
+    cutoff  text := to_char(date_trunc('month', now()) - make_interval(months => keep_months), 'YYYY_MM');
+    part    record;
+    dropped int := 0;
+BEGIN
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'system_logs'
+          AND c.relname ~ '^system_logs_\d{4}_\d{2}$'
+          AND substring(c.relname from 13) < cutoff
+    LOOP
+        EXECUTE format('DROP TABLE %I', part.relname);
+        dropped := dropped + 1;
+    END LOOP;
+    RETURN dropped;
+END $$;
+
+-- ─────────────────────────────────────────────
+-- 2️⃣ Hourly rollups
+-- ─────────────────────────────────────────────
+CREATE TABLE IF NOT EXISTS system_logs_hourly (
+    bucket          timestamptz NOT NULL,     -- hour start
+    action          text        NOT NULL,
+    event_count     bigint      NOT NULL,
+    error_count     bigint      NOT NULL,     -- ERROR + FATAL
+    latency_count   bigint      NOT NULL,     -- rows with metadata.inference_time_ms
+    latency_sum_ms  double precision NOT NULL,
+    latency_p50_ms  double precision,
+    latency_p95_ms  double precision,
+    latency_p99_ms  double precision,
+    actor_counts    jsonb       NOT NULL DEFAULT '{}'::jsonb,  -- {actor_id: events}
+    updated_at      timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (bucket, action)
+);
+
+-- High-water mark of what the rollup has already consumed
+CREATE TABLE IF NOT EXISTS system_logs_rollup_state (
+    id          boolean PRIMARY KEY DEFAULT true CHECK (id),
+    rolled_up_to timestamptz NOT NULL
+);
+
+-- Backend-only (service role), like the partitions
+ALTER TABLE system_logs_hourly ENABLE ROW LEVEL SECURITY;
+ALTER TABLE system_logs_rollup_state ENABLE ROW LEVEL SECURITY;
+REVOKE ALL ON system_logs_hourly, system_logs_rollup_state FROM PUBLIC, anon, authenticated;
+
+INSERT INTO system_logs_rollup_state (rolled_up_to)
+SELECT date_trunc('hour', COALESCE(min(created_at), now())) FROM system_logs
+ON CONFLICT (id) DO NOTHING;
+
+-- Incremental refresh: recompute only the hours touched since the last run
+-- (one hour of overlap absorbs late-committed rows). Each run reads a small
+-- created_at range of the newest partition.
+CREATE OR REPLACE FUNCTION refresh_system_logs_hourly()
+RETURNS int LANGUAGE plpgsql AS $$
+DECLARE
+    since   timestamptz;
+    rows_up int;
+BEGIN
+    SELECT rolled_up_to - interval '1 hour' INTO since
+    FROM system_logs_rollup_state FOR UPDATE;
+
+    WITH raw AS (
+        SELECT
+            date_trunc('hour', created_at) AS bucket,
+            action,
+            level,
+            actor_id,
+            -- A non-numeric value must not abort the whole run
+            CASE WHEN metadata->>'inference_time_ms' ~ '^\s*-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?\s*$'
+                 THEN (metadata->>'inference_time_ms')::double precision
+            END AS latency_ms
+        FROM system_logs
+        WHERE created_at >= since
+    ),
+    per_actor AS (
+        SELECT bucket, action, jsonb_object_agg(actor_id::text, n) AS actor_counts
+        FROM (
+            SELECT bucket, action, actor_id, count(*) AS n
+            FROM raw WHERE actor_id IS NOT NULL
+            GROUP BY bucket, action, actor_id
+        ) a
+        GROUP BY bucket, action
+    ),
+    agg AS (
+        SELECT
+            bucket,
+            action,
+            count(*)                                           AS event_count,
+            count(*) FILTER (WHERE level IN ('ERROR', 'FATAL')) AS error_count,
+            count(latency_ms)                                  AS latency_count,
+            COALESCE(sum(latency_ms), 0)                       AS latency_sum_ms,
+            percentile_cont(0.50) WITHIN GROUP (ORDER BY latency_ms) AS latency_p50_ms,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY latency_ms) AS latency_p95_ms,
+            percentile_cont(0.99) WITHIN GROUP (ORDER BY latency_ms) AS latency_p99_ms
+        FROM raw
+        GROUP BY bucket, action
+    )
+    INSERT INTO system_logs_hourly AS h (
+        bucket, action, event_count, error_count, latency_count, latency_sum_ms,
+        latency_p50_ms, latency_p95_ms, latency_p99_ms, actor_counts, updated_at
+    )
+    SELECT
+        agg.bucket, agg.action, agg.event_count, agg.error_count, agg.latency_count,
+        agg.latency_sum_ms, agg.latency_p50_ms, agg.latency_p95_ms, agg.latency_p99_ms,
+        COALESCE(per_actor.actor_counts, '{}'::jsonb), now()
+    FROM agg
+    LEFT JOIN per_actor USING (bucket, action)
+    ON CONFLICT (bucket, action) DO UPDATE SET
+        event_count    = EXCLUDED.event_count,
+        error_count    = EXCLUDED.error_count,
+        latency_count  = EXCLUDED.latency_count,
+        latency_sum_ms = EXCLUDED.latency_sum_ms,
+        latency_p50_ms = EXCLUDED.latency_p50_ms,
+        latency_p95_ms = EXCLUDED.latency_p95_ms,
+        latency_p99_ms = EXCLUDED.latency_p99_ms,
+        actor_counts   = EXCLUDED.actor_counts,
+        updated_at     = now();
+
+    GET DIAGNOSTICS rows_up = ROW_COUNT;
+
+    UPDATE system_logs_rollup_state SET rolled_up_to = date_trunc('hour', now());
+    RETURN rows_up;
+END $$;
+
+SELECT refresh_system_logs_hourly();
+
+COMMIT;
+
+-- ─────────────────────────────────────────────
+-- 3️⃣ Schedules (pg_cron)
+-- ─────────────────────────────────────────────
+SELECT cron.schedule('system-logs-hourly-rollup', '*/5 * * * *', 'SELECT refresh_system_logs_hourly()');
+SELECT cron.schedule('system-logs-next-partition', '0 0 1 * *',
+    $$SELECT create_system_logs_partition((date_trunc('month', now()) + interval '2 months')::date)$$);
+SELECT cron.schedule('system-logs-retention', '30 0 1 * *', 'SELECT drop_old_system_logs_partitions(6)');
+SELECT cron.schedule('system-logs-default-check', '0 * * * *', $$
+    DO $check$ BEGIN
+        IF system_logs_default_rows() > 0 THEN
+            RAISE WARNING 'system_logs_default holds % rows - a monthly partition is missing', system_logs_default_rows();
+        END IF;
+    END $check$
+$$);
@@ -0,0 +1,21 @@
+-- 003_llm_explanation_cache.sql
+-- Persistent tier of the explanation cache
+-- (app/services/explainability/explanation_cache.py).
+-- key = sha256(canonical structured input + prompt version + model id)
+
+CREATE TABLE IF NOT EXISTS llm_explanation_cache (
+    key             text PRIMARY KEY,
+    explanation     text        NOT NULL,
+    model_id        text        NOT NULL,
+    prompt_version  text        NOT NULL,
+    input_snapshot  jsonb,
+    created_at      timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend-only (service role), like training_labels
+ALTER TABLE llm_explanation_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Only service role"
+ON llm_explanation_cache
+FOR ALL
+USING (false);
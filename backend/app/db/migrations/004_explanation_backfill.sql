@@ -0,0 +1,31 @@
+-- 004_explanation_backfill.sql
+-- Support for the explanation backfill worker
+-- (app/services/explainability/backfill.py).
+
+-- Finds predictions still waiting for an explanation without scanning
+-- the explained ones (which are the vast majority).
+CREATE INDEX IF NOT EXISTS predictions_missing_explanation_idx
+    ON predictions (created_at DESC)
+    WHERE ai_explanation IS NULL;
+
+-- Bulk write-back in one statement:
+--   items = [{"id": uuid, "ai_explanation": text, "explanation_metadata": {...}}, ...]
+-- Metadata is merged (keeps Grad-CAM etc.) and rows explained in the
+-- meantime by an interactive /explain call are left alone.
+CREATE OR REPLACE FUNCTION apply_prediction_explanations(items jsonb)
+RETURNS int LANGUAGE sql AS $$
+    WITH updated AS (
+        UPDATE predictions p
+        SET ai_explanation       = i.ai_explanation,
+            explanation_metadata = COALESCE(p.explanation_metadata, '{}'::jsonb)
+                                   || COALESCE(i.explanation_metadata, '{}'::jsonb)
+        FROM jsonb_to_recordset(items) AS i(id uuid, ai_explanation text, explanation_metadata jsonb)
+        WHERE p.id = i.id
+          AND p.ai_explanation IS NULL
+        RETURNING 1
+    )
+    SELECT count(*)::int FROM updated;
+$$;
+
+-- Backend-only (service role)
+REVOKE EXECUTE ON FUNCTION apply_prediction_explanations(jsonb) FROM PUBLIC, anon, authenticated;
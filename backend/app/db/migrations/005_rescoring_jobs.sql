@@ -0,0 +1,31 @@
+-- 005_rescoring_jobs.sql
+-- Checkpoints of the bulk re-scoring job
+-- (app/services/inference/rescoring.py): one row per job, updated after
+-- every page so an interrupted job resumes after `cursor`.
+
+CREATE TABLE IF NOT EXISTS rescoring_jobs (
+    id                 text PRIMARY KEY,
+    model_version      text        NOT NULL,
+    cursor             uuid,                      -- last raw_images.id done
+    status             text        NOT NULL DEFAULT 'running',
+    scanned            int         NOT NULL DEFAULT 0,
+    scored             int         NOT NULL DEFAULT 0,
+    skipped            int         NOT NULL DEFAULT 0,
+    failed             int         NOT NULL DEFAULT 0,
+    unsupported        int         NOT NULL DEFAULT 0,
+    throttled_seconds  real        NOT NULL DEFAULT 0,
+    started_at         timestamptz NOT NULL DEFAULT now(),
+    updated_at         timestamptz NOT NULL DEFAULT now()
+);
+
+-- Backend-only (service role), like llm_explanation_cache
+ALTER TABLE rescoring_jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Only service role"
+ON rescoring_jobs
+FOR ALL
+USING (false);
+
+-- "Already scored with this version?" lookup for each page
+CREATE INDEX IF NOT EXISTS predictions_raw_image_version_idx
+    ON predictions (raw_image_id, model_version);
@@ -0,0 +1,25 @@
+-- 006_system_logs_notify.sql
+-- Cross-process live tail: every row inserted into system_logs is announced
+-- on the `system_logs` channel (LISTEN/NOTIFY). Each API worker listens
+-- (app/utils/log_stream.py) and feeds its own SSE viewers, so a viewer sees
+-- the rows written by every worker and instance, not just its own.
+
+-- NOTIFY payloads are capped at 8000 bytes: large rows (big metadata) are
+-- announced by key only and the listener reads them back.
+CREATE OR REPLACE FUNCTION notify_system_logs()
+RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    payload text := row_to_json(NEW)::text;
+BEGIN
+    IF octet_length(payload) > 7900 THEN
+        payload := json_build_object('id', NEW.id, 'created_at', NEW.created_at, 'truncated', true)::text;
+    END IF;
+    PERFORM pg_notify('system_logs', payload);
+    RETURN NULL;
+END $$;
+
+-- Declared on the partitioned parent: cloned to every partition
+DROP TRIGGER IF EXISTS system_logs_notify ON system_logs;
+CREATE TRIGGER system_logs_notify
+    AFTER INSERT ON system_logs
+    FOR EACH ROW EXECUTE FUNCTION notify_system_logs();
@@ -0,0 +1,67 @@
+-- 007_explanation_backfill_attempts_budget.sql
+-- Explanation backfill (app/services/explainability/backfill.py):
+-- 1. Attempts per prediction: predictions the LLM failed on move to the
+--    back of the queue and are skipped after N attempts, instead of being
+--    re-selected by every run.
+-- 2. The daily LLM budget lives in the database, shared by every process
+--    and instance running the backfill.
+
+ALTER TABLE predictions
+    ADD COLUMN IF NOT EXISTS explanation_attempts int NOT NULL DEFAULT 0;
+
+-- Queue order: fewest attempts, then oldest first
+DROP INDEX IF EXISTS predictions_missing_explanation_idx;
+CREATE INDEX IF NOT EXISTS predictions_missing_explanation_idx
+    ON predictions (explanation_attempts, created_at)
+    WHERE ai_explanation IS NULL;
+
+CREATE OR REPLACE FUNCTION record_explanation_attempts(ids uuid[])
+RETURNS int LANGUAGE sql AS $$
+    WITH updated AS (
+        UPDATE predictions
+        SET explanation_attempts = explanation_attempts + 1
+        WHERE id = ANY(ids) AND ai_explanation IS NULL
+        RETURNING 1
+    )
+    SELECT count(*)::int FROM updated;
+$$;
+
+CREATE TABLE IF NOT EXISTS explanation_backfill_budget (
+    day   date PRIMARY KEY,              -- UTC day
+    used  int  NOT NULL DEFAULT 0
+);
+
+-- Spends one call of today's allowance atomically; false once it is used up
+CREATE OR REPLACE FUNCTION spend_backfill_budget(calls_per_day int)
+RETURNS boolean LANGUAGE plpgsql AS $$
+DECLARE
+    today date := (now() AT TIME ZONE 'utc')::date;
+BEGIN
+    INSERT INTO explanation_backfill_budget (day, used)
+    VALUES (today, 0)
+    ON CONFLICT (day) DO NOTHING;
+
+    UPDATE explanation_backfill_budget
+    SET used = used + 1
+    WHERE day = today AND used < calls_per_day;
+    RETURN FOUND;
+END $$;
+
+CREATE OR REPLACE FUNCTION backfill_budget_remaining(calls_per_day int)
+RETURNS int LANGUAGE sql STABLE AS $$
+    SELECT GREATEST(0, calls_per_day - COALESCE(
+        (SELECT used FROM explanation_backfill_budget WHERE day = (now() AT TIME ZONE 'utc')::date), 0
+    ));
+$$;
+
+-- Backend-only (service role)
+ALTER TABLE explanation_backfill_budget ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Only service role"
+ON explanation_backfill_budget
+FOR ALL
+USING (false);
+
+REVOKE EXECUTE ON FUNCTION record_explanation_attempts(uuid[]) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION spend_backfill_budget(int) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION backfill_budget_remaining(int) FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,124 @@
+# backend/app/db/queries.py
+#
+# One-round-trip read paths shared by the routers.
+# Each helper issues a single PostgREST request with embedded resources
+# (FK joins) instead of chaining predictions -> raw_images -> patients.
+
+from typing import Optional, Dict, Any, List
+from app.db.supabase import supabase_admin
+
+
+def _one(embedded) -> Optional[Dict[str, Any]]:
+    """Embedded to-one relations come back as an object, to-many as a list."""
+    if isinstance(embedded, list):
+        return embedded[0] if embedded else None
+    return embedded or None
+
+
+def fetch_report_bundle(prediction_id: str) -> Optional[Dict[str, Any]]:
+    """
+    prediction -> raw_image -> patient, plus feedback, in one query.
+
+    Returns {"prediction", "raw_image", "patient", "feedback"} or None if the
+    prediction does not exist. `raw_image` / `patient` may be None.
+    """
+    res = (
+        supabase_admin.table("predictions")
+        .select("*, raw_images(*, patients(*)), prediction_feedback(*)")
+        .eq("id", prediction_id)
+        .limit(1)
+        .execute()
+    )
+
+    if not res.data:
+        return None
+
+    return _split_report_row(res.data[0])
+
+
+def _split_report_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    prediction = dict(row)
+    raw_image = _one(prediction.pop("raw_images", None))
+    feedback = _one(prediction.pop("prediction_feedback", None))
+
+    patient = None
+    if raw_image:
+        raw_image = dict(raw_image)
+        patient = _one(raw_image.pop("patients", None))
+
+    return {
+        "prediction": prediction,
+        "raw_image": raw_image,
+        "patient": patient,
+        "feedback": feedback,
+    }
+
+
+def fetch_report_bundles(
+    doctor_id: str,
+    *,
+    patient_id: Optional[str] = None,
+    prediction_ids: Optional[List[str]] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    offset: int = 0,
+    limit: int = 50,
+) -> List[Dict[str, Any]]:
+    """
+    One page of report bundles (same shape as fetch_report_bundle) for a
+    doctor's predictions, filtered by patient, explicit ids and/or a
+    created_at range [created_from, created_to). Ordered oldest first.
+    """
+    query = (
+        supabase_admin.table("predictions")
+        .select("*, raw_images!inner(*, patients(*)), prediction_feedback(*)")
+        .eq("raw_images.doctor_id", doctor_id)
+    )
+
+    if patient_id:
+        query = query.eq("raw_images.patient_id", patient_id)
+    if prediction_ids:
+        query = query.in_("id", prediction_ids)
+    if created_from:
+        query = query.gte("created_at", created_from)
+    if created_to:
+        query = query.lt("created_at", created_to)
+
+    res = (
+        query.order("created_at")
+        .order("id")
+        .range(offset, offset + limit - 1)
+        .execute()
+    )
+
+    return [_split_report_row(row) for row in (res.data or [])]
+
+
+def fetch_prediction_access(prediction_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Prediction id + owning doctor + existing feedback, in one query.
+    Used for feedback authorization.
+
+    Returns {"prediction", "doctor_id", "feedback"} or None if the prediction
+    does not exist.
+    """
+    res = (
+        supabase_admin.table("predictions")
+        .select("id, raw_image_id, raw_images(doctor_id), prediction_feedback(*)")
+        .eq("id", prediction_id)
+        .limit(1)
+        .execute()
+    )
+
+    if not res.data:
+        return None
+
+    prediction = dict(res.data[0])
+    raw_image = _one(prediction.pop("raw_images", None))
+    feedback = _one(prediction.pop("prediction_feedback", None))
+
+    return {
+        "prediction": prediction,
+        "doctor_id": raw_image.get("doctor_id") if raw_image else None,
+        "feedback": feedback,
+    }
@@ -1,12 +1,21 @@
 # backend/app/middleware/request_id.py
 
+import time
 import uuid
 from fastapi import Request
+from app.utils.latency import request_latency
 
 async def request_id_middleware(request: Request, call_next):
     request_id = uuid.uuid4()
     request.state.request_id = request_id
 
-    response = await call_next(request)
+    start = time.perf_counter()
+    request_latency.started()
+    try:
+        response = await call_next(request)
+    finally:
+        # Time to response headers (streaming bodies are not counted)
+        request_latency.finished((time.perf_counter() - start) * 1000)
+
     response.headers["X-Request-ID"] = str(request_id)
     return response
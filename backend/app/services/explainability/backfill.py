@@ -0,0 +1,226 @@
+# Explanation backfill worker
+
+import os
+import time
+import asyncio
+import datetime
+from typing import Dict, Any, List
+
+from app.db.supabase import supabase_admin
+from app.utils.logger import log_event
+from app.services.explainability.llm_client import (
+    generate_batch_explanations,
+    LLMUnavailable,
+    MODEL_ID,
+)
+from app.services.explainability.explanation_cache import explanation_cache, canonical_input, cache_key
+
+BACKFILL_ENABLED = os.getenv("EXPLANATION_BACKFILL_ENABLED", "false").lower() == "true"
+# Off-peak window, UTC "HH:MM-HH:MM" (may wrap midnight)
+BACKFILL_WINDOW = os.getenv("EXPLANATION_BACKFILL_WINDOW", "01:00-06:00")
+BACKFILL_INTERVAL_SECONDS = float(os.getenv("EXPLANATION_BACKFILL_INTERVAL_SECONDS", "300"))
+# Distinct inputs packed into one prompt
+BACKFILL_BATCH_SIZE = int(os.getenv("EXPLANATION_BACKFILL_BATCH_SIZE", "8"))
+# Predictions examined per run
+BACKFILL_SCAN_LIMIT = int(os.getenv("EXPLANATION_BACKFILL_SCAN_LIMIT", "500"))
+# Quota budget: LLM requests the backfill may spend per UTC day (all processes)
+BACKFILL_DAILY_CALLS = int(os.getenv("EXPLANATION_BACKFILL_DAILY_CALLS", "200"))
+# Predictions the LLM failed on this many times are no longer picked up
+BACKFILL_MAX_ATTEMPTS = int(os.getenv("EXPLANATION_BACKFILL_MAX_ATTEMPTS", "3"))
+
+
+def in_window(now: datetime.time, window: str = BACKFILL_WINDOW) -> bool:
+    start_s, end_s = window.split("-")
+    start = datetime.time.fromisoformat(start_s.strip())
+    end = datetime.time.fromisoformat(end_s.strip())
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+class DailyBudget:
+    """
+    LLM request allowance that resets at UTC midnight. Kept in the database
+    (migration 007), so every process and instance spends the same budget.
+    Blocking - call off the event loop.
+    """
+
+    def __init__(self, calls_per_day: int = BACKFILL_DAILY_CALLS):
+        self.calls_per_day = calls_per_day
+
+    def remaining(self) -> int:
+        res = supabase_admin.rpc("backfill_budget_remaining", {"calls_per_day": self.calls_per_day}).execute()
+        return res.data or 0
+
+    def try_spend(self) -> bool:
+        """Spends one call; False once today's allowance is used up."""
+        res = supabase_admin.rpc("spend_backfill_budget", {"calls_per_day": self.calls_per_day}).execute()
+        return bool(res.data)
+
+
+def fetch_missing_explanations(limit: int = BACKFILL_SCAN_LIMIT) -> List[dict]:
+    """
+    Predictions without an explanation, fewest attempts then oldest first
+    (partial index from migration 007) - failures go to the back of the
+    queue instead of being re-selected every run.
+    """
+    res = (
+        supabase_admin.table("predictions")
+        .select("id, features, tirads, confidence")
+        .is_("ai_explanation", "null")
+        .lt("explanation_attempts", BACKFILL_MAX_ATTEMPTS)
+        .order("explanation_attempts")
+        .order("created_at")
+        .limit(limit)
+        .execute()
+    )
+    return res.data or []
+
+
+def record_attempts(prediction_ids: List[str]) -> int:
+    """Counts one failed LLM attempt for each prediction."""
+    res = supabase_admin.rpc("record_explanation_attempts", {"ids": prediction_ids}).execute()
+    return res.data or 0
+
+
+def write_explanations(items: List[dict]) -> int:
+    """Bulk update via apply_prediction_explanations(); returns rows written."""
+    res = supabase_admin.rpc("apply_prediction_explanations", {"items": items}).execute()
+    return res.data or 0
+
+
+def _updates_for(group: Dict[str, Any], text: str, metadata: Dict[str, Any]) -> List[dict]:
+    return [
+        {
+            "id": prediction_id,
+            "ai_explanation": text,
+            "explanation_metadata": {
+                "engine": MODEL_ID,
+                "input_snapshot": group["structured_data"],
+                "is_fallback": False,
+                "backfill": True,
+                **metadata
+            }
+        }
+        for prediction_id in group["prediction_ids"]
+    ]
+
+
+async def run_backfill_once(budget: DailyBudget) -> Dict[str, Any]:
+    """
+    One backfill pass:
+
+    1. Fetch predictions missing ai_explanation (fewest attempts, oldest first)
+    2. Group them by canonical LLM input (identical inputs share one answer)
+    3. Answer groups from the explanation cache where possible
+    4. Pack the rest BACKFILL_BATCH_SIZE per prompt, within the daily budget
+    5. Write everything back in one bulk update; count an attempt for
+       every prediction the LLM did not answer
+    """
+    start_time = time.time()
+    summary = {"scanned": 0, "groups": 0, "from_cache": 0, "generated": 0,
+               "llm_calls": 0, "failed_batches": 0, "written": 0, "attempts_recorded": 0, "stopped": None}
+
+    # 1️⃣ Fetch
+    predictions = await asyncio.to_thread(fetch_missing_explanations)
+    summary["scanned"] = len(predictions)
+    if not predictions:
+        return summary
+
+    # 2️⃣ Group by canonical input
+    groups: Dict[str, Dict[str, Any]] = {}
+    for pred in predictions:
+        structured_data = canonical_input(pred["features"], pred["tirads"], pred["confidence"])
+        group = groups.setdefault(
+            cache_key(structured_data, MODEL_ID),
+            {"structured_data": structured_data, "prediction_ids": []}
+        )
+        group["prediction_ids"].append(pred["id"])
+    summary["groups"] = len(groups)
+
+    # 3️⃣ Cache hits cost nothing
+    updates: List[dict] = []
+    pending: List[Dict[str, Any]] = []
+    for group in groups.values():
+        cached = await explanation_cache.lookup(group["structured_data"], MODEL_ID)
+        if cached:
+            text, source = cached
+            updates += _updates_for(group, text, {"cache": source})
+            summary["from_cache"] += 1
+        else:
+            pending.append(group)
+
+    # 4️⃣ Batched LLM calls
+    failed_ids: List[str] = []
+    for i in range(0, len(pending), BACKFILL_BATCH_SIZE):
+        if not await asyncio.to_thread(budget.try_spend):
+            summary["stopped"] = "budget_exhausted"
+            break
+
+        batch = pending[i:i + BACKFILL_BATCH_SIZE]
+        labelled = {f"P{n + 1}": group for n, group in enumerate(batch)}
+
+        summary["llm_calls"] += 1
+        call_start = time.time()
+        try:
+            answers = await generate_batch_explanations(
+                {label: group["structured_data"] for label, group in labelled.items()}
+            )
+        except LLMUnavailable as e:
+            # Circuit open / rate limited / no free slot - leave the rest for the next run
+            summary["stopped"] = str(e)
+            break
+        except Exception:
+            summary["failed_batches"] += 1
+            for group in batch:
+                failed_ids += group["prediction_ids"]
+            continue
+
+        generation_time_ms = int((time.time() - call_start) * 1000)
+        for label, group in labelled.items():
+            text = answers.get(label)
+            if not text:
+                failed_ids += group["prediction_ids"]  # retried later, up to BACKFILL_MAX_ATTEMPTS
+                continue
+            await explanation_cache.store(group["structured_data"], MODEL_ID, text)
+            updates += _updates_for(group, text, {
+                "cache": "generated",
+                "generation_time_ms": generation_time_ms,
+                "batch_size": len(batch)
+            })
+            summary["generated"] += 1
+
+    # 5️⃣ Bulk write-back
+    if updates:
+        summary["written"] = await asyncio.to_thread(write_explanations, updates)
+    if failed_ids:
+        summary["attempts_recorded"] = await asyncio.to_thread(record_attempts, failed_ids)
+
+    log_event(
+        level="INFO",
+        action="EXPLANATION_BACKFILL",
+        actor_role="system",
+        resource_type="prediction",
+        metadata={**summary, "duration_ms": int((time.time() - start_time) * 1000)}
+    )
+    return summary
+
+
+async def backfill_worker(budget: DailyBudget = None):
+    """Long-running loop started from main.py when EXPLANATION_BACKFILL_ENABLED=true."""
+    budget = budget or DailyBudget()
+    while True:
+        now = datetime.datetime.now(datetime.timezone.utc).time()
+        if in_window(now):
+            try:
+                if await asyncio.to_thread(budget.remaining) > 0:
+                    await run_backfill_once(budget)
+            except Exception as e:
+                print(f"Explanation backfill failed: {e}")
+        await asyncio.sleep(BACKFILL_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    # One-off pass outside the window, e.g. from a cron job:
+    #   python -m app.services.explainability.backfill
+    print(asyncio.run(run_backfill_once(DailyBudget())))
@@ -0,0 +1,191 @@
+# Explanation cache
+
+import os
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Awaitable, Optional, Tuple
+
+from app.db.supabase import supabase_admin
+from app.services.explainability.prompt_templates import EXPLAINER_SYSTEM_PROMPT, EXPLAINER_USER_PROMPT_TEMPLATE
+
+EXPLANATION_CACHE_SIZE = int(os.getenv("EXPLANATION_CACHE_SIZE", "2048"))
+EXPLANATION_CACHE_TABLE = os.getenv("EXPLANATION_CACHE_TABLE", "llm_explanation_cache")
+# Confidence is bucketed so near-identical predictions share an explanation
+CONFIDENCE_BUCKET = float(os.getenv("EXPLANATION_CONFIDENCE_BUCKET", "0.05"))
+
+# Any edit to the prompts invalidates every cached explanation
+PROMPT_VERSION = hashlib.sha256(
+    (EXPLAINER_SYSTEM_PROMPT + EXPLAINER_USER_PROMPT_TEMPLATE).encode()
+).hexdigest()[:12]
+
+
+def bucket_confidence(confidence: float) -> float:
+    return round(round(float(confidence) / CONFIDENCE_BUCKET) * CONFIDENCE_BUCKET, 2)
+
+
+def canonical_features(features: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Clinical content of a features payload as one flat map {name: "value"},
+    without per-image noise - the same prediction gets the same cache key
+    whichever shape it arrives in:
+    - pipeline output: {name: "value"}
+    - stored prediction: {"clinical_features": {name: {value, points, ...}}, "total_points", "measurements"}
+
+    The flat map is also what generate_fallback_explanation reads.
+    """
+    features = features or {}
+    clinical = features.get("clinical_features", features)
+
+    canonical = {}
+    for name, data in clinical.items():
+        if name in ("total_points", "measurements"):
+            continue
+        value = data.get("value") if isinstance(data, dict) else data
+        if value is not None:
+            canonical[name] = str(value)
+    return canonical
+
+
+def canonical_input(features: Dict[str, Any], tirads: int, confidence: float) -> Dict[str, Any]:
+    """Structured LLM input: what the prompt is built from and what the cache keys on."""
+    return {
+        "tirads": tirads,
+        "overall_confidence": f"{bucket_confidence(confidence):.2f}",
+        "features": canonical_features(features),
+    }
+
+
+def cache_key(structured_data: Dict[str, Any], model_id: str) -> str:
+    payload = json.dumps(
+        {"input": structured_data, "prompt": PROMPT_VERSION, "model": model_id},
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Two-tier cache of LLM explanations.
+
+    - Tier 1: in-process LRU
+    - Tier 2: Supabase table (shared by all workers, survives restarts)
+    Concurrent misses on the same key share a single LLM call.
+    """
+
+    def __init__(self, max_entries: int = EXPLANATION_CACHE_SIZE, table: str = EXPLANATION_CACHE_TABLE):
+        self.max_entries = max_entries
+        self.table = table
+        self._lru: "OrderedDict[str, str]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def stats(self) -> Dict[str, Any]:
+        """Tier-1 occupancy for the metrics endpoint (per worker process)."""
+        return {
+            "entries": len(self._lru),
+            "max_entries": self.max_entries,
+            "inflight": len(self._inflight),
+        }
+
+    # ---- tier 1 ----
+    def _lru_get(self, key: str) -> Optional[str]:
+        value = self._lru.get(key)
+        if value is not None:
+            self._lru.move_to_end(key)
+        return value
+
+    def _lru_put(self, key: str, value: str):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    # ---- tier 2 ----
+    def _persistent_get(self, key: str) -> Optional[str]:
+        try:
+            res = supabase_admin.table(self.table).select("explanation").eq("key", key).limit(1).execute()
+            return res.data[0]["explanation"] if res.data else None
+        except Exception as e:
+            print(f"Explanation cache read failed: {e}")
+            return None
+
+    def _persistent_put(self, key: str, value: str, model_id: str, structured_data: Dict[str, Any]):
+        try:
+            supabase_admin.table(self.table).upsert({
+                "key": key,
+                "explanation": value,
+                "model_id": model_id,
+                "prompt_version": PROMPT_VERSION,
+                "input_snapshot": structured_data,
+            }).execute()
+        except Exception as e:
+            print(f"Explanation cache write failed: {e}")
+
+    async def lookup(self, structured_data: Dict[str, Any], model_id: str) -> Optional[Tuple[str, str]]:
+        """(explanation, "memory" | "persistent") or None - never generates."""
+        key = cache_key(structured_data, model_id)
+        cached = self._lru_get(key)
+        if cached is not None:
+            return cached, "memory"
+        cached = await asyncio.to_thread(self._persistent_get, key)
+        if cached is not None:
+            self._lru_put(key, cached)
+            return cached, "persistent"
+        return None
+
+    async def store(self, structured_data: Dict[str, Any], model_id: str, text: str):
+        key = cache_key(structured_data, model_id)
+        self._lru_put(key, text)
+        await asyncio.to_thread(self._persistent_put, key, text, model_id, structured_data)
+
+    async def get_or_generate(
+        self,
+        structured_data: Dict[str, Any],
+        model_id: str,
+        generate: Callable[[], Awaitable[str]],
+        is_cacheable: Callable[[str], bool] = lambda text: True,
+    ) -> Tuple[str, str]:
+        """
+        Returns (explanation, source) where source is one of
+        "memory", "persistent", "coalesced" or "generated".
+        """
+        key = cache_key(structured_data, model_id)
+
+        cached = self._lru_get(key)
+        if cached is not None:
+            return cached, "memory"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight), "coalesced"
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            cached = await asyncio.to_thread(self._persistent_get, key)
+            if cached is not None:
+                self._lru_put(key, cached)
+                future.set_result(cached)
+                return cached, "persistent"
+
+            text = await generate()
+            # Release coalesced waiters before the persistent write
+            future.set_result(text)
+            if is_cacheable(text):
+                self._lru_put(key, text)
+                await asyncio.to_thread(self._persistent_put, key, text, model_id, structured_data)
+            return text, "generated"
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else awaiting -> don't leave "exception never retrieved" noise
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+explanation_cache = ExplanationCache()
@@ -1,9 +1,18 @@
 # LLM client
 
 import os
+import json
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict
 from google import genai
 from google.genai import types
-from app.services.explainability.prompt_templates import EXPLAINER_SYSTEM_PROMPT, EXPLAINER_USER_PROMPT_TEMPLATE
+from app.services.explainability.prompt_templates import (
+    EXPLAINER_SYSTEM_PROMPT,
+    EXPLAINER_USER_PROMPT_TEMPLATE,
+    EXPLAINER_BATCH_USER_PROMPT_TEMPLATE,
+)
+from app.utils.resilience import CircuitBreaker, TokenBucket
 
 # Configure API Key
 api_key = os.getenv("GEMINI_API_KEY")
@@ -17,6 +26,121 @@ else:
 
 MODEL_ID = "gemini-2.0-flash-lite"
 
+# ---------------------------
+# Upstream protection
+# ---------------------------
+# Per-call deadline, from when a concurrency slot is held. Waiting for the
+# slot is bounded by the same amount but is not an upstream failure.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "8"))
+# Max concurrent Gemini calls per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+# Request quota (requests per minute) and how long a call may wait for a token
+LLM_RATE_LIMIT_RPM = float(os.getenv("LLM_RATE_LIMIT_RPM", "30"))
+LLM_RATE_LIMIT_WAIT_SECONDS = float(os.getenv("LLM_RATE_LIMIT_WAIT_SECONDS", "2"))
+# Streaming: max silence between chunks once the first one has arrived
+LLM_STREAM_IDLE_SECONDS = float(os.getenv("LLM_STREAM_IDLE_SECONDS", "10"))
+
+llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+llm_rate_limiter = TokenBucket(rate=LLM_RATE_LIMIT_RPM / 60.0, capacity=max(1.0, LLM_RATE_LIMIT_RPM / 6.0))
+llm_circuit_breaker = CircuitBreaker(
+    "gemini",
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+)
+
+llm_stats = {
+    "calls": 0,
+    "fallback_disabled": 0,
+    "fallback_circuit_open": 0,
+    "fallback_rate_limited": 0,
+    "fallback_busy": 0,
+    "fallback_timeout": 0,
+    "fallback_error": 0,
+}
+# Recent streaming time-to-first-token samples (ms)
+ttft_samples = deque(maxlen=500)
+
+
+class LLMUnavailable(Exception):
+    """The call was never sent upstream (no client, circuit open or rate limited)."""
+
+
+def record_ttft(ms: int):
+    ttft_samples.append(ms)
+
+
+def _percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def is_quota_error(exc: Exception) -> bool:
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+
+def get_llm_metrics() -> dict:
+    """Client state for the metrics endpoint."""
+    return {
+        "model": MODEL_ID,
+        "configured": client is not None,
+        "circuit_breaker": llm_circuit_breaker.snapshot(),
+        "rate_limiter": {
+            "rpm": LLM_RATE_LIMIT_RPM,
+            "tokens_available": llm_rate_limiter.available,
+        },
+        "concurrency": {
+            "limit": LLM_MAX_CONCURRENCY,
+            "in_use": LLM_MAX_CONCURRENCY - llm_semaphore._value,
+        },
+        "timeout_seconds": LLM_TIMEOUT_SECONDS,
+        "stream_ttft_ms": {
+            "samples": len(ttft_samples),
+            "p50": _percentile(ttft_samples, 0.50),
+            "p95": _percentile(ttft_samples, 0.95),
+        },
+        **llm_stats,
+    }
+
+
+def build_user_prompt(structured_data: dict) -> str:
+    return EXPLAINER_USER_PROMPT_TEMPLATE.format(
+        tirads=structured_data.get("tirads", "Unknown"),
+        structured_data=structured_data
+    )
+
+
+async def admit_llm_call() -> str:
+    """
+    Gatekeeping shared by every Gemini call.
+    Returns None if the call may proceed, else the llm_stats fallback reason.
+    """
+    if not client:
+        return "fallback_disabled"
+    if not llm_circuit_breaker.allow_request():
+        return "fallback_circuit_open"
+    if not await llm_rate_limiter.acquire(timeout=LLM_RATE_LIMIT_WAIT_SECONDS):
+        # Never reached upstream - don't hold the half-open probe slot
+        llm_circuit_breaker.release()
+        return "fallback_rate_limited"
+    return None
+
+
+async def acquire_llm_slot():
+    """
+    Waits for one of the LLM_MAX_CONCURRENCY slots (release with
+    llm_semaphore.release()). Raises LLMUnavailable("fallback_busy") if none
+    frees up within LLM_TIMEOUT_SECONDS - nothing was sent upstream, so the
+    breaker only gives back its half-open probe slot.
+    """
+    try:
+        await asyncio.wait_for(llm_semaphore.acquire(), timeout=LLM_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        llm_circuit_breaker.release()
+        raise LLMUnavailable("fallback_busy")
+
 
 def generate_fallback_explanation(structured_data: dict) -> str:
     """
@@ -52,39 +176,203 @@ def generate_fallback_explanation(structured_data: dict) -> str:
     return summary
 
 
+async def _call_gemini(user_prompt: str):
+    await acquire_llm_slot()
+    try:
+        # The deadline starts once the slot is held
+        return await asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=MODEL_ID,
+                contents=[EXPLAINER_SYSTEM_PROMPT, user_prompt],
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=256,
+                )
+            ),
+            timeout=LLM_TIMEOUT_SECONDS
+        )
+    finally:
+        llm_semaphore.release()
+
+
 async def generate_explanation(structured_data: dict, use_llm: bool = True) -> str:
     """
     Generate explanation using Gemini based on structured vision data.
     If use_llm is False, skips LLM and returns rule-based summary.
-    Falls back to a rule-based summary if the API fails (e.g., quota exceeded).
+    Falls back to a rule-based summary if the API fails (e.g., quota exceeded),
+    times out, is rate limited locally, or the circuit breaker is open.
     """
-    if not use_llm or not client:
+    if not use_llm:
         return generate_fallback_explanation(structured_data)
 
-    try:
-        tirads = structured_data.get("tirads", "Unknown")
-        
-        user_prompt = EXPLAINER_USER_PROMPT_TEMPLATE.format(
-            tirads=tirads,
-            structured_data=structured_data
-        )
+    rejected = await admit_llm_call()
+    if rejected:
+        llm_stats[rejected] += 1
+        return generate_fallback_explanation(structured_data)
 
-        response = client.models.generate_content(
-            model=MODEL_ID,
-            contents=[EXPLAINER_SYSTEM_PROMPT, user_prompt],
-            config=types.GenerateContentConfig(
-                temperature=0.2,
-                max_output_tokens=256,
-            )
-        )
-        
-        if not response.text:
-            return generate_fallback_explanation(structured_data)
-            
-        return response.text.strip()
-        
+    llm_stats["calls"] += 1
+    try:
+        response = await _call_gemini(build_user_prompt(structured_data))
+    except LLMUnavailable as e:
+        llm_stats[str(e)] += 1
+        return generate_fallback_explanation(structured_data)
+    except asyncio.TimeoutError:
+        print(f"Gemini API timeout after {LLM_TIMEOUT_SECONDS}s")
+        llm_circuit_breaker.record_failure()
+        llm_stats["fallback_timeout"] += 1
+        return generate_fallback_explanation(structured_data)
     except Exception as e:
         # Check for Quota/Rate Limit (429) or other API issues
         print(f"Gemini API issue: {str(e)}")
+        llm_circuit_breaker.record_failure(trip=is_quota_error(e))
+        llm_stats["fallback_error"] += 1
         # Return fallback instead of error string to the user
         return generate_fallback_explanation(structured_data)
+
+    llm_circuit_breaker.record_success()
+
+    if not response.text:
+        return generate_fallback_explanation(structured_data)
+
+    return response.text.strip()
+
+
+async def stream_explanation(structured_data: dict) -> AsyncIterator[str]:
+    """
+    Yields Gemini text chunks as they arrive.
+    Raises LLMUnavailable if the call is not admitted, and re-raises upstream
+    errors / timeouts (after recording them on the breaker) so the caller
+    can switch to the rule-based explanation.
+    """
+    rejected = await admit_llm_call()
+    if rejected:
+        llm_stats[rejected] += 1
+        raise LLMUnavailable(rejected)
+
+    llm_stats["calls"] += 1
+    try:
+        await acquire_llm_slot()
+    except LLMUnavailable as e:
+        llm_stats[str(e)] += 1
+        raise
+
+    try:
+        stream = await asyncio.wait_for(
+            client.aio.models.generate_content_stream(
+                model=MODEL_ID,
+                contents=[EXPLAINER_SYSTEM_PROMPT, build_user_prompt(structured_data)],
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=256,
+                )
+            ),
+            timeout=LLM_TIMEOUT_SECONDS
+        )
+        chunks = stream.__aiter__()
+        # First chunk gets the full deadline, later ones the idle timeout
+        deadline = LLM_TIMEOUT_SECONDS
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline)
+            except StopAsyncIteration:
+                break
+            deadline = LLM_STREAM_IDLE_SECONDS
+            if chunk.text:
+                yield chunk.text
+    except (GeneratorExit, asyncio.CancelledError):
+        # Consumer went away - not an upstream failure
+        llm_circuit_breaker.release()
+        raise
+    except asyncio.TimeoutError:
+        print("Gemini stream timed out")
+        llm_circuit_breaker.record_failure()
+        llm_stats["fallback_timeout"] += 1
+        raise
+    except Exception as e:
+        print(f"Gemini stream issue: {str(e)}")
+        llm_circuit_breaker.record_failure(trip=is_quota_error(e))
+        llm_stats["fallback_error"] += 1
+        raise
+    finally:
+        llm_semaphore.release()
+
+    llm_circuit_breaker.record_success()
+
+
+def parse_batch_response(text: str) -> Dict[str, str]:
+    """{label: explanation} from a batch answer; tolerates ```json fences."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        raise ValueError("Batch response is not a JSON object")
+    return {
+        str(label): str(explanation).strip()
+        for label, explanation in data.items()
+        if isinstance(explanation, str) and explanation.strip()
+    }
+
+
+async def generate_batch_explanations(items: Dict[str, dict]) -> Dict[str, str]:
+    """
+    One Gemini call explaining several predictions.
+    `items` maps a short label (e.g. "P1") to structured data; returns
+    {label: explanation} for the labels the model answered.
+    Raises LLMUnavailable / upstream errors - no rule-based fallback here,
+    the backfill simply retries on its next run.
+    """
+    rejected = await admit_llm_call()
+    if rejected:
+        llm_stats[rejected] += 1
+        raise LLMUnavailable(rejected)
+
+    llm_stats["calls"] += 1
+    user_prompt = EXPLAINER_BATCH_USER_PROMPT_TEMPLATE.format(
+        count=len(items),
+        items=json.dumps(items, indent=2, default=str)
+    )
+
+    try:
+        await acquire_llm_slot()
+    except LLMUnavailable as e:
+        llm_stats[str(e)] += 1
+        raise
+
+    try:
+        # Longer answer -> proportionally longer deadline (from holding the slot)
+        response = await asyncio.wait_for(
+            client.aio.models.generate_content(
+                model=MODEL_ID,
+                contents=[EXPLAINER_SYSTEM_PROMPT, user_prompt],
+                config=types.GenerateContentConfig(
+                    temperature=0.2,
+                    max_output_tokens=256 * len(items),
+                    response_mime_type="application/json",
+                )
+            ),
+            timeout=LLM_TIMEOUT_SECONDS * max(1, len(items) // 2)
+        )
+        answers = parse_batch_response(response.text)
+    except asyncio.TimeoutError:
+        print("Gemini batch call timed out")
+        llm_circuit_breaker.record_failure()
+        llm_stats["fallback_timeout"] += 1
+        raise
+    except (json.JSONDecodeError, ValueError) as e:
+        # Upstream is healthy, the answer just wasn't usable
+        print(f"Gemini batch response unparseable: {str(e)}")
+        llm_circuit_breaker.record_success()
+        llm_stats["fallback_error"] += 1
+        raise
+    except Exception as e:
+        print(f"Gemini API issue: {str(e)}")
+        llm_circuit_breaker.record_failure(trip=is_quota_error(e))
+        llm_stats["fallback_error"] += 1
+        raise
+    finally:
+        llm_semaphore.release()
+
+    llm_circuit_breaker.record_success()
+    return {label: text for label, text in answers.items() if label in items}
@@ -18,4 +18,21 @@ Using ONLY the provided JSON data:
 
 DATA:
 {structured_data}
-"""
\ No newline at end of file
+"""
+
+# Backfill: several predictions per request (same rules, one answer each)
+EXPLAINER_BATCH_USER_PROMPT_TEMPLATE = """
+Below are {count} independent thyroid nodule analyses, each with a label.
+For EACH one, using ONLY its own JSON data:
+- Explain why its TI-RADS score was assigned.
+- Mention specific features listed (e.g., composition, echogenicity).
+- Reflect confidence values qualitatively (e.g., "high confidence", "moderate confidence").
+- Do NOT add clinical advice or follow-up steps.
+- Maximum 100 words per explanation.
+
+Respond with a single JSON object mapping every label to its explanation text,
+e.g. {{"P1": "...", "P2": "..."}}. No other text.
+
+DATA:
+{items}
+"""
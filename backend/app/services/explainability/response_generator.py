@@ -1,7 +1,17 @@
 # Generator
 import time
-from typing import Dict, Any
-from app.services.explainability.llm_client import generate_explanation
+from typing import Dict, Any, AsyncIterator
+from app.services.explainability.llm_client import (
+    generate_explanation,
+    generate_fallback_explanation,
+    stream_explanation,
+    record_ttft,
+    MODEL_ID,
+)
+from app.services.explainability.explanation_cache import explanation_cache, canonical_input
+
+FALLBACK_MARKER = "Clinical Summary (Rule-Based)"
+
 
 class ResponseGenerator:
     """
@@ -14,22 +24,29 @@ class ResponseGenerator:
         Takes vision model output and returns AI explanation + metadata.
         """
         start_time = time.time()
-        
+
         # Prepare structured data for the LLM
-        structured_data = {
-            "tirads": tirads,
-            "overall_confidence": f"{confidence:.2f}",
-            "features": features
-        }
+        # (canonical form: bucketed confidence, no per-image measurements)
+        structured_data = canonical_input(features, tirads, confidence)
+
+        # Call LLM (through the explanation cache)
+        cache_source = None
+        if use_llm:
+            explanation, cache_source = await explanation_cache.get_or_generate(
+                structured_data,
+                MODEL_ID,
+                lambda: generate_explanation(structured_data, use_llm=True),
+                # Never cache the rule-based fallback - retry the LLM next time
+                is_cacheable=lambda text: FALLBACK_MARKER not in text,
+            )
+        else:
+            explanation = await generate_explanation(structured_data, use_llm=False)
 
-        # Call LLM
-        explanation = await generate_explanation(structured_data, use_llm=use_llm)
-        
         generation_time_ms = int((time.time() - start_time) * 1000)
-        
+
         # Determine if it was a fallback response
-        is_fallback = "Clinical Summary (Rule-Based)" in explanation
-        engine_name = "Rule-Based Fallback" if is_fallback else "gemini-2.0-flash-lite"
+        is_fallback = FALLBACK_MARKER in explanation
+        engine_name = "Rule-Based Fallback" if is_fallback else MODEL_ID
 
         return {
             "ai_explanation": explanation,
@@ -37,6 +54,67 @@ class ResponseGenerator:
                 "engine": engine_name,
                 "generation_time_ms": generation_time_ms,
                 "input_snapshot": structured_data,
-                "is_fallback": is_fallback
+                "is_fallback": is_fallback,
+                "cache": cache_source
             }
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    async def stream(features: Dict[str, Any], tirads: int, confidence: float, use_llm: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of generate(). Yields events:
+
+        - {"type": "delta", "text": ...}     explanation text as it arrives
+        - {"type": "fallback", "text": ...}  stream failed - replaces everything sent so far
+        - {"type": "done", "ai_explanation": ..., "explanation_metadata": ...}  always last
+        """
+        start_time = time.time()
+        structured_data = canonical_input(features, tirads, confidence)
+
+        cache_source = None
+        time_to_first_token_ms = None
+        explanation = None
+
+        if use_llm:
+            cached = await explanation_cache.lookup(structured_data, MODEL_ID)
+            if cached:
+                explanation, cache_source = cached
+                time_to_first_token_ms = int((time.time() - start_time) * 1000)
+                yield {"type": "delta", "text": explanation}
+            else:
+                parts = []
+                try:
+                    async for text in stream_explanation(structured_data):
+                        if time_to_first_token_ms is None:
+                            time_to_first_token_ms = int((time.time() - start_time) * 1000)
+                            record_ttft(time_to_first_token_ms)
+                        parts.append(text)
+                        yield {"type": "delta", "text": text}
+                    explanation = "".join(parts).strip() or None
+                except Exception:
+                    explanation = None
+
+                if explanation:
+                    cache_source = "generated"
+                    await explanation_cache.store(structured_data, MODEL_ID, explanation)
+
+        if explanation is None:
+            explanation = generate_fallback_explanation(structured_data)
+            if time_to_first_token_ms is None:
+                time_to_first_token_ms = int((time.time() - start_time) * 1000)
+            yield {"type": "fallback", "text": explanation}
+
+        is_fallback = FALLBACK_MARKER in explanation
+        yield {
+            "type": "done",
+            "ai_explanation": explanation,
+            "explanation_metadata": {
+                "engine": "Rule-Based Fallback" if is_fallback else MODEL_ID,
+                "generation_time_ms": int((time.time() - start_time) * 1000),
+                "time_to_first_token_ms": time_to_first_token_ms,
+                "input_snapshot": structured_data,
+                "is_fallback": is_fallback,
+                "cache": cache_source,
+                "streamed": True
+            }
+        }
@@ -0,0 +1,159 @@
+"""
+Cine Clip Inference
+===================
+
+Helpers for running the pipeline over a multi-frame (cine) DICOM without
+paying for both models on every frame:
+
+- Keyframes: at most CINE_MAX_KEYFRAMES frames, evenly spaced over the
+  clip. Only these are ever decoded.
+- ROI reuse: the detector runs on the first keyframe; following keyframes
+  take its box over via template matching (normalized cross-correlation
+  of the nodule patch inside a search window around the last box). The
+  detector runs again when the match drops below CINE_TRACK_MIN_SCORE,
+  after CINE_REDETECT_EVERY keyframes, or when the last detection was the
+  whole-image fallback.
+- Batching: keyframe ROIs are classified CINE_BATCH_SIZE at a time in one
+  forward pass.
+- Aggregation: the per-keyframe feature and TI-RADS distributions are
+  averaged into one assessment, then scored by the ACR rule engine as for
+  a single image.
+"""
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.services.preprocessing.decoding import to_uint8
+from app.services.rules.tirads import calculate_tirads
+
+CINE_MAX_KEYFRAMES = int(os.getenv("CINE_MAX_KEYFRAMES", "16"))
+CINE_BATCH_SIZE = int(os.getenv("CINE_BATCH_SIZE", "8"))
+CINE_REDETECT_EVERY = int(os.getenv("CINE_REDETECT_EVERY", "4"))
+CINE_TRACK_MIN_SCORE = float(os.getenv("CINE_TRACK_MIN_SCORE", "0.6"))
+
+# Search window around the last box, as a fraction of the box size per side
+TRACK_SEARCH_MARGIN = 0.5
+
+ACR_FEATURES = ['composition', 'echogenicity', 'shape', 'margin', 'echogenic_foci']
+
+
+def sample_keyframes(frame_count: int, max_keyframes: int = CINE_MAX_KEYFRAMES) -> List[int]:
+    """Evenly spaced frame indices, first and last frame included."""
+    if frame_count <= max_keyframes:
+        return list(range(frame_count))
+    return np.linspace(0, frame_count - 1, max_keyframes).round().astype(int).tolist()
+
+
+def tracking_view(frame: np.ndarray) -> np.ndarray:
+    """8-bit single-channel frame for template matching."""
+    frame = to_uint8(frame)
+    return cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) if frame.ndim == 3 else frame
+
+
+def _int_box(box: Dict, width: int, height: int) -> Tuple[int, int, int, int]:
+    x1 = max(0, min(int(box["xmin"]), width - 1))
+    y1 = max(0, min(int(box["ymin"]), height - 1))
+    x2 = max(x1 + 1, min(int(box["xmax"]), width))
+    y2 = max(y1 + 1, min(int(box["ymax"]), height))
+    return x1, y1, x2, y2
+
+
+class BoxTracker:
+    """Carries an ROI box from one keyframe to the next by template matching."""
+
+    def __init__(self, min_score: float = CINE_TRACK_MIN_SCORE, margin: float = TRACK_SEARCH_MARGIN):
+        self.min_score = min_score
+        self.margin = margin
+        self._template: Optional[np.ndarray] = None
+        self._box: Optional[Tuple[int, int, int, int]] = None
+
+    def reset(self, gray: np.ndarray, box: Dict):
+        """Start from a detected box on `gray` (tracking_view of its frame)."""
+        h, w = gray.shape
+        self._box = _int_box(box, w, h)
+        x1, y1, x2, y2 = self._box
+        self._template = gray[y1:y2, x1:x2].copy()
+
+    def track(self, gray: np.ndarray) -> Optional[Tuple[Dict, float]]:
+        """
+        Box on the next keyframe and its match score, or None when the
+        nodule could not be followed (re-detect).
+        """
+        if self._template is None or self._template.std() == 0:
+            return None     # flat patch - correlation is undefined
+
+        h, w = gray.shape
+        x1, y1, x2, y2 = self._box
+        bw, bh = x2 - x1, y2 - y1
+        mx, my = int(bw * self.margin), int(bh * self.margin)
+        sx1, sy1 = max(0, x1 - mx), max(0, y1 - my)
+        sx2, sy2 = min(w, x2 + mx), min(h, y2 + my)
+        if sx2 - sx1 < bw or sy2 - sy1 < bh:
+            return None
+
+        result = cv2.matchTemplate(gray[sy1:sy2, sx1:sx2], self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(result)
+        if not np.isfinite(score) or score < self.min_score:
+            return None
+
+        # Follow the nodule: the matched patch is the next template
+        x1, y1 = sx1 + dx, sy1 + dy
+        self._box = (x1, y1, x1 + bw, y1 + bh)
+        self._template = gray[y1:y1 + bh, x1:x1 + bw].copy()
+        box = {"xmin": float(x1), "ymin": float(y1), "xmax": float(x1 + bw), "ymax": float(y1 + bh)}
+        return box, float(score)
+
+
+def predicted_tirads(class_result: Dict) -> int:
+    """TI-RADS class of one classifier result (distribution head, else rule engine)."""
+    confidences = class_result.get("tirads_confidences") or {}
+    if confidences:
+        return int(max(confidences, key=confidences.get).split("_")[1])
+    return calculate_tirads(class_result["feature_results"])["tirads"]
+
+
+def aggregate_results(results: List[Dict], representative: int = 0) -> Dict:
+    """
+    Mean of per-keyframe classifier results, in FeatureClassifier.classify's
+    output format. Grad-CAM data comes from the representative keyframe.
+    """
+    predicted_features = {}
+    feature_results = {}
+
+    for feature_name in ACR_FEATURES:
+        # Classes the head actually outputs, in index order
+        classes = list(results[0]["feature_results"][feature_name]["all_probabilities"])
+        mean_probs = np.mean([
+            [r["feature_results"][feature_name]["all_probabilities"][c] for c in classes]
+            for r in results
+        ], axis=0)
+        predicted_idx = int(np.argmax(mean_probs))
+
+        predicted_features[feature_name] = classes[predicted_idx]
+        feature_results[feature_name] = {
+            'index': predicted_idx,
+            'value': classes[predicted_idx],
+            'confidence': round(float(mean_probs[predicted_idx]), 4),
+            'all_probabilities': {
+                classes[i]: round(float(mean_probs[i]), 4)
+                for i in range(len(classes))
+            }
+        }
+
+    tirads_confidences = {}
+    if all(r.get("tirads_confidences") for r in results):
+        tirads_confidences = {
+            key: float(np.mean([r["tirads_confidences"][key] for r in results]))
+            for key in results[0]["tirads_confidences"]
+        }
+
+    return {
+        "features": predicted_features,
+        "feature_results": feature_results,
+        "tirads_confidences": tirads_confidences,
+        "grad_cam_data": results[representative].get("grad_cam_data"),
+        "classifier": results[0]["classifier"],
+    }
@@ -0,0 +1,173 @@
+# Execution mode shared by FeatureClassifier and FasterRCNNDetector
+
+"""
+Model Execution Mode
+====================
+
+How the models run, configured from the environment:
+
+- MODEL_MEMORY_FORMAT: "channels_last" (default) or "contiguous" (NCHW).
+  channels_last lets oneDNN use its NHWC kernels - notably faster for
+  Xception's separable convolutions on AVX-512 CPUs.
+- MODEL_INFERENCE_MODE: "true" (default) runs forward passes under
+  torch.inference_mode, "false" under torch.no_grad.
+- MODEL_COMPILE: "true" wraps each model's convolutional backbone in
+  torch.compile (off by default: the first call compiles, ~1 min on CPU).
+  The detector's RPN / ROI heads have data-dependent shapes and stay eager.
+- MODEL_WARMUP: run one dummy forward pass per model at startup so the
+  first request does not pay for compilation. Defaults to MODEL_COMPILE.
+- BACKGROUND_TORCH_THREADS: intra-op threads of the background jobs'
+  forward passes (re-scoring, shadow evaluation), default 1. Their
+  threads are also reniced, so interactive requests win contended cores.
+
+torch.set_num_threads is not per thread: it also sets the count that
+threads started afterwards inherit. So a background pass cannot simply
+cap its own thread. Instead every forward pass goes through
+inference_context(). Interactive passes share the process's count
+(INTERACTIVE_TORCH_THREADS). A background pass runs capped only while no
+interactive pass is running, and restores the count afterwards. The two
+wait for each other, one forward pass at a time.
+"""
+
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+
+import torch
+
+MEMORY_FORMATS = {
+    "channels_last": torch.channels_last,
+    "contiguous": torch.contiguous_format,
+}
+
+MODEL_MEMORY_FORMAT = os.getenv("MODEL_MEMORY_FORMAT", "channels_last").strip().lower()
+MODEL_INFERENCE_MODE = os.getenv("MODEL_INFERENCE_MODE", "true").lower() == "true"
+MODEL_COMPILE = os.getenv("MODEL_COMPILE", "false").lower() == "true"
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", str(MODEL_COMPILE)).lower() == "true"
+BACKGROUND_TORCH_THREADS = int(os.getenv("BACKGROUND_TORCH_THREADS", "1"))
+# The process's count at startup (torch default / OMP_NUM_THREADS)
+INTERACTIVE_TORCH_THREADS = torch.get_num_threads()
+
+if MODEL_MEMORY_FORMAT not in MEMORY_FORMATS:
+    raise RuntimeError(
+        f"MODEL_MEMORY_FORMAT must be one of {', '.join(MEMORY_FORMATS)} (got {MODEL_MEMORY_FORMAT!r})"
+    )
+
+memory_format = MEMORY_FORMATS[MODEL_MEMORY_FORMAT]
+
+
+class TorchThreadBudget:
+    """Interactive forward passes share; a capped background pass is exclusive."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._interactive = 0
+        self._capped = False
+        self._local = threading.local()    # background flag, nesting depth
+
+    @contextmanager
+    def interactive(self):
+        with self._cond:
+            while self._capped:
+                self._cond.wait()
+            self._interactive += 1
+        try:
+            # A thread that first used torch during a capped pass inherited its count
+            if torch.get_num_threads() != INTERACTIVE_TORCH_THREADS:
+                torch.set_num_threads(INTERACTIVE_TORCH_THREADS)
+            yield
+        finally:
+            with self._cond:
+                self._interactive -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def capped(self, threads: int):
+        with self._cond:
+            while self._capped or self._interactive:
+                self._cond.wait()
+            self._capped = True
+        try:
+            torch.set_num_threads(threads)
+            yield
+        finally:
+            torch.set_num_threads(INTERACTIVE_TORCH_THREADS)
+            with self._cond:
+                self._capped = False
+                self._cond.notify_all()
+
+    @contextmanager
+    def forward_pass(self):
+        """capped() on a background_thread_init thread, interactive() elsewhere."""
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            section = nullcontext()
+        elif getattr(self._local, "background", False):
+            section = self.capped(BACKGROUND_TORCH_THREADS)
+        else:
+            section = self.interactive()
+        self._local.depth = depth + 1
+        try:
+            with section:
+                yield
+        finally:
+            self._local.depth = depth
+
+    def mark_background(self):
+        self._local.background = True
+
+
+thread_budget = TorchThreadBudget()
+
+
+@contextmanager
+def inference_context():
+    """Context manager for model forward passes (thread budget + inference mode)."""
+    with thread_budget.forward_pass():
+        with (torch.inference_mode() if MODEL_INFERENCE_MODE else torch.no_grad()):
+            yield
+
+
+def prepare_model(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Apply the memory format and (optionally) compile `model.backbone`.
+    Call after the weights are loaded and the model is on its device.
+    """
+    model.eval()
+    model.to(memory_format=memory_format)
+    if MODEL_COMPILE:
+        model.backbone = torch.compile(model.backbone)
+    return model
+
+
+def to_model_input(tensor: torch.Tensor, device: torch.device) -> torch.Tensor:
+    """
+    Move a 4-D batch to `device` in the model's memory format. A no-op for
+    inputs already laid out that way (the fused preprocessing produces
+    NHWC-strided tensors); materializes broadcast grayscale channels.
+    """
+    return tensor.to(device, memory_format=memory_format)
+
+
+def background_thread_init():
+    """
+    Initializer of a background job's dedicated executor thread: its
+    forward passes run capped (see TorchThreadBudget), and the thread is
+    reniced.
+    """
+    thread_budget.mark_background()
+    # Linux renices the calling thread only; best effort elsewhere
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (AttributeError, OSError):
+        pass
+
+
+def describe() -> dict:
+    return {
+        "memory_format": MODEL_MEMORY_FORMAT,
+        "inference_mode": MODEL_INFERENCE_MODE,
+        "compile": MODEL_COMPILE,
+        "torch_threads": torch.get_num_threads(),
+        "background_torch_threads": BACKGROUND_TORCH_THREADS,
+    }
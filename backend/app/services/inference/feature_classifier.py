@@ -3,8 +3,9 @@
 import os
 import torch
 import numpy as np
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from app.models.xception_model import XceptionMultiOutput, FEATURE_DEFINITIONS
+from app.services.inference.execution import inference_context, prepare_model, to_model_input
 
 class FeatureClassifier:
     """
@@ -28,9 +29,20 @@ class FeatureClassifier:
         if self._model is None:
             self._load_model()
 
-    def _load_model(self):
+    @classmethod
+    def candidate(cls, model_path: str, version: str) -> "FeatureClassifier":
+        """
+        Separate instance (not the singleton) loaded from other weights,
+        e.g. a model under shadow evaluation.
+        """
+        instance = super(FeatureClassifier, cls).__new__(cls)
+        instance.MODEL_VERSION = version
+        instance._load_model(model_path)
+        return instance
+
+    def _load_model(self, model_path: Optional[str] = None):
         """Load the model weights from the path specified in .env"""
-        model_path = os.getenv("XCEPTION_MODEL_PATH")
+        model_path = model_path or os.getenv("XCEPTION_MODEL_PATH")
         if not model_path:
             raise RuntimeError("XCEPTION_MODEL_PATH not found in environment variables")
         
@@ -38,6 +50,7 @@ class FeatureClassifier:
             raise FileNotFoundError(f"Model file not found at: {model_path}")
 
         print(f"Loading Xception model from {model_path}...")
+        self.model_path = model_path
         
         # Initialize architecture
         self._model = XceptionMultiOutput(pretrained=False)
@@ -70,7 +83,7 @@ class FeatureClassifier:
             print(f"ℹ️ Note: Unexpected keys in state_dict: {len(unexpected_keys)}")
 
         self._model.to(device)
-        self._model.eval()
+        prepare_model(self._model)
         self.device = device
         print("✓ Xception model loaded (non-strict mode)")
 
@@ -83,46 +96,62 @@ class FeatureClassifier:
         Returns:
             Dict: Comprehensive prediction results including features and probabilities.
         """
+        return self.classify_batch(roi_tensor)[0]
+
+    def classify_batch(self, roi_tensor: torch.Tensor) -> List[Dict]:
+        """
+        Run inference on a batch of preprocessed ROIs in one forward pass.
+
+        Args:
+            roi_tensor: Preprocessed tensor of shape (N, 3, 299, 299)
+        Returns:
+            List[Dict]: One classify() result per row.
+        """
         if roi_tensor.dim() == 3:
             roi_tensor = roi_tensor.unsqueeze(0)
         
-        roi_tensor = roi_tensor.to(self.device)
+        roi_tensor = to_model_input(roi_tensor, self.device)
 
-        with torch.no_grad():
+        with inference_context():
             outputs = self._model(roi_tensor)
+            probs = {
+                name: torch.softmax(logits, dim=1).cpu().numpy()
+                for name, logits in outputs.items()
+            }
+
+        return [self._build_result(probs, row) for row in range(roi_tensor.shape[0])]
+
+    def _build_result(self, probs: Dict[str, np.ndarray], row: int) -> Dict:
+        predicted_features = {}
+        feature_results = {}
+        tirads_confidences = {}
+        
+        # Process ACR features
+        for feature_name in ['composition', 'echogenicity', 'shape', 'margin', 'echogenic_foci']:
+            feature_probs = probs[feature_name][row]
+            predicted_idx = int(np.argmax(feature_probs))
+            confidence = float(feature_probs[predicted_idx])
             
-            predicted_features = {}
-            feature_results = {}
-            tirads_confidences = {}
+            class_name = FEATURE_DEFINITIONS[feature_name]['classes'][predicted_idx]
             
-            # Process ACR features
-            for feature_name in ['composition', 'echogenicity', 'shape', 'margin', 'echogenic_foci']:
-                logits = outputs[feature_name]
-                probs = torch.softmax(logits, dim=1).cpu().numpy()[0]
-                predicted_idx = int(np.argmax(probs))
-                confidence = float(probs[predicted_idx])
-                
-                class_name = FEATURE_DEFINITIONS[feature_name]['classes'][predicted_idx]
-                
-                predicted_features[feature_name] = class_name
-                feature_results[feature_name] = {
-                    'index': predicted_idx,
-                    'value': class_name,
-                    'confidence': round(confidence, 4),
-                    'all_probabilities': {
-                        FEATURE_DEFINITIONS[feature_name]['classes'][i]: round(float(probs[i]), 4)
-                        for i in range(len(probs))
-                    }
+            predicted_features[feature_name] = class_name
+            feature_results[feature_name] = {
+                'index': predicted_idx,
+                'value': class_name,
+                'confidence': round(confidence, 4),
+                'all_probabilities': {
+                    FEATURE_DEFINITIONS[feature_name]['classes'][i]: round(float(feature_probs[i]), 4)
+                    for i in range(len(feature_probs))
                 }
+            }
 
-            # Process TI-RADS distribution (from the 'fc' / 'tirads_head' layer)
-            if 'tirads' in outputs:
-                tirads_logits = outputs['tirads']
-                tirads_probs = torch.softmax(tirads_logits, dim=1).cpu().numpy()[0]
-                tirads_confidences = {
-                    f"TIRADS_{i+1}": float(tirads_probs[i])
-                    for i in range(len(tirads_probs))
-                }
+        # Process TI-RADS distribution (from the 'fc' / 'tirads_head' layer)
+        if 'tirads' in probs:
+            tirads_probs = probs['tirads'][row]
+            tirads_confidences = {
+                f"TIRADS_{i+1}": float(tirads_probs[i])
+                for i in range(len(tirads_probs))
+            }
 
         # Placeholder for Grad-CAM (matching user request structure)
         grad_cam_data = {
@@ -141,3 +170,7 @@ class FeatureClassifier:
                 "device": str(self.device)
             },
         }
+
+    def warmup(self):
+        """One dummy forward pass (compiles the backbone when MODEL_COMPILE is on)."""
+        self.classify(torch.zeros((1, 3, 299, 299)))
@@ -4,17 +4,28 @@
 import time
 import os
 from datetime import datetime
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 from io import BytesIO
 
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
 from app.services.inference.roi_detector import FasterRCNNDetector
 from app.services.inference.feature_classifier import FeatureClassifier
 from app.services.rules.tirads import calculate_tirads
 from app.services.inference.box_utils import xyxy_to_xywh
 from app.services.explainability.response_generator import ResponseGenerator
-import numpy as np
-from app.services.preprocessing.feature_preprocessing import xception_preprocess_from_array
+from app.services.inference.cine import (
+    BoxTracker, CINE_BATCH_SIZE, CINE_REDETECT_EVERY,
+    aggregate_results, predicted_tirads, sample_keyframes, tracking_view,
+)
+from app.services.inference.stage_cache import StageRun, chain_versions, stage_cache
+from app.services.preprocessing.fused_preprocessing import (
+    CROP_VERSION, fused_xception_batch, fused_xception_crops, fused_xception_resized, get_workspace,
+)
+from app.services.preprocessing.decoding import DECODE_REDUCED_JPEG, DecodedImage, decode_image, scale_box, to_uint8
+from app.services.preprocessing.dicom import DicomClip, frame_to_jpeg
 
 
 class InferencePipeline:
@@ -31,77 +42,356 @@ class InferencePipeline:
     """
 
     PIPELINE_VERSION = "production-pipeline-v1-xception"
+    PROCESSED_IMAGE_VERSION = "grayscale-jpeg-v1"
+    CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "8"))
 
-    def __init__(self):
-        self.roi_detector = FasterRCNNDetector()
-        self.feature_classifier = FeatureClassifier()
+    def __init__(self, roi_detector: FasterRCNNDetector = None, feature_classifier: FeatureClassifier = None,
+                 cache_writes: bool = True):
+        # Defaults: the production singletons. Shadow pipelines pass candidate
+        # models and cache_writes=False, so they read shared stages (e.g. the
+        # crop when only the classifier differs) without evicting production's.
+        self.roi_detector = roi_detector or FasterRCNNDetector()
+        self.feature_classifier = feature_classifier or FeatureClassifier()
+        self.cache_writes = cache_writes
 
-    async def run(self, image_bytes: bytes) -> Dict:
-        start_time = time.time()
+    def warmup(self) -> float:
+        """Dummy forward pass through both models; returns the seconds taken."""
+        start = time.time()
+        self.roi_detector.warmup()
+        self.feature_classifier.warmup()
+        return time.time() - start
 
-        # ─────────────────────────────────────────────
-        # 1️⃣ Load raw image
-        # ─────────────────────────────────────────────
+    def stage_versions(self) -> Dict[str, str]:
+        """Chained version of each cached stage (see stage_cache.py)."""
+        versions = chain_versions({
+            "detect": f"{self.roi_detector.MODEL_VERSION}|reduced-jpeg={DECODE_REDUCED_JPEG}",
+            "crop": CROP_VERSION,
+            "classify": self.feature_classifier.MODEL_VERSION,
+        })
+        # Depends on the image only, not on any model
+        versions.update(chain_versions({"processed": self.PROCESSED_IMAGE_VERSION}))
+        return versions
+
+    def _decode(self, image_bytes: bytes) -> DecodedImage:
         try:
-            img = Image.open(BytesIO(image_bytes)).convert("RGB")
-            image_width, image_height = img.size
+            # Large JPEGs decode at reduced scale - never below what the detector resizes to
+            return decode_image(image_bytes, target_size=self.roi_detector.input_size)
         except Exception as e:
             raise RuntimeError(f"Failed to load image: {str(e)}")
 
-        # 2️⃣ ROI Detection (Real Faster R-CNN)
-        # ─────────────────────────────────────────────
-        # Convert PIL to Numpy for detector (detects on raw RGB pixels)
-        image_array = np.array(img)
-        
-        roi_result = self.roi_detector.detect(image_array)
+    def _detect_stage(self, image_bytes: bytes, stages: StageRun) -> Tuple[Dict, Optional[DecodedImage]]:
+        """Detector box (cached or computed), and the decoded frame if it had to be decoded."""
+        detection = stages.get("detect", "json")
+        if detection is not None:
+            return detection, None
 
-        roi_voc = roi_result["bounding_box"]  # xyxy in raw image space
-        
+        # Numpy frame for the detector (H×W for grayscale, H×W×3 for RGB).
+        # At full scale this frame is the only copy: the ROI crop below is a
+        # view of it, and grayscale is only broadcast to 3 channels at the
+        # model inputs. A reduced-scale JPEG decode serves the detector only.
+        decoded = self._decode(image_bytes)
+        roi_result = self.roi_detector.detect(decoded.array)
+        detection = {
+            "roi_result": roi_result,       # bounding_box: xyxy in decoded-frame space
+            "roi_voc": scale_box(roi_result["bounding_box"], decoded),  # xyxy in raw image space
+            "image_width": decoded.width,
+            "image_height": decoded.height,
+        }
+        stages.put("detect", "json", detection)
+        return detection, decoded
+
+    def _crop_stage(
+        self, image_bytes: bytes, detection: Dict, decoded: Optional[DecodedImage], stages: StageRun
+    ) -> Tuple[np.ndarray, Optional[DecodedImage]]:
+        """
+        Resized 299×299 ROI pixels (cached or computed). A computed crop is a
+        view into this thread's workspace - copy it to keep it past the next crop.
+        """
+        crop = stages.get("crop", "array")
+        if crop is not None:
+            return crop, decoded
+
+        crop, decoded = self._roi_crop(image_bytes, detection, decoded)
+        stages.put("crop", "array", crop)
+        return crop, decoded
+
+    @staticmethod
+    def _roi_crop(image_bytes: bytes, detection: Dict, decoded: Optional[DecodedImage]) -> Tuple[np.ndarray, DecodedImage]:
+        """
+        Resized ROI from the full-resolution frame. A reduced-scale decode
+        is only meant for the detector: the classifier crops from the raw
+        pixels, with the box mapped back to raw image space.
+        """
+        if decoded is None or decoded.scale != 1:
+            try:
+                decoded = decode_image(image_bytes)
+            except Exception as e:
+                raise RuntimeError(f"Failed to load image: {str(e)}")
+        raw_voc = detection["roi_voc"]
+        # Extract bbox as list [xmin, ymin, xmax, ymax]
+        bbox_list = [
+            raw_voc["xmin"],
+            raw_voc["ymin"],
+            raw_voc["xmax"],
+            raw_voc["ymax"]
+        ]
+        fused_xception_batch(decoded.array, [bbox_list])
+        return get_workspace().resized_crop(), decoded
+
+    @staticmethod
+    def _bounding_box(detection: Dict) -> Dict:
         # Format for API response and DB (xywh)
-        final_bounding_box = xyxy_to_xywh({
-            **roi_voc,
-            "image_width": image_width,
-            "image_height": image_height,
+        return xyxy_to_xywh({
+            **detection["roi_voc"],
+            "image_width": detection["image_width"],
+            "image_height": detection["image_height"],
             "coordinate_space": "raw_image"
         })
 
-        # 3️⃣ Xception Preprocessing
+    async def run(self, image_bytes: bytes) -> Dict:
+        start_time = time.time()
+
+        # 1️⃣ - 4️⃣ in the threadpool: the event loop - and every other
+        # connection of this worker, e.g. /inference/live - keeps running
+        class_result, roi_result, final_bounding_box, processed_image, stages = await run_in_threadpool(
+            self._score, image_bytes
+        )
+
+        # 5️⃣ - 7️⃣ TI-RADS, explanation, response
+        result = await self._assemble(start_time, class_result, roi_result, final_bounding_box)
+        result["processed_image"] = processed_image  # grayscale JPEG bytes (or None)
+        result["stages"] = stages.status             # stage -> "cached" | "computed"
+        return result
+
+    def _score(self, image_bytes: bytes) -> Tuple[Dict, Dict, Dict, Optional[bytes], StageRun]:
+        """Blocking part of run(): detection, crop, classification, processed image."""
+        # Stage outputs of an earlier run of the same image are reused up to
+        # the first stage whose version changed
+        stages = StageRun(stage_cache, image_bytes, self.stage_versions(), self.cache_writes)
+
         # ─────────────────────────────────────────────
-        
-        # Extract bbox as list [xmin, ymin, xmax, ymax]
-        bbox_list = [
-            roi_voc["xmin"],
-            roi_voc["ymin"],
-            roi_voc["xmax"],
-            roi_voc["ymax"]
-        ]
-        
-        try:
-            # Result is a torch.Tensor (3, 299, 299)
-            roi_tensor = xception_preprocess_from_array(image_array, bbox_list)
-        except Exception as e:
-            raise RuntimeError(f"Preprocessing failed: {str(e)}")
+        # 1️⃣ Load raw image  +  2️⃣ ROI Detection (Real Faster R-CNN)
+        # ─────────────────────────────────────────────
+        # The image is only decoded if a stage below has to run
+        detection, decoded = self._detect_stage(image_bytes, stages)
+        roi_result = detection["roi_result"]
+        final_bounding_box = self._bounding_box(detection)
 
         # ─────────────────────────────────────────────
-        # 4️⃣ Feature Classification (Xception Multi-Output)
+        # 3️⃣ Xception Preprocessing  +  4️⃣ Feature Classification
         # ─────────────────────────────────────────────
         # This returns features (strings) and feature_results (full metadata)
-        class_result = self.feature_classifier.classify(roi_tensor)
-        feature_metadata = class_result["feature_results"]
+        class_result = stages.get("classify", "json")
+        if class_result is None:
+            try:
+                crop, decoded = self._crop_stage(image_bytes, detection, decoded, stages)
+                # Result is a torch.Tensor (1, 3, 299, 299), written into a reused buffer
+                roi_tensor = fused_xception_resized([crop])
+            except Exception as e:
+                raise RuntimeError(f"Preprocessing failed: {str(e)}")
 
+            class_result = self.feature_classifier.classify(roi_tensor)
+            stages.put("classify", "json", class_result)
+
+        # Processed (grayscale) image for storage, from the frame decoded above
+        # (full resolution whenever the crop was computed). A reduced-scale
+        # decode is too small for it - the caller re-decodes.
+        processed_image = None
+        if decoded is None:
+            processed_image = stages.get("processed", "bytes")
+        elif decoded.scale == 1:
+            frame = Image.fromarray(to_uint8(decoded.array))
+            buffer = BytesIO()
+            (frame if decoded.grayscale else frame.convert("L")).save(buffer, format="JPEG")
+            processed_image = buffer.getvalue()
+            stages.put("processed", "bytes", processed_image)
+
+        return class_result, roi_result, final_bounding_box, processed_image, stages
+
+    def score_batch(self, images: List[bytes]) -> List[Dict]:
+        """
+        Bulk scoring (re-scoring jobs): run() without explanation or
+        processed image. Detection runs per image, all ROI crops go through
+        the classifier together, CLASSIFY_BATCH_SIZE at a time. Blocking.
+
+        Returns one result per image - the run() fields, or {"error": str}.
+        """
+        results: List[Optional[Dict]] = [None] * len(images)
+        pending = []    # (index, start_time, stages, detection, crop)
+
+        # 1️⃣ - 3️⃣ Per image: detection and crop (cached or computed)
+        for i, image_bytes in enumerate(images):
+            start_time = time.time()
+            try:
+                stages = StageRun(stage_cache, image_bytes, self.stage_versions(), self.cache_writes)
+                detection, decoded = self._detect_stage(image_bytes, stages)
+                class_result = stages.get("classify", "json")
+                if class_result is not None:
+                    results[i] = self._response(start_time, class_result, detection["roi_result"], self._bounding_box(detection))
+                    results[i]["stages"] = stages.status
+                    continue
+                crop, _ = self._crop_stage(image_bytes, detection, decoded, stages)
+                pending.append((i, start_time, stages, detection, crop.copy()))
+            except Exception as e:
+                results[i] = {"error": str(e)}
+
+        # 4️⃣ Batched classification (crops of one batch share a layout)
+        groups: Dict[Tuple, list] = {}
+        for item in pending:
+            crop = item[4]
+            groups.setdefault((crop.ndim, crop.dtype.str), []).append(item)
+
+        for group in groups.values():
+            for n in range(0, len(group), self.CLASSIFY_BATCH_SIZE):
+                batch = group[n:n + self.CLASSIFY_BATCH_SIZE]
+                class_results = self.feature_classifier.classify_batch(
+                    fused_xception_resized([item[4] for item in batch])
+                )
+                for (i, start_time, stages, detection, _), class_result in zip(batch, class_results):
+                    stages.put("classify", "json", class_result)
+                    results[i] = self._response(start_time, class_result, detection["roi_result"], self._bounding_box(detection))
+                    results[i]["stages"] = stages.status
+
+        return results
+
+    async def run_clip(self, clip: DicomClip) -> Dict:
+        """
+        Aggregated assessment of a DICOM clip (single- or multi-frame).
+        Same output as run(), plus features["clip"]: keyframes, how each
+        ROI was obtained, and the representative frame the box refers to.
+        """
+        start_time = time.time()
+
+        # 1️⃣ - 4️⃣ in the threadpool, like run()
+        class_result, roi_result, final_bounding_box, clip_info, processed_image = await run_in_threadpool(
+            self._score_clip, clip
+        )
+
+        # 5️⃣ - 7️⃣ TI-RADS, explanation, response
+        result = await self._assemble(start_time, class_result, roi_result, final_bounding_box)
+        result["features"]["clip"] = clip_info
+        result["processed_image"] = processed_image
+        return result
+
+    def _score_clip(self, clip: DicomClip) -> Tuple[Dict, Dict, Dict, Dict, bytes]:
+        """Blocking part of run_clip(): keyframes, ROIs, classification, aggregation."""
+        # 1️⃣ Keyframes (decoded one at a time, only these)
         # ─────────────────────────────────────────────
-        # 5️⃣ TI-RADS Rule Engine (Official ACR Points)
+        keyframes = sample_keyframes(clip.frame_count)
+
+        tracker = BoxTracker()
+        detection = None            # last detector result
+        since_detection = 0
+        records = []
+        class_results = []
+        batch = []                  # (frame, bbox) awaiting classification
+
+        def flush():
+            if batch:
+                try:
+                    # (N, 3, 299, 299) over N keyframes, written into a reused buffer
+                    roi_tensor = fused_xception_crops(batch)
+                except Exception as e:
+                    raise RuntimeError(f"Preprocessing failed: {str(e)}")
+                class_results.extend(self.feature_classifier.classify_batch(roi_tensor))
+                batch.clear()
+
+        for index in keyframes:
+            try:
+                frame = clip.frame(index)
+            except Exception as e:
+                raise RuntimeError(f"Failed to decode DICOM frame {index}: {str(e)}")
+            gray = tracking_view(frame)
+
+            # 2️⃣ ROI: follow the last box, re-detect when that fails
+            # ─────────────────────────────────────────────
+            tracked = None
+            fallback = detection is not None and detection["detector"]["version"].startswith("fallback")
+            if detection is not None and not fallback and since_detection < CINE_REDETECT_EVERY:
+                tracked = tracker.track(gray)
+
+            if tracked is None:
+                detection = self.roi_detector.detect(frame)
+                box = detection["bounding_box"]
+                roi_score = detection.get("score", 0.0)
+                tracker.reset(gray, box)
+                since_detection = 1
+                source = "detected"
+            else:
+                box, match_score = tracked
+                roi_score = detection.get("score", 0.0) * match_score
+                since_detection += 1
+                source = "tracked"
+
+            records.append({
+                "frame": index,
+                "source": source,
+                "roi_score": round(float(roi_score), 4),
+                "bounding_box": {k: round(float(v), 1) for k, v in box.items()},
+                "detector": detection["detector"],
+            })
+
+            # 3️⃣ Batched classification (frames of one batch share a layout)
+            # ─────────────────────────────────────────────
+            if batch and (batch[0][0].ndim != frame.ndim or batch[0][0].dtype != frame.dtype):
+                flush()
+            batch.append((frame, [box["xmin"], box["ymin"], box["xmax"], box["ymax"]]))
+            if len(batch) >= CINE_BATCH_SIZE:
+                flush()
+
+        flush()
+
+        # 4️⃣ Aggregate over keyframes
         # ─────────────────────────────────────────────
-        tirads_result = calculate_tirads(feature_metadata)
+        # The box / Grad-CAM / stored image come from the best-localized keyframe
+        representative = max(range(len(records)), key=lambda i: records[i]["roi_score"])
+        class_result = aggregate_results(class_results, representative)
+        final_tirads = predicted_tirads(class_result)
+
+        for record, keyframe_result in zip(records, class_results):
+            record["tirads"] = predicted_tirads(keyframe_result)
+        rep = records[representative]
 
+        final_bounding_box = xyxy_to_xywh({
+            **rep["bounding_box"],
+            "image_width": clip.width,
+            "image_height": clip.height,
+            "coordinate_space": "raw_image"
+        })
+        roi_result = {"score": rep["roi_score"], "detector": rep["detector"]}
+
+        clip_info = {
+            **clip.metadata(),
+            "representative_frame": rep["frame"],
+            "keyframe_agreement": round(sum(r["tirads"] == final_tirads for r in records) / len(records), 4),
+            "detector_runs": sum(r["source"] == "detected" for r in records),
+            "keyframes": [{k: v for k, v in r.items() if k != "detector"} for r in records],
+        }
+        processed_image = frame_to_jpeg(tracking_view(clip.frame(rep["frame"])))
+        return class_result, roi_result, final_bounding_box, clip_info, processed_image
+
+    async def _assemble(self, start_time: float, class_result: Dict, roi_result: Dict, final_bounding_box: Dict) -> Dict:
+        """Steps 5-7 shared by run() and run_clip(): TI-RADS, explanation, response."""
         # ─────────────────────────────────────────────
         # 6️⃣ AI Explanation (Gemini)
         # ─────────────────────────────────────────────
+        tirads_result = calculate_tirads(class_result["feature_results"])
         ai_result = await ResponseGenerator.generate(
             features=class_result["features"],
             tirads=tirads_result["tirads"],
             confidence=tirads_result["confidence"]
         )
+        return self._response(start_time, class_result, roi_result, final_bounding_box, ai_result)
+
+    def _response(
+        self, start_time: float, class_result: Dict, roi_result: Dict, final_bounding_box: Dict,
+        ai_result: Optional[Dict] = None
+    ) -> Dict:
+        """TI-RADS + response assembly; ai_result=None leaves the explanation empty."""
+        # ─────────────────────────────────────────────
+        # 5️⃣ TI-RADS Rule Engine (Official ACR Points)
+        # ─────────────────────────────────────────────
+        tirads_result = calculate_tirads(class_result["feature_results"])
 
         # ─────────────────────────────────────────────
         # 7️⃣ Data Pruning & Final Response
@@ -113,7 +403,7 @@ class InferencePipeline:
             "clinical_features": tirads_result["breakdown"],
             "total_points": tirads_result["total_points"],
             "measurements": {
-                "nodule_area_relative": round((roi_voc["xmax"] - roi_voc["xmin"]) * (roi_voc["ymax"] - roi_voc["ymin"]) / (image_width * image_height), 4)
+                "nodule_area_relative": round(final_bounding_box["width"] * final_bounding_box["height"] / (final_bounding_box["image_width"] * final_bounding_box["image_height"]), 4)
             }
         }
 
@@ -141,9 +431,9 @@ class InferencePipeline:
             "bounding_box": final_bounding_box, # BBox from R-CNN
             "roi_score": roi_result.get("score", 0.0),
             
-            "ai_explanation": ai_result["ai_explanation"],
+            "ai_explanation": ai_result["ai_explanation"] if ai_result else None,
             "explanation_metadata": {
-                **ai_result["explanation_metadata"],
+                **(ai_result["explanation_metadata"] if ai_result else {}),
                 "gradcam_available": True,
                 "grad_cam_data": class_result.get("grad_cam_data")
             },
@@ -152,7 +442,7 @@ class InferencePipeline:
                 "roi_detector": roi_result["detector"],
                 "feature_classifier": class_result["classifier"],
                 "rule_engine": tirads_result["rule_engine"],
-                "explainer": ai_result["explanation_metadata"]["engine"]
+                "explainer": ai_result["explanation_metadata"]["engine"] if ai_result else None
             },
 
             "pipeline_version": self.PIPELINE_VERSION,
@@ -0,0 +1,223 @@
+"""
+Live Probe Feed
+===============
+
+State for one /inference/live connection. Frames arrive faster than the
+models can score them, so:
+
+- Latest frame wins: LatestFrame holds at most one unprocessed frame; a
+  newer frame replaces it (counted as dropped). Latency stays at about
+  one inference, however far behind the feed the models are.
+- The ROI is reused between detector passes: each frame follows the last
+  box by template matching (cine.BoxTracker) and only the crop is
+  classified. The detector runs on the first frame, then every
+  LIVE_REDETECT_EVERY frames or when tracking loses the nodule - in the
+  background, so classification keeps going on the tracked box and the
+  new box is picked up when the pass finishes.
+- Classification is off the frame loop the same way: every frame gets a
+  result with its own tracked box and the newest classifier result
+  (`classified_seq` is the frame it came from), while the next classifier
+  pass runs in the background on the latest crop. Boxes follow the feed
+  frame by frame; the TI-RADS label lags it by up to one classifier pass.
+- No explanation, storage or report: results go straight back to the
+  probe client. A capture is still uploaded through /inference/run.
+"""
+
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.services.inference.box_utils import xyxy_to_xywh
+from app.services.inference.cine import BoxTracker, predicted_tirads, tracking_view
+from app.services.preprocessing.decoding import DecodedImage, decode_image, scale_box
+from app.services.preprocessing.fused_preprocessing import fused_xception_batch
+from app.services.rules.tirads import calculate_tirads
+
+LIVE_REDETECT_EVERY = int(os.getenv("LIVE_REDETECT_EVERY", "30"))
+
+
+class LatestFrame:
+    """Single-slot frame mailbox: a new frame replaces one not yet taken."""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, data: bytes):
+        # Slow consumer: the stale frame is dropped, never queued behind
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.received += 1
+        self.queue.put_nowait((self.received, time.perf_counter(), data))
+
+    def close(self):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Tuple[int, float, bytes]]:
+        """(seq, received_at, data), or None once closed."""
+        return await self.queue.get()
+
+
+class LiveSession:
+    """ROI state carried across the frames of one probe feed."""
+
+    def __init__(self, detector, classifier, redetect_every: int = LIVE_REDETECT_EVERY):
+        self.detector = detector
+        self.classifier = classifier
+        self.redetect_every = redetect_every
+
+        self.tracker = BoxTracker()
+        self.box: Optional[Dict] = None          # xyxy in decoded-frame space
+        self.detection: Optional[Dict] = None    # detector result the box came from
+        self.classification: Optional[Dict] = None   # newest classifier result
+        self.frame_shape = None
+        self.since_detection = 0
+        self.lost = False
+        self.detector_runs = 0
+        self.classifier_runs = 0
+
+        self._pending = None                     # (gray, detection) from a finished background pass
+        self._detection_task: Optional[asyncio.Task] = None
+        self._classification_task: Optional[asyncio.Task] = None
+
+    async def process(self, image_bytes: bytes, seq: Optional[int] = None) -> Dict:
+        """Score one frame; returns the result without the transport fields."""
+        start = time.perf_counter()
+        decoded = await run_in_threadpool(decode_image, image_bytes, self.detector.input_size)
+        frame = decoded.array
+
+        if self.box is None or frame.shape != self.frame_shape:
+            # Nothing to reuse yet (or the probe changed resolution): detect on this frame
+            self.cancel()
+            self.classification = None
+            self.frame_shape = frame.shape
+            self._pending = (None, await run_in_threadpool(self._detect, frame))
+
+        # Detector results are only handed over here, on the event loop
+        pending, self._pending = self._pending, None
+        roi = await run_in_threadpool(self._locate, decoded, pending)
+
+        # Classifier results too: the first frame waits for one, later frames
+        # carry the newest while the next pass runs on this frame's crop
+        if self.classification is None:
+            self.classification = await run_in_threadpool(self._classify, image_bytes, decoded, roi["raw_box"], seq)
+        elif self._classification_task is None:
+            self._classification_task = asyncio.create_task(
+                self._classify_in_background(image_bytes, decoded, roi["raw_box"], seq)
+            )
+
+        due = self.since_detection >= self.redetect_every or self.lost
+        if due and self._detection_task is None:
+            self._detection_task = asyncio.create_task(self._detect_in_background(frame))
+
+        raw_box = roi.pop("raw_box")
+        return {
+            **self.classification,
+            "bounding_box": xyxy_to_xywh({
+                **raw_box,
+                "image_width": decoded.width,
+                "image_height": decoded.height,
+                "coordinate_space": "raw_image"
+            }),
+            **roi,
+            "inference_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
+
+    def cancel(self):
+        """Drop background detector / classifier passes (their results are discarded)."""
+        for task in (self._detection_task, self._classification_task):
+            if task is not None:
+                task.cancel()
+        self._detection_task = None
+        self._classification_task = None
+        self._pending = None
+
+    def _detect(self, frame: np.ndarray) -> Dict:
+        self.detector_runs += 1
+        return self.detector.detect(frame)
+
+    async def _detect_in_background(self, frame: np.ndarray):
+        try:
+            detection = await run_in_threadpool(self._detect, frame)
+            if frame.shape == self.frame_shape:
+                self._pending = (tracking_view(frame), detection)
+        finally:
+            if self._detection_task is asyncio.current_task():
+                self._detection_task = None
+
+    async def _classify_in_background(self, image_bytes: bytes, decoded: DecodedImage, raw_box: Dict,
+                                      seq: Optional[int]):
+        try:
+            classification = await run_in_threadpool(self._classify, image_bytes, decoded, raw_box, seq)
+            if decoded.array.shape == self.frame_shape:
+                self.classification = classification
+        finally:
+            if self._classification_task is asyncio.current_task():
+                self._classification_task = None
+
+    def _locate(self, decoded: DecodedImage, pending: Optional[Tuple]) -> Dict:
+        """ROI of this frame: newest detection, else follow the last box."""
+        gray = tracking_view(decoded.array)
+
+        source = "reused"
+        if pending is not None:
+            detection_gray, self.detection = pending
+            self.box = self.detection["bounding_box"]
+            self.since_detection = 0
+            self.lost = False
+            self.tracker.reset(detection_gray if detection_gray is not None else gray, self.box)
+            if detection_gray is None:
+                source = "detected"
+
+        # The whole-image fallback box has nothing to follow - reuse it until the next pass
+        fallback = self.detection["detector"]["version"].startswith("fallback")
+        roi_score = self.detection.get("score", 0.0)
+        if source != "detected" and not fallback:
+            tracked = self.tracker.track(gray)
+            if tracked is None:
+                self.lost = True
+            else:
+                self.box, match_score = tracked
+                roi_score *= match_score
+                source = "tracked"
+        self.since_detection += 1
+
+        return {
+            "raw_box": scale_box(self.box, decoded),
+            "roi_source": source,
+            "roi_score": round(float(roi_score), 4),
+        }
+
+    def _classify(self, image_bytes: bytes, decoded: DecodedImage, raw_box: Dict, seq: Optional[int]) -> Dict:
+        start = time.perf_counter()
+        self.classifier_runs += 1
+
+        # 1️⃣ Crop + classify the ROI only - from full-resolution pixels
+        # (a reduced-scale decode is for the detector and tracker only)
+        crop_frame = decoded.array if decoded.scale == 1 else decode_image(image_bytes).array
+        bbox = [raw_box["xmin"], raw_box["ymin"], raw_box["xmax"], raw_box["ymax"]]
+        class_result = self.classifier.classify(fused_xception_batch(crop_frame, [bbox]))
+
+        # 2️⃣ TI-RADS (distribution head, rule engine points alongside)
+        tirads_result = calculate_tirads(class_result["feature_results"])
+        tirads_confidences = class_result.get("tirads_confidences", {})
+        tirads = predicted_tirads(class_result)
+        confidence = tirads_confidences.get(f"TIRADS_{tirads}", tirads_result["confidence"])
+
+        return {
+            "tirads": tirads,
+            "confidence": round(float(confidence), 4),
+            "tirads_confidences": tirads_confidences,
+            "features": class_result["features"],
+            "total_points": tirads_result["total_points"],
+            "classified_seq": seq,
+            "classification_ms": round((time.perf_counter() - start) * 1000, 1),
+        }
@@ -0,0 +1,224 @@
+"""
+Model Registry
+==============
+
+Holds the active model set (Faster R-CNN + Xception) and swaps it without
+a restart:
+
+1. load() builds the new weights next to the active ones (double
+   buffering - only one load at a time) and warms them up
+2. The switch is one reference swap under a lock: requests that start
+   afterwards get the new set, a request never mixes versions
+3. Requests hold a lease on the set they started with (lease()); the old
+   set drains and is released when its last lease ends - the registry
+   drops its references, the model classes' singletons point at the new
+   instances, and the memory is collected
+
+A model that is not part of a load (e.g. the detector when only new
+Xception weights are given) is shared with the new set, not reloaded.
+
+Weights are loaded from MODEL_REGISTRY_DIR only. Per worker process: each
+worker has to be told to load (see app/api/models.py).
+"""
+
+import gc
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+import torch
+
+from app.services.inference.inference_pipeline import InferencePipeline
+from app.services.inference.feature_classifier import FeatureClassifier
+from app.services.inference.roi_detector import FasterRCNNDetector
+
+MODEL_REGISTRY_DIR = os.path.abspath(os.getenv("MODEL_REGISTRY_DIR", "models"))
+
+
+class ModelSet:
+    """One generation of models and the pipeline running them."""
+
+    def __init__(self, generation: int, detector: FasterRCNNDetector, classifier: FeatureClassifier,
+                 pipeline_version: Optional[str] = None):
+        self.generation = generation
+        self.pipeline = InferencePipeline(roi_detector=detector, feature_classifier=classifier)
+        if pipeline_version:
+            self.pipeline.PIPELINE_VERSION = pipeline_version
+        self.loaded_at = datetime.utcnow().isoformat() + "Z"
+        self.in_flight = 0
+        self.retired = False
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "generation": self.generation,
+            "pipeline_version": self.pipeline.PIPELINE_VERSION,
+            "roi_detector": {
+                "version": self.pipeline.roi_detector.MODEL_VERSION,
+                "weights": self.pipeline.roi_detector.model_path,
+            },
+            "feature_classifier": {
+                "version": self.pipeline.feature_classifier.MODEL_VERSION,
+                "weights": self.pipeline.feature_classifier.model_path,
+            },
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight,
+        }
+
+
+def resolve_weights(path: str) -> str:
+    """Weights path inside MODEL_REGISTRY_DIR (relative paths are taken from there)."""
+    resolved = os.path.realpath(os.path.join(MODEL_REGISTRY_DIR, path))
+    if os.path.commonpath([resolved, os.path.realpath(MODEL_REGISTRY_DIR)]) != os.path.realpath(MODEL_REGISTRY_DIR):
+        raise ValueError(f"Weights must be inside MODEL_REGISTRY_DIR ({MODEL_REGISTRY_DIR})")
+    if not os.path.isfile(resolved):
+        raise FileNotFoundError(f"Weights not found: {path}")
+    return resolved
+
+
+class ModelRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Optional[ModelSet] = None
+        self._draining: List[ModelSet] = []
+        self._released: List[Tuple[int, weakref.ref]] = []   # (generation, model) - freed once dead
+        self._generation = 0
+        self.loading: Optional[Dict[str, Any]] = None
+        self.last_load: Optional[Dict[str, Any]] = None
+
+    @property
+    def active(self) -> ModelSet:
+        """The current set (the env-configured singletons until the first load)."""
+        if self._active is None:
+            with self._lock:
+                if self._active is None:
+                    self._active = ModelSet(0, FasterRCNNDetector(), FeatureClassifier())
+        return self._active
+
+    def acquire(self) -> ModelSet:
+        """Active set with one more lease; pair with release()."""
+        self.active
+        with self._lock:
+            models = self._active
+            models.in_flight += 1
+            return models
+
+    def release(self, models: ModelSet):
+        with self._lock:
+            models.in_flight -= 1
+            drained = models.retired and models.in_flight == 0
+        if drained:
+            self._release(models)
+
+    @contextmanager
+    def lease(self) -> Iterator[InferencePipeline]:
+        """Pipeline of the active set, kept alive until the block exits."""
+        models = self.acquire()
+        try:
+            yield models.pipeline
+        finally:
+            self.release(models)
+
+    # ---- loading ----
+    def begin_load(self, request: Dict[str, Any]) -> bool:
+        """Reserves the load slot; False while another load is running."""
+        with self._lock:
+            if self.loading is not None:
+                return False
+            self.loading = {**request, "started_at": datetime.utcnow().isoformat() + "Z"}
+            return True
+
+    def load(self, detector: Optional[Tuple[str, str]] = None, classifier: Optional[Tuple[str, str]] = None,
+             pipeline_version: Optional[str] = None) -> ModelSet:
+        """
+        Blocking: loads (weights path, version) for the given models, warms
+        the new set up and activates it. Call after begin_load().
+        """
+        start = time.time()
+        try:
+            current = self.active.pipeline
+            new_detector = (
+                FasterRCNNDetector.candidate(resolve_weights(detector[0]), detector[1])
+                if detector else current.roi_detector
+            )
+            new_classifier = (
+                FeatureClassifier.candidate(resolve_weights(classifier[0]), classifier[1])
+                if classifier else current.feature_classifier
+            )
+            version = pipeline_version or (
+                f"{InferencePipeline.PIPELINE_VERSION}+{new_detector.MODEL_VERSION}+{new_classifier.MODEL_VERSION}"
+            )
+
+            # Warm up what was loaded - a shared model is already warm
+            warmup_start = time.time()
+            for model, spec in ((new_detector, detector), (new_classifier, classifier)):
+                if spec:
+                    model.warmup()
+            warmup_s = time.time() - warmup_start
+
+            models = ModelSet(self._generation + 1, new_detector, new_classifier, version)
+            self._activate(models)
+
+            self.last_load = {
+                "status": "activated",
+                "generation": models.generation,
+                "load_s": round(time.time() - start, 1),
+                "warmup_s": round(warmup_s, 1),
+            }
+            return models
+        except Exception as e:
+            self.last_load = {"status": "failed", "error": str(e), "load_s": round(time.time() - start, 1)}
+            raise
+        finally:
+            self.loading = None
+
+    def _activate(self, models: ModelSet):
+        with self._lock:
+            old, self._active = self._active, models
+            self._generation = models.generation
+            # Code that still instantiates the model classes gets the active weights
+            FasterRCNNDetector._instance = models.pipeline.roi_detector
+            FeatureClassifier._instance = models.pipeline.feature_classifier
+            old.retired = True
+            drained = old.in_flight == 0
+            if not drained:
+                self._draining.append(old)
+        if drained:
+            self._release(old)
+
+    def _release(self, models: ModelSet):
+        """Drops the registry's references to a drained set's own models and collects them."""
+        with self._lock:
+            if models in self._draining:
+                self._draining.remove(models)
+            active = self._active.pipeline
+            for model in (models.pipeline.roi_detector, models.pipeline.feature_classifier):
+                if model is not active.roi_detector and model is not active.feature_classifier:
+                    self._released.append((models.generation, weakref.ref(model)))
+        models.pipeline = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def status(self) -> Dict[str, Any]:
+        active = self.active
+        with self._lock:
+            # A released model that is still alive is referenced from outside the registry
+            self._released = [(g, ref) for g, ref in self._released if ref() is not None]
+            return {
+                "active": active.describe(),
+                "draining": [models.describe() for models in self._draining],
+                "released_not_freed": [
+                    {"generation": g, "model": ref().MODEL_NAME, "version": ref().MODEL_VERSION}
+                    for g, ref in self._released if ref() is not None
+                ],
+                "loading": self.loading,
+                "last_load": self.last_load,
+            }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,294 @@
+# Bulk re-scoring of historical images
+
+"""
+Re-scoring Job
+==============
+
+Scores every raw image with the active pipeline version (model_registry)
+and bulk-inserts the results as new predictions tagged with that version,
+next to the existing ones (for model comparison).
+
+- Pages through raw_images by id (keyset - every page is an index range
+  scan, however deep the job is)
+- Downloads are prefetched RESCORE_PREFETCH at a time while earlier
+  batches are being scored; the next page is fetched in the background
+- Scoring goes through InferencePipeline.score_batch: no explanation,
+  batched classifier, and the stage cache - after a classifier-only
+  update only the Xception pass runs
+- Progress is checkpointed in `rescoring_jobs` after every page; a
+  restarted job resumes after the last checkpoint. Images that already
+  have a prediction of the target version are skipped, so a page
+  interrupted between insert and checkpoint is not scored twice
+- Before every batch the job waits until the worker is quiet
+  (app/utils/latency.py): at most RESCORE_MAX_IN_FLIGHT interactive
+  requests / live frames being served, and the p99 under
+  RESCORE_MAX_P99_MS
+- Scoring runs on one dedicated, reniced thread, never in the
+  threadpool the requests use. Its forward passes run at
+  BACKGROUND_TORCH_THREADS torch threads, between interactive ones
+  (execution.TorchThreadBudget)
+- If other models are activated mid-job, the job stops as "superseded"
+  (its version is no longer the one being served)
+
+The throttle reads the latencies of the process it runs in: start it in
+the API worker (RESCORE_ENABLED=true) to protect live traffic. DICOM
+clips are not re-scored (counted as "unsupported").
+"""
+
+import os
+import time
+import asyncio
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Set
+
+from app.db.supabase import supabase_admin, STORAGE_BUCKET
+from app.services.inference.execution import background_thread_init
+from app.services.inference.model_registry import model_registry
+from app.utils.latency import request_latency
+from app.utils.logger import log_event
+from app.services.preprocessing.dicom import is_dicom
+
+RESCORE_ENABLED = os.getenv("RESCORE_ENABLED", "false").lower() == "true"
+# raw_images per page (one checkpoint per page)
+RESCORE_PAGE_SIZE = int(os.getenv("RESCORE_PAGE_SIZE", "64"))
+# Images per score_batch call
+RESCORE_BATCH_SIZE = int(os.getenv("RESCORE_BATCH_SIZE", "8"))
+# Concurrent storage downloads
+RESCORE_PREFETCH = int(os.getenv("RESCORE_PREFETCH", "4"))
+# Pause while the interactive p99 is above this
+RESCORE_MAX_P99_MS = float(os.getenv("RESCORE_MAX_P99_MS", "1500"))
+# Pause while more interactive requests than this are being served
+RESCORE_MAX_IN_FLIGHT = int(os.getenv("RESCORE_MAX_IN_FLIGHT", "0"))
+RESCORE_THROTTLE_SECONDS = float(os.getenv("RESCORE_THROTTLE_SECONDS", "5"))
+RESCORE_JOBS_TABLE = os.getenv("RESCORE_JOBS_TABLE", "rescoring_jobs")
+
+
+def fetch_raw_images_page(after_id: Optional[str], limit: int = RESCORE_PAGE_SIZE) -> List[dict]:
+    """Next page of raw images by id (keyset on the primary key)."""
+    query = supabase_admin.table("raw_images").select("id, file_path")
+    if after_id:
+        query = query.gt("id", after_id)
+    res = query.order("id").limit(limit).execute()
+    return res.data or []
+
+
+def fetch_scored_ids(raw_image_ids: List[str], model_version: str) -> Set[str]:
+    """Raw images of the page that already have a prediction of `model_version`."""
+    if not raw_image_ids:
+        return set()
+    res = (
+        supabase_admin.table("predictions")
+        .select("raw_image_id")
+        .in_("raw_image_id", raw_image_ids)
+        .eq("model_version", model_version)
+        .execute()
+    )
+    return {row["raw_image_id"] for row in (res.data or [])}
+
+
+def insert_predictions(records: List[dict]) -> int:
+    """One bulk insert; returns rows written."""
+    res = supabase_admin.table("predictions").insert(records).execute()
+    return len(res.data or [])
+
+
+def download_image(file_path: str) -> bytes:
+    return supabase_admin.storage.from_(STORAGE_BUCKET).download(file_path)
+
+
+def load_job(job_id: str) -> Optional[dict]:
+    res = supabase_admin.table(RESCORE_JOBS_TABLE).select("*").eq("id", job_id).limit(1).execute()
+    return res.data[0] if res.data else None
+
+
+def save_job(job: dict):
+    supabase_admin.table(RESCORE_JOBS_TABLE).upsert(job).execute()
+
+
+def prediction_record(raw_image_id: str, inference: Dict[str, Any], job_id: str) -> dict:
+    """predictions row for a score_batch result (no processed image, no explanation)."""
+    return {
+        "raw_image_id": raw_image_id,
+        "predicted_class": inference["predicted_class"],
+        "tirads": inference["tirads"],
+        "confidence": inference["confidence"],
+        "tirads_confidences": inference["tirads_confidences"],
+        "model_version": inference["pipeline_version"],
+        "model_metadata": inference["models"],
+        "explanation_metadata": {**inference["explanation_metadata"], "rescoring_job": job_id},
+        "inference_time_ms": inference["inference_time_ms"],
+        "features": inference["features"],
+        "bounding_box": inference["bounding_box"],
+        "training_candidate": False
+    }
+
+
+_executor = None
+
+
+def scoring_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rescoring", initializer=background_thread_init)
+    return _executor
+
+
+def has_headroom(max_p99_ms: float = RESCORE_MAX_P99_MS, max_in_flight: int = RESCORE_MAX_IN_FLIGHT) -> bool:
+    if request_latency.in_flight > max_in_flight:
+        return False
+    p99 = request_latency.percentile(99)
+    return p99 is None or p99 <= max_p99_ms
+
+
+async def wait_for_headroom(max_p99_ms: float = RESCORE_MAX_P99_MS, max_in_flight: int = RESCORE_MAX_IN_FLIGHT) -> float:
+    """Sleeps while interactive traffic is busy or slow; returns seconds waited."""
+    waited = 0.0
+    while not has_headroom(max_p99_ms, max_in_flight):
+        await asyncio.sleep(RESCORE_THROTTLE_SECONDS)
+        waited += RESCORE_THROTTLE_SECONDS
+    return waited
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+async def run_rescoring_job(job_id: Optional[str] = None, max_pages: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Runs (or resumes) the re-scoring job for the active pipeline version.
+    max_pages bounds this invocation; the job itself resumes where it stopped.
+    """
+    start_time = time.time()
+    model_version = model_registry.active.pipeline.PIPELINE_VERSION
+    job_id = job_id or f"rescore-{model_version}"
+
+    # 1️⃣ Resume from the last checkpoint
+    job = await asyncio.to_thread(load_job, job_id) or {
+        "id": job_id,
+        "model_version": model_version,
+        "cursor": None,
+        "status": "running",
+        "scanned": 0, "scored": 0, "skipped": 0, "failed": 0, "unsupported": 0,
+        "throttled_seconds": 0,
+        "started_at": _now(),
+    }
+    if job["status"] == "completed":
+        return job
+    job["status"] = "running"
+
+    semaphore = asyncio.Semaphore(RESCORE_PREFETCH)
+
+    async def fetch(row: dict):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(download_image, row["file_path"])
+            except Exception as e:
+                return e
+
+    pages = 0
+    next_page = asyncio.create_task(asyncio.to_thread(fetch_raw_images_page, job["cursor"]))
+    try:
+        while True:
+            rows = await next_page
+            if not rows:
+                job["status"] = "completed"
+                break
+            # 2️⃣ Next page in the background while this one is scored
+            next_page = asyncio.create_task(asyncio.to_thread(fetch_raw_images_page, rows[-1]["id"]))
+
+            done = await asyncio.to_thread(fetch_scored_ids, [row["id"] for row in rows], model_version)
+            todo = [row for row in rows if row["id"] not in done]
+            job["skipped"] += len(rows) - len(todo)
+
+            # 3️⃣ Prefetch every download of the page (RESCORE_PREFETCH in flight)
+            downloads = [asyncio.create_task(fetch(row)) for row in todo]
+
+            # 4️⃣ Batched scoring, throttled on interactive latency
+            records = []
+            for n in range(0, len(todo), RESCORE_BATCH_SIZE):
+                batch_rows = todo[n:n + RESCORE_BATCH_SIZE]
+                images = await asyncio.gather(*downloads[n:n + RESCORE_BATCH_SIZE])
+
+                scorable = []
+                for row, image in zip(batch_rows, images):
+                    if isinstance(image, Exception):
+                        job["failed"] += 1
+                    elif is_dicom(image):
+                        job["unsupported"] += 1
+                    else:
+                        scorable.append((row, image))
+                if not scorable:
+                    continue
+
+                job["throttled_seconds"] += await wait_for_headroom()
+                with model_registry.lease() as pipeline:
+                    if pipeline.PIPELINE_VERSION != model_version:
+                        job["status"] = "superseded"
+                        break
+                    results = await asyncio.get_running_loop().run_in_executor(
+                        scoring_executor(), pipeline.score_batch, [image for _, image in scorable]
+                    )
+
+                for (row, _), result in zip(scorable, results):
+                    if "error" in result:
+                        job["failed"] += 1
+                    else:
+                        records.append(prediction_record(row["id"], result, job_id))
+
+            if job["status"] == "superseded":
+                for download in downloads:
+                    download.cancel()
+                break
+
+            # 5️⃣ Bulk insert, then checkpoint
+            if records:
+                job["scored"] += await asyncio.to_thread(insert_predictions, records)
+            job["cursor"] = rows[-1]["id"]
+            job["scanned"] += len(rows)
+            job["updated_at"] = _now()
+            await asyncio.to_thread(save_job, job)
+
+            pages += 1
+            if max_pages and pages >= max_pages:
+                job["status"] = "paused"
+                break
+    finally:
+        if not next_page.done():
+            next_page.cancel()
+
+    job["updated_at"] = _now()
+    await asyncio.to_thread(save_job, job)
+
+    log_event(
+        level="INFO",
+        action="RESCORING_JOB",
+        actor_role="system",
+        resource_type="prediction",
+        metadata={
+            **{k: job[k] for k in ("id", "model_version", "status", "scanned", "scored", "skipped", "failed", "unsupported", "throttled_seconds")},
+            "pages": pages,
+            "duration_ms": int((time.time() - start_time) * 1000)
+        }
+    )
+    return job
+
+
+async def rescoring_worker():
+    """Started from main.py when RESCORE_ENABLED=true: runs the job for the deployed version once."""
+    try:
+        await run_rescoring_job()
+    except Exception as e:
+        print(f"Re-scoring job failed: {e}")
+
+
+if __name__ == "__main__":
+    # Outside the API process (no interactive traffic to protect), e.g.
+    #   python -m app.services.inference.rescoring --max-pages 10
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--job-id")
+    parser.add_argument("--max-pages", type=int)
+    args = parser.parse_args()
+    print(asyncio.run(run_rescoring_job(args.job_id, args.max_pages)))
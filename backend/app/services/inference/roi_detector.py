@@ -2,12 +2,13 @@ import os
 import torch
 import torchvision
 from torchvision.models.detection import FasterRCNN_ResNet50_FPN_Weights
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import numpy as np
 from dotenv import load_dotenv
 
 # Import preprocessing from the nearby service
-from app.services.preprocessing.bbox_preprocessing import detection_preprocess_from_array
+from app.services.preprocessing.fused_preprocessing import fused_detection_input
+from app.services.inference.execution import inference_context, prepare_model
 
 class FasterRCNNDetector:
     """
@@ -34,8 +35,20 @@ class FasterRCNNDetector:
             
             self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
             self.model_path = model_path or os.getenv("FASTER_RCNN_MODEL_PATH")
-            self._model = self._load_model()
-            self._model.eval()
+            self._model = prepare_model(self._load_model())
+
+    @classmethod
+    def candidate(cls, model_path: str, version: str) -> "FasterRCNNDetector":
+        """
+        Separate instance (not the singleton) loaded from other weights,
+        e.g. a model under shadow evaluation.
+        """
+        instance = super(FasterRCNNDetector, cls).__new__(cls)
+        instance.MODEL_VERSION = version
+        instance.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        instance.model_path = model_path
+        instance._model = prepare_model(instance._load_model())
+        return instance
 
     def _load_model(self):
         """Simple model instantiator - using 2 classes (Background + Nodule)"""
@@ -76,7 +89,12 @@ class FasterRCNNDetector:
             
         return model.to(self.device)
 
-    @torch.no_grad()
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        """(min_side, max_side) the model's transform resizes images to."""
+        transform = self._model.transform
+        return min(transform.min_size), transform.max_size
+
     def detect(self, image_array: np.ndarray) -> Dict:
         """
         Run detection on a single image.
@@ -84,11 +102,12 @@ class FasterRCNNDetector:
         h_orig, w_orig = image_array.shape[:2]
         
         # 1. Preprocess (Normalize to [0, 1] RGB)
-        # Returns Tensor (3, H, W)
-        tensor = detection_preprocess_from_array(image_array).to(self.device).unsqueeze(0)
+        # Returns Tensor (3, H, W) - a view into this thread's reusable buffer
+        tensor = fused_detection_input(image_array).to(self.device).unsqueeze(0)
 
         # 2. Forward pass
-        outputs = self._model(tensor)[0]
+        with inference_context():
+            outputs = self._model(tensor)[0]
         
         boxes = outputs["boxes"]
         scores = outputs["scores"]
@@ -153,3 +172,7 @@ class FasterRCNNDetector:
             "coordinate_space": "raw_image",
             "detector": {"name": self.MODEL_NAME, "version": f"fallback-score-{score:.4f}"}
         }
+
+    def warmup(self):
+        """One dummy forward pass (compiles the backbone when MODEL_COMPILE is on)."""
+        self.detect(np.zeros((600, 800), dtype=np.uint8))
@@ -0,0 +1,210 @@
+"""
+Shadow Model Evaluation
+=======================
+
+Re-runs a sample of /inference/run and /inference/upload-and-run
+requests on candidate weights and records how far the candidate
+disagrees with production, before the weights are promoted.
+
+- SHADOW_FRACTION of requests are sampled; the work is handed over after
+  the response has been sent (BackgroundTasks) and runs on one dedicated,
+  reniced thread whose forward passes run at BACKGROUND_TORCH_THREADS
+  torch threads, between interactive ones (execution.TorchThreadBudget)
+  - it never adds latency to the request it shadows
+- Dropped, never queued: a sample is discarded when the previous shadow
+  run is still going, when more than SHADOW_MAX_IN_FLIGHT interactive
+  requests / live frames are being served, or when the interactive p99
+  of this worker (app/utils/latency.py) is over SHADOW_MAX_P99_MS
+- Only the configured models are swapped (SHADOW_XCEPTION_MODEL_PATH
+  and/or SHADOW_FASTER_RCNN_MODEL_PATH). The candidate pipeline reads the
+  stage cache but never writes it: with a classifier-only candidate the
+  production detection and crop are reused and only Xception runs
+- Per comparison: TI-RADS match, ACR features that flipped, IoU of the
+  boxes. Each one is logged (SHADOW_COMPARISON); running totals are
+  served by /api/metrics/shadow
+
+Candidate weights are loaded on the shadow thread with the first sample.
+DICOM clips are not shadowed.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional
+
+from app.services.inference.execution import background_thread_init
+from app.services.inference.feature_classifier import FeatureClassifier
+from app.services.inference.inference_pipeline import InferencePipeline
+from app.services.inference.model_registry import model_registry
+from app.services.inference.roi_detector import FasterRCNNDetector
+from app.utils.latency import request_latency
+from app.utils.logger import log_event
+from app.services.preprocessing.dicom import is_dicom
+
+SHADOW_FRACTION = float(os.getenv("SHADOW_FRACTION", "0"))
+SHADOW_XCEPTION_MODEL_PATH = os.getenv("SHADOW_XCEPTION_MODEL_PATH")
+SHADOW_XCEPTION_VERSION = os.getenv("SHADOW_XCEPTION_VERSION", "shadow-candidate")
+SHADOW_FASTER_RCNN_MODEL_PATH = os.getenv("SHADOW_FASTER_RCNN_MODEL_PATH")
+SHADOW_FASTER_RCNN_VERSION = os.getenv("SHADOW_FASTER_RCNN_VERSION", "shadow-candidate")
+# Drop samples while the interactive p99 is above this
+SHADOW_MAX_P99_MS = float(os.getenv("SHADOW_MAX_P99_MS", "1500"))
+# Drop samples while more interactive requests than this are being served
+SHADOW_MAX_IN_FLIGHT = int(os.getenv("SHADOW_MAX_IN_FLIGHT", "0"))
+# Boxes overlapping less than this count as a box disagreement
+SHADOW_IOU_THRESHOLD = float(os.getenv("SHADOW_IOU_THRESHOLD", "0.5"))
+
+SHADOW_ENABLED = SHADOW_FRACTION > 0 and bool(SHADOW_XCEPTION_MODEL_PATH or SHADOW_FASTER_RCNN_MODEL_PATH)
+
+
+def box_iou(a: Dict, b: Dict) -> float:
+    """IoU of two xywh boxes (same coordinate space)."""
+    ix = max(0.0, min(a["x"] + a["width"], b["x"] + b["width"]) - max(a["x"], b["x"]))
+    iy = max(0.0, min(a["y"] + a["height"], b["y"] + b["height"]) - max(a["y"], b["y"]))
+    inter = ix * iy
+    union = a["width"] * a["height"] + b["width"] * b["height"] - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare(production: Dict, candidate: Dict) -> Dict[str, Any]:
+    """Disagreement between two pipeline results of the same image."""
+    prod_features = production["features"]["clinical_features"]
+    cand_features = candidate["features"]["clinical_features"]
+    return {
+        "tirads": [production["tirads"], candidate["tirads"]],
+        "tirads_match": production["tirads"] == candidate["tirads"],
+        "feature_flips": sorted(
+            name for name in prod_features
+            if cand_features.get(name, {}).get("value") != prod_features[name]["value"]
+        ),
+        "box_iou": round(box_iou(production["bounding_box"], candidate["bounding_box"]), 4),
+    }
+
+
+class ShadowEvaluator:
+    """Samples requests onto a candidate pipeline and keeps disagreement totals."""
+
+    def __init__(self, fraction: float = SHADOW_FRACTION, max_p99_ms: float = SHADOW_MAX_P99_MS,
+                 max_in_flight: int = SHADOW_MAX_IN_FLIGHT):
+        self.fraction = fraction
+        self.max_p99_ms = max_p99_ms
+        self.max_in_flight = max_in_flight
+        self._candidates = None                # (detector, classifier) - None where production is used
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slot = threading.Semaphore(1)    # one shadow run at a time, nothing waits
+        self._lock = threading.Lock()
+
+        self.counters = Counter()              # sampled / compared / dropped_* / failed / ...
+        self.feature_flips = Counter()
+        self._iou_total = 0.0
+        self._shadow_ms_total = 0.0
+
+    def _candidate_pipeline(self, production):
+        """Production pipeline with the candidate weights swapped in (loaded once)."""
+        if self._candidates is None:
+            self._candidates = (
+                FasterRCNNDetector.candidate(SHADOW_FASTER_RCNN_MODEL_PATH, SHADOW_FASTER_RCNN_VERSION)
+                if SHADOW_FASTER_RCNN_MODEL_PATH else None,
+                FeatureClassifier.candidate(SHADOW_XCEPTION_MODEL_PATH, SHADOW_XCEPTION_VERSION)
+                if SHADOW_XCEPTION_MODEL_PATH else None,
+            )
+        detector, classifier = self._candidates
+        return InferencePipeline(
+            roi_detector=detector or production.roi_detector,
+            feature_classifier=classifier or production.feature_classifier,
+            cache_writes=False,
+        )
+
+    def submit(self, image_bytes: bytes, production: Dict, prediction_id: Optional[str] = None) -> str:
+        """
+        Called after the response is sent. Never blocks: returns what
+        happened to the request ("skipped" | "dropped_busy" | "dropped_load" | "sampled").
+        """
+        if random.random() >= self.fraction or is_dicom(image_bytes):
+            return "skipped"
+
+        if request_latency.in_flight > self.max_in_flight:
+            return self._count("dropped_load")
+        p99 = request_latency.percentile(99)
+        if p99 is not None and p99 > self.max_p99_ms:
+            return self._count("dropped_load")
+        if not self._slot.acquire(blocking=False):
+            return self._count("dropped_busy")
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow", initializer=background_thread_init)
+        self._count("sampled")
+        self._executor.submit(self._run, image_bytes, production, prediction_id)
+        return "sampled"
+
+    def _count(self, name: str) -> str:
+        with self._lock:
+            self.counters[name] += 1
+        return name
+
+    def _run(self, image_bytes: bytes, production: Dict, prediction_id: Optional[str]):
+        try:
+            start = time.perf_counter()
+            with model_registry.lease() as production_pipeline:
+                candidate = self._candidate_pipeline(production_pipeline).score_batch([image_bytes])[0]
+            if "error" in candidate:
+                raise RuntimeError(candidate["error"])
+            shadow_ms = (time.perf_counter() - start) * 1000
+            result = compare(production, candidate)
+
+            with self._lock:
+                self.counters["compared"] += 1
+                self.counters["tirads_mismatch"] += not result["tirads_match"]
+                self.counters["box_disagreement"] += result["box_iou"] < SHADOW_IOU_THRESHOLD
+                self.feature_flips.update(result["feature_flips"])
+                self._iou_total += result["box_iou"]
+                self._shadow_ms_total += shadow_ms
+
+            log_event(
+                level="INFO",
+                action="SHADOW_COMPARISON",
+                actor_role="system",
+                resource_type="prediction",
+                resource_id=prediction_id,
+                metadata={
+                    **result,
+                    "production": production["models"],
+                    "candidate": {k: candidate["models"][k] for k in ("roi_detector", "feature_classifier")},
+                    "shadow_ms": int(shadow_ms),
+                }
+            )
+        except Exception as e:
+            self._count("failed")
+            log_event(
+                level="WARN",
+                action="SHADOW_EVALUATION_ERROR",
+                actor_role="system",
+                resource_type="prediction",
+                resource_id=prediction_id,
+                exception=e
+            )
+        finally:
+            self._slot.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            compared = self.counters["compared"]
+            return {
+                "enabled": SHADOW_ENABLED,
+                "fraction": self.fraction,
+                "candidate": {
+                    "feature_classifier": SHADOW_XCEPTION_VERSION if SHADOW_XCEPTION_MODEL_PATH else None,
+                    "roi_detector": SHADOW_FASTER_RCNN_VERSION if SHADOW_FASTER_RCNN_MODEL_PATH else None,
+                },
+                **{k: self.counters[k] for k in ("sampled", "compared", "failed", "dropped_busy", "dropped_load")},
+                "tirads_mismatch_rate": round(self.counters["tirads_mismatch"] / compared, 4) if compared else None,
+                "feature_flip_rates": {k: round(v / compared, 4) for k, v in self.feature_flips.items()} if compared else {},
+                "mean_box_iou": round(self._iou_total / compared, 4) if compared else None,
+                "box_disagreement_rate": round(self.counters["box_disagreement"] / compared, 4) if compared else None,
+                "mean_shadow_ms": round(self._shadow_ms_total / compared, 1) if compared else None,
+            }
+
+
+shadow_evaluator = ShadowEvaluator()
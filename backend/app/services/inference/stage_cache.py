@@ -0,0 +1,192 @@
+# app/services/inference/stage_cache.py
+"""
+Pipeline Stage Cache
+====================
+
+Persists intermediate pipeline outputs so a re-run only repeats the
+stages whose version changed:
+
+    detect   -> detector box + decoded geometry     (JSON)
+    crop     -> resized 299×299 ROI pixels          (.npy, uint8 / uint16)
+    classify -> FeatureClassifier result            (JSON)
+    processed-> grayscale JPEG for storage          (.jpg)
+
+Stage versions are chained - each includes the versions of the stages it
+consumes - so bumping FasterRCNNDetector.MODEL_VERSION invalidates every
+stage, while bumping FeatureClassifier.MODEL_VERSION re-runs only the
+Xception pass on the cached crop.
+
+Entries are keyed by the SHA-256 of the image bytes (the same upload run
+twice, through /run or /upload-and-run, hits the same entry).
+Layout: <root>/<image_key>/<stage>/<version>.<ext> - only the latest
+version of each stage is kept.
+
+The cache is bounded (app/utils/disk_cache.py): images unused for
+STAGE_CACHE_MAX_AGE_SECONDS are dropped, then the least recently used
+ones until it is under STAGE_CACHE_MAX_BYTES.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.utils.disk_cache import DiskCacheBound, subdirectories
+
+STAGE_CACHE_ENABLED = os.getenv("STAGE_CACHE_ENABLED", "true").lower() == "true"
+STAGE_CACHE_MAX_BYTES = int(os.getenv("STAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+STAGE_CACHE_MAX_AGE_SECONDS = float(os.getenv("STAGE_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+STAGE_CACHE_SWEEP_SECONDS = float(os.getenv("STAGE_CACHE_SWEEP_SECONDS", "300"))
+
+# Bump when a stored stage format changes
+STAGE_FORMAT_VERSION = "stages-v1"
+
+STAGE_EXTENSIONS = {"detect": "json", "crop": "npy", "classify": "json", "processed": "jpg"}
+
+
+def image_key(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def chain_versions(stages: Dict[str, str]) -> Dict[str, str]:
+    """
+    {stage: own version} in pipeline order -> {stage: chained version}:
+    each stage's key covers its own version and every upstream one.
+    """
+    chained = {}
+    upstream = STAGE_FORMAT_VERSION
+    for stage, version in stages.items():
+        upstream = hashlib.sha256(f"{upstream}|{stage}={version}".encode()).hexdigest()[:16]
+        chained[stage] = upstream
+    return chained
+
+
+class StageCache:
+    """Local-disk store of per-image stage outputs."""
+
+    def __init__(self, root: str, max_bytes: int = STAGE_CACHE_MAX_BYTES,
+                 max_age_seconds: float = STAGE_CACHE_MAX_AGE_SECONDS,
+                 sweep_seconds: float = STAGE_CACHE_SWEEP_SECONDS):
+        self.root = root
+        self.bound = DiskCacheBound(self._entries, max_bytes, max_age_seconds, sweep_seconds)
+
+    def _entries(self):
+        return [entry for prefix in subdirectories(self.root) for entry in subdirectories(prefix)]
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _dir(self, key: str, stage: str) -> str:
+        return os.path.join(self._entry(key), stage)
+
+    def _path(self, key: str, stage: str, version: str) -> str:
+        return os.path.join(self._dir(key, stage), f"{version}.{STAGE_EXTENSIONS[stage]}")
+
+    def get(self, key: str, stage: str, version: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key, stage, version), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        self.bound.touch(self._entry(key))
+        return data
+
+    def put(self, key: str, stage: str, version: str, data: bytes) -> None:
+        directory = self._dir(key, stage)
+        os.makedirs(directory, exist_ok=True)
+
+        # Atomic write: concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        target = self._path(key, stage, version)
+        os.replace(tmp_path, target)
+
+        # Drop stale versions of this stage
+        for name in os.listdir(directory):
+            if name != os.path.basename(target) and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+        self.bound.touch(self._entry(key))
+        self.bound.written(len(data))
+
+    # ---- typed helpers (a failing cache never fails the pipeline) ----
+    def get_json(self, key: str, stage: str, version: str) -> Optional[dict]:
+        try:
+            data = self.get(key, stage, version)
+            return json.loads(data) if data is not None else None
+        except Exception as e:
+            print(f"Stage cache read failed ({stage}): {e}")
+            return None
+
+    def put_json(self, key: str, stage: str, version: str, value: dict) -> None:
+        try:
+            self.put(key, stage, version, json.dumps(value, separators=(",", ":")).encode())
+        except Exception as e:
+            print(f"Stage cache write failed ({stage}): {e}")
+
+    def get_array(self, key: str, stage: str, version: str) -> Optional[np.ndarray]:
+        try:
+            data = self.get(key, stage, version)
+            return np.load(io.BytesIO(data), allow_pickle=False) if data is not None else None
+        except Exception as e:
+            print(f"Stage cache read failed ({stage}): {e}")
+            return None
+
+    def put_array(self, key: str, stage: str, version: str, array: np.ndarray) -> None:
+        try:
+            buffer = io.BytesIO()
+            np.save(buffer, array, allow_pickle=False)
+            self.put(key, stage, version, buffer.getvalue())
+        except Exception as e:
+            print(f"Stage cache write failed ({stage}): {e}")
+
+    def get_bytes(self, key: str, stage: str, version: str) -> Optional[bytes]:
+        try:
+            return self.get(key, stage, version)
+        except Exception as e:
+            print(f"Stage cache read failed ({stage}): {e}")
+            return None
+
+    def put_bytes(self, key: str, stage: str, version: str, data: bytes) -> None:
+        try:
+            self.put(key, stage, version, data)
+        except Exception as e:
+            print(f"Stage cache write failed ({stage}): {e}")
+
+
+class StageRun:
+    """
+    Stage lookups for one image: records which stages were served from the
+    cache. Every call is a no-op when the stage cache is disabled; put()
+    is one when writable=False.
+    """
+
+    def __init__(self, cache: StageCache, image_bytes: bytes, versions: Dict[str, str], writable: bool = True):
+        self.cache = cache
+        self.key = image_key(image_bytes) if STAGE_CACHE_ENABLED else None
+        self.versions = versions
+        self.writable = writable
+        self.status: Dict[str, str] = {}    # stage -> "cached" | "computed"
+
+    def get(self, stage: str, kind: str):
+        """kind: "json" | "array" | "bytes" (the cache's typed helpers)."""
+        if self.key is None:
+            return None
+        value = getattr(self.cache, f"get_{kind}")(self.key, stage, self.versions[stage])
+        self.status[stage] = "cached" if value is not None else "computed"
+        return value
+
+    def put(self, stage: str, kind: str, value) -> None:
+        if self.key is not None and self.writable:
+            getattr(self.cache, f"put_{kind}")(self.key, stage, self.versions[stage], value)
+
+
+stage_cache = StageCache(os.getenv("STAGE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "thyrosight-stages")))
@@ -0,0 +1,134 @@
+"""
+Image Decoding (inference path)
+===============================
+
+Decodes uploads straight from the byte buffer into the NumPy frame the
+pipeline works on:
+
+- JPEG / PNG / TIFF / BMP / WebP in mode L or RGB go through cv2.imdecode
+  (libjpeg-turbo for JPEG) on a zero-copy view of the bytes - no PIL image
+  plus np.array copy. Pixels are identical to PIL's decode.
+- When the consumer downsamples anyway (Faster R-CNN resizes to its
+  min_size / max_size), large JPEGs are decoded at 1/2, 1/4 or 1/8 scale in
+  the DCT domain. The reduced frame still has at least the resolution the
+  detector would resize to; `scale` maps its coordinates back to the raw
+  image.
+- 16-bit grayscale PNG / TIFF stay uint16 (PIL's "L" / "RGB" conversion
+  clips them to 255).
+- Everything else (palette, RGBA, CMYK, ...) falls back to PIL exactly as
+  before: grayscale modes -> "L", anything else -> "RGB".
+"""
+
+import os
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DECODE_REDUCED_JPEG = os.getenv("DECODE_REDUCED_JPEG", "true").lower() == "true"
+
+# Source modes decoded to single-channel (B-mode ultrasound).
+# Anything else (colour Doppler overlays, RGB screenshots) is decoded as RGB.
+GRAYSCALE_MODES = ("1", "L", "LA")
+GRAYSCALE_16_MODES = ("I;16", "I;16L", "I;16B", "I")
+
+CV2_FORMATS = ("JPEG", "PNG", "TIFF", "BMP", "WEBP")
+REDUCED_GRAYSCALE_FLAGS = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+# OpenCV >= 4.10 decodes to RGB directly; older versions need a swap
+IMREAD_COLOR_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+
+
+@dataclass
+class DecodedImage:
+    """Decoded frame plus what is needed to map it back to the raw upload."""
+    array: np.ndarray           # H×W (grayscale, uint8 or uint16) or H×W×3 (RGB, uint8)
+    width: int                  # raw image size
+    height: int
+    scale: int = 1              # raw pixels per decoded pixel (DCT-domain reduction)
+    decoder: str = "cv2"
+
+    @property
+    def grayscale(self) -> bool:
+        return self.array.ndim == 2
+
+
+def reduction_for(width: int, height: int, target_size: Optional[Tuple[int, int]]) -> int:
+    """
+    Largest JPEG reduction (1, 2, 4, 8) that keeps the frame at least as
+    large as a consumer resizing it to target_size = (min_side, max_side)
+    would make it.
+    """
+    if not target_size or not DECODE_REDUCED_JPEG:
+        return 1
+    min_side, max_side = target_size
+    resize = min(min_side / min(width, height), max_side / max(width, height))
+    if resize >= 1:
+        return 1
+    for factor in (8, 4, 2):
+        if factor <= 1 / resize:
+            return factor
+    return 1
+
+
+def _decode_cv2(buffer: np.ndarray, mode: str, reduction: int) -> Optional[np.ndarray]:
+    if mode in GRAYSCALE_16_MODES:
+        array = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+        if array is None or array.ndim != 2 or array.dtype not in (np.uint8, np.uint16):
+            return None
+        return array
+
+    # EXIF orientation is ignored, as PIL's decode does
+    flags = cv2.IMREAD_IGNORE_ORIENTATION
+    flags |= REDUCED_GRAYSCALE_FLAGS[reduction] if reduction > 1 else cv2.IMREAD_GRAYSCALE
+    if mode == "L":
+        return cv2.imdecode(buffer, flags)
+
+    if IMREAD_COLOR_RGB is not None:
+        return cv2.imdecode(buffer, flags | IMREAD_COLOR_RGB)
+    array = cv2.imdecode(buffer, flags | cv2.IMREAD_COLOR)
+    if array is not None:
+        cv2.cvtColor(array, cv2.COLOR_BGR2RGB, dst=array)
+    return array
+
+
+def decode_image(data: bytes, target_size: Optional[Tuple[int, int]] = None) -> DecodedImage:
+    """
+    Decode an upload. `target_size` = (min_side, max_side) the consumer will
+    resize to; large JPEGs are then decoded at a reduced scale.
+    Raises on undecodable data.
+    """
+    img = Image.open(BytesIO(data))     # header only
+    width, height = img.size
+
+    if img.format in CV2_FORMATS and img.mode in ("L", "RGB") + GRAYSCALE_16_MODES:
+        reduction = reduction_for(width, height, target_size) if img.format == "JPEG" else 1
+        array = _decode_cv2(np.frombuffer(data, dtype=np.uint8), img.mode, reduction)
+        if array is not None:
+            return DecodedImage(array=array, width=width, height=height, scale=reduction)
+
+    img = img.convert("L") if img.mode in GRAYSCALE_MODES + GRAYSCALE_16_MODES else img.convert("RGB")
+    return DecodedImage(array=np.array(img), width=width, height=height, decoder="pil")
+
+
+def to_uint8(array: np.ndarray) -> np.ndarray:
+    """8-bit view of a decoded frame (16-bit is rescaled, not clipped)."""
+    if array.dtype == np.uint8:
+        return array
+    return cv2.convertScaleAbs(array, alpha=255.0 / np.iinfo(array.dtype).max)
+
+
+def scale_box(box: dict, decoded: DecodedImage) -> dict:
+    """xyxy box in decoded-frame pixels -> raw image pixels."""
+    if decoded.scale == 1:
+        return box
+    s = decoded.scale
+    return {
+        "xmin": box["xmin"] * s,
+        "ymin": box["ymin"] * s,
+        "xmax": min(box["xmax"] * s, decoded.width),
+        "ymax": min(box["ymax"] * s, decoded.height),
+    }
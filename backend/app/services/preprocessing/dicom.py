@@ -0,0 +1,120 @@
+"""
+DICOM / Cine Ingestion
+======================
+
+Reads single- and multi-frame (cine) DICOM from the uploaded bytes. Only
+the header is parsed up front; pixel data is decoded one frame at a time
+(pydicom.pixels.pixel_array with `index`), so a 300-frame loop costs one
+frame of memory per decode, not the whole clip.
+
+Frames come out in the pipeline's frame format:
+- grayscale: H×W uint8, or uint16 scaled up to the full 16-bit range
+  (BitsStored 10/12 -> shifted, lossless); MONOCHROME1 is inverted
+- colour: H×W×3 uint8 RGB (YBR is converted by pydicom). Ultrasound
+  scanners often store B-mode as RGB with identical channels - those
+  frames collapse to H×W grayscale.
+"""
+
+from io import BytesIO
+from typing import Optional
+
+import cv2
+import numpy as np
+import pydicom
+from pydicom.pixels import pixel_array
+
+from app.services.preprocessing.decoding import to_uint8
+
+DICOM_PREAMBLE = 128
+DICOM_MAGIC = b"DICM"
+
+
+def is_dicom(data: bytes) -> bool:
+    """Part 10 file check (128-byte preamble + "DICM")."""
+    return data[DICOM_PREAMBLE:DICOM_PREAMBLE + 4] == DICOM_MAGIC
+
+
+class DicomClip:
+    """Lazily decoded DICOM frames. Not thread-safe (shares one reader)."""
+
+    def __init__(self, data: bytes):
+        self._buffer = BytesIO(data)
+        ds = pydicom.dcmread(self._buffer, stop_before_pixels=True)
+        self.header = ds
+
+        if "Rows" not in ds or "Columns" not in ds:
+            raise ValueError("DICOM file has no image data")
+
+        self.width = int(ds.Columns)
+        self.height = int(ds.Rows)
+        self.frame_count = int(ds.get("NumberOfFrames", 1) or 1)
+        self.samples_per_pixel = int(ds.get("SamplesPerPixel", 1))
+        self.bits_allocated = int(ds.get("BitsAllocated", 8))
+        self.bits_stored = int(ds.get("BitsStored", self.bits_allocated))
+        self.photometric = str(ds.get("PhotometricInterpretation", "MONOCHROME2"))
+
+        if int(ds.get("PixelRepresentation", 0)) != 0:
+            raise ValueError("Signed DICOM pixel data is not supported")
+        if self.samples_per_pixel not in (1, 3):
+            raise ValueError(f"Unsupported SamplesPerPixel {self.samples_per_pixel}")
+        if self.bits_allocated not in (8, 16) or (self.samples_per_pixel == 3 and self.bits_allocated != 8):
+            raise ValueError(f"Unsupported BitsAllocated {self.bits_allocated}")
+
+    @property
+    def frame_time_ms(self) -> Optional[float]:
+        """Milliseconds between frames, if the file says."""
+        ds = self.header
+        if "FrameTime" in ds:
+            return float(ds.FrameTime)
+        rate = ds.get("CineRate") or ds.get("RecommendedDisplayFrameRate")
+        return 1000.0 / float(rate) if rate else None
+
+    def metadata(self) -> dict:
+        ds = self.header
+        return {
+            "modality": ds.get("Modality"),
+            "sop_instance_uid": str(ds.get("SOPInstanceUID", "")) or None,
+            "transfer_syntax": str(getattr(ds, "file_meta", {}).get("TransferSyntaxUID", "")) or None,
+            "frame_count": self.frame_count,
+            "frame_time_ms": self.frame_time_ms,
+            "width": self.width,
+            "height": self.height,
+            "photometric_interpretation": self.photometric,
+            "bits_stored": self.bits_stored,
+        }
+
+    def frame(self, index: int) -> np.ndarray:
+        """Decode one frame (0-based) into the pipeline's frame format."""
+        if not 0 <= index < self.frame_count:
+            raise IndexError(f"Frame {index} out of range (0-{self.frame_count - 1})")
+
+        self._buffer.seek(0)
+        array = pixel_array(self._buffer, index=index if self.frame_count > 1 else None)
+
+        if self.samples_per_pixel == 3:
+            array = np.asarray(array, dtype=np.uint8)
+            if np.array_equal(array[..., 0], array[..., 1]) and np.array_equal(array[..., 0], array[..., 2]):
+                return np.ascontiguousarray(array[..., 0])
+            return array
+
+        if self.bits_allocated == 8:
+            array = np.asarray(array, dtype=np.uint8)
+        else:
+            array = np.asarray(array, dtype=np.uint16)
+            if self.bits_stored < 16:
+                np.left_shift(array, 16 - self.bits_stored, out=array)
+
+        if self.photometric == "MONOCHROME1":
+            np.subtract(np.iinfo(array.dtype).max, array, out=array)
+        return array
+
+
+def frame_to_jpeg(frame: np.ndarray, quality: int = 95) -> bytes:
+    """JPEG of a decoded frame (16-bit is rescaled to 8-bit)."""
+    frame = to_uint8(frame)
+    if frame.ndim == 3:
+        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("JPEG encoding failed")
+    return encoded.tobytes()
@@ -26,7 +26,7 @@ def crop_roi(image, bbox):
     Crop Region of Interest (ROI) from image using bounding box.
     
     Args:
-        image: H×W×3 RGB numpy array
+        image: H×W×3 RGB (or H×W grayscale) numpy array
         bbox: [xmin, ymin, xmax, ymax] bounding box coordinates
         
     Returns:
@@ -38,7 +38,7 @@ def crop_roi(image, bbox):
     x1, y1, x2, y2 = map(int, bbox)
 
     # Clamp bbox to image boundaries
-    h, w, _ = image.shape
+    h, w = image.shape[:2]
     x1 = max(0, min(x1, w - 1))
     x2 = max(1, min(x2, w))
     y1 = max(0, min(y1, h - 1))
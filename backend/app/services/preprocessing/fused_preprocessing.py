@@ -0,0 +1,173 @@
+"""
+Fused Preprocessing (inference path)
+====================================
+
+Same numerics as detection_preprocess_from_array and
+xception_preprocess_from_array (bit-identical outputs), without the
+per-request temporaries:
+
+- The decoded uint8 frame is the only source buffer. The detector input
+  and the ROI crops are both read from it (crops are views, not copies).
+- ROIs are resized on uint8 straight into a reusable 299×299×3 buffer.
+- Normalization writes in place into preallocated float32 tensors.
+- Grayscale (H×W) frames stay single channel throughout; the 3 channels
+  the models expect are a zero-copy broadcast (stride 0) of the returned
+  tensors.
+- 16-bit grayscale frames are normalized by 65535 instead of 255, so the
+  extra precision reaches the models.
+
+Buffers live in a per-thread PreprocessWorkspace and only grow. Returned
+tensors are views into them: consume them before the next call on the
+same thread.
+"""
+
+import threading
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from app.services.preprocessing.feature_preprocessing import crop_roi
+
+XCEPTION_INPUT_SIZE = 299
+# Bump when the ROI crop numerics change (invalidates cached crops)
+# v2: cropped from the full-resolution frame (never a reduced-scale decode)
+CROP_VERSION = f"crop-{XCEPTION_INPUT_SIZE}-linear-v2"
+
+
+def _channels(frame: np.ndarray) -> int:
+    if frame.ndim == 2:
+        return 1
+    if frame.ndim == 3 and frame.shape[2] == 3:
+        return 3
+    raise ValueError("Input image must be H×W (grayscale) or H×W×3 (RGB)")
+
+
+def _full_scale(frame: np.ndarray) -> float:
+    if frame.dtype not in (np.uint8, np.uint16):
+        raise ValueError(f"Unsupported image dtype {frame.dtype} (expected uint8 or uint16)")
+    return float(np.iinfo(frame.dtype).max)
+
+
+class PreprocessWorkspace:
+    """Reusable preprocessing buffers for one worker thread."""
+
+    def __init__(self, max_batch: int = 1):
+        # Flat, grow-only storage viewed as H×W×C (same memory layout as the
+        # legacy numpy path) and returned as permuted CHW views: the
+        # uint8 -> float32 pass then reads and writes contiguously.
+        self._detection = torch.empty(0, dtype=torch.float32)
+        self._xception = torch.empty(max_batch * XCEPTION_INPUT_SIZE * XCEPTION_INPUT_SIZE * 3, dtype=torch.float32)
+        self._resized = np.empty(XCEPTION_INPUT_SIZE * XCEPTION_INPUT_SIZE * 3, dtype=np.uint16)   # viewed as uint8 or uint16
+        self._last_resized = None
+        # Buffer (re)allocations so far - flat once the largest frame has been seen
+        self.allocations = 3
+
+    def detection_input(self, frame: np.ndarray) -> torch.Tensor:
+        """
+        H×W×3 uint8 RGB or H×W uint8/uint16 grayscale -> (3, H, W) float32 in [0, 1].
+        Equivalent to detection_preprocess_from_array on the RGB frame.
+        """
+        c = _channels(frame)
+        full_scale = _full_scale(frame)
+        h, w = frame.shape[:2]
+        if self._detection.numel() < h * w * c:
+            self._detection = torch.empty(h * w * c, dtype=torch.float32)
+            self.allocations += 1
+
+        out = self._detection[: h * w * c].view(h, w, c)
+        out.copy_(torch.from_numpy(frame).reshape(h, w, c)).div_(full_scale)
+        return out.permute(2, 0, 1).expand(3, h, w)
+
+    def xception_batch(self, frame: np.ndarray, bboxes: Sequence[Sequence[float]]) -> torch.Tensor:
+        """
+        ROI crops of `frame` -> (N, 3, 299, 299) float32 in [-1, 1].
+        Row i is equivalent to xception_preprocess_from_array(frame, bboxes[i])
+        on the RGB frame.
+        """
+        return self.xception_crops([(frame, bbox) for bbox in bboxes])
+
+    def xception_crops(self, crops: Sequence[Tuple[np.ndarray, Sequence[float]]]) -> torch.Tensor:
+        """
+        (frame, bbox) pairs -> (N, 3, 299, 299), as xception_batch but each
+        crop may come from a different frame (cine keyframes). All frames
+        must share channel count and dtype.
+        """
+        frame = crops[0][0]
+        c = _channels(frame)
+        half_scale = _full_scale(frame) / 2     # 127.5 for uint8
+        out = self._xception_out(len(crops), c)
+
+        resized = self._resized.view(frame.dtype)[: XCEPTION_INPUT_SIZE * XCEPTION_INPUT_SIZE * c].reshape((XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE) + frame.shape[2:])
+        src = torch.from_numpy(resized).view(XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE, c)
+        for i, (crop_frame, bbox) in enumerate(crops):
+            if crop_frame.ndim != frame.ndim or crop_frame.dtype != frame.dtype:
+                raise ValueError("All frames in a batch must share channel count and dtype")
+            roi = crop_roi(crop_frame, bbox)   # view into the shared frame
+            cv2.resize(roi, (XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE), dst=resized, interpolation=cv2.INTER_LINEAR)
+            torch.div(src, half_scale, out=out[i])
+        self._last_resized = resized
+
+        # Xception normalization -> [-1, 1]
+        return self._xception_finish(out)
+
+    def xception_resized(self, crops: Sequence[np.ndarray]) -> torch.Tensor:
+        """
+        Already-resized 299×299 crops (resized_crop() output, e.g. from the
+        stage cache) -> (N, 3, 299, 299), same values as xception_crops.
+        """
+        c = _channels(crops[0])
+        half_scale = _full_scale(crops[0]) / 2
+        out = self._xception_out(len(crops), c)
+        for i, crop in enumerate(crops):
+            if crop.shape[:2] != (XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE) or _channels(crop) != c:
+                raise ValueError("Crops must be 299×299 with the same channel count")
+            torch.div(torch.from_numpy(np.ascontiguousarray(crop)).view(XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE, c), half_scale, out=out[i])
+        return self._xception_finish(out)
+
+    def resized_crop(self) -> np.ndarray:
+        """
+        Resized pixels (299×299[×3], frame dtype) of the last crop
+        xception_crops processed - a view, valid until the next call.
+        """
+        return self._last_resized
+
+    def _xception_out(self, n: int, c: int) -> torch.Tensor:
+        size = XCEPTION_INPUT_SIZE * XCEPTION_INPUT_SIZE
+        if self._xception.numel() < n * size * c:
+            self._xception = torch.empty(n * size * c, dtype=torch.float32)
+            self.allocations += 1
+        return self._xception[: n * size * c].view(n, XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE, c)
+
+    @staticmethod
+    def _xception_finish(out: torch.Tensor) -> torch.Tensor:
+        n = out.shape[0]
+        return out.sub_(1.0).permute(0, 3, 1, 2).expand(n, 3, XCEPTION_INPUT_SIZE, XCEPTION_INPUT_SIZE)
+
+
+_local = threading.local()
+
+
+def get_workspace() -> PreprocessWorkspace:
+    """This thread's workspace (created on first use)."""
+    workspace = getattr(_local, "workspace", None)
+    if workspace is None:
+        workspace = _local.workspace = PreprocessWorkspace()
+    return workspace
+
+
+def fused_detection_input(frame: np.ndarray) -> torch.Tensor:
+    return get_workspace().detection_input(frame)
+
+
+def fused_xception_batch(frame: np.ndarray, bboxes: List[Sequence[float]]) -> torch.Tensor:
+    return get_workspace().xception_batch(frame, bboxes)
+
+
+def fused_xception_resized(crops: List[np.ndarray]) -> torch.Tensor:
+    return get_workspace().xception_resized(crops)
+
+
+def fused_xception_crops(crops: List[Tuple[np.ndarray, Sequence[float]]]) -> torch.Tensor:
+    return get_workspace().xception_crops(crops)
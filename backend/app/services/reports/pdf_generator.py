@@ -8,31 +8,168 @@ from reportlab.lib.units import inch
 from reportlab.lib.enums import TA_CENTER
 from reportlab.lib import colors
 from PIL import Image as PILImage, ImageDraw
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import asyncio
+import threading
+import os
 import io
 import datetime
 import uuid
 
+# ---------------------------
+# Imaging
+# ---------------------------
+# Scans are printed at 2.7in on A4 - anything above ~200 DPI is invisible on paper
+IMAGE_DISPLAY_SIZE = 2.7 * inch
+IMAGE_TARGET_DPI = int(os.getenv("REPORT_IMAGE_DPI", "200"))
+IMAGE_JPEG_QUALITY = int(os.getenv("REPORT_IMAGE_JPEG_QUALITY", "85"))
+
+# ---------------------------
+# Static elements (built once per process, reused by every report)
+# ---------------------------
+_STYLES = getSampleStyleSheet()
+NORMAL_STYLE = _STYLES["Normal"]
+SECTION_STYLE = ParagraphStyle(
+    "section",
+    parent=_STYLES["Heading2"],
+    fontSize=10.5, # Slightly reduced from 11
+    fontName="Helvetica-Bold",
+    spaceBefore=10, # Reduced from 14
+    spaceAfter=4,  # Reduced from 6
+    textColor=colors.HexColor("#1a365d") # Professional dark blue
+)
+SMALL_STYLE = ParagraphStyle("small", fontSize=7, textColor=colors.grey)
+
+PATIENT_TABLE_STYLE = TableStyle([
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4), # Reduced from 6
+    ('TOPPADDING', (0, 0), (-1, -1), 4),
+])
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6), # Reduced from 10
+    ('TOPPADDING', (0, 0), (-1, -1), 6),    # Reduced from 10
+])
+
+# --- TI-RADS Risk Scale (Color Bar) ---
+RISK_COLORS = [
+    colors.HexColor("#7AC27D"), # TR1: Benign (Lighter green)
+    colors.HexColor("#C1E1C1"), # TR2: Not Suspicious
+    colors.HexColor("#F9E2AF"), # TR3: Mildly Suspicious
+    colors.HexColor("#FDAD4E"), # TR4: Moderately Suspicious
+    colors.HexColor("#F94144")  # TR5: Highly Suspicious
+]
+
+SCALE_BASE_STYLES = [
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8), # Reduced arrow size
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 1), (-1, 1), 8), # TR Labels
+    ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 2), (-1, 2), 6), # Descriptions
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+]
+for _i in range(5):
+    SCALE_BASE_STYLES.append(('BACKGROUND', (_i, 1), (_i, 1), RISK_COLORS[_i]))
+    if _i >= 3:
+        SCALE_BASE_STYLES.append(('TEXTCOLOR', (_i, 1), (_i, 1), colors.white))
+
+SCALE_LABELS = [
+    ["TR 1", "TR 2", "TR 3", "TR 4", "TR 5"],
+    ["Benign", "Not Susp.", "Mildly Susp.", "Mod. Susp.", "Highly Susp."]
+]
+
+FEATURE_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
+    ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
+    ('LEFTPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3), # Reduced padding
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+])
+
+EXPLANATION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
+    ('LEFTPADDING', (0, 0), (-1, -1), 8),  # Reduced from 10
+    ('RIGHTPADDING', (0, 0), (-1, -1), 8), # Reduced from 10
+    ('TOPPADDING', (0, 0), (-1, -1), 6),    # Reduced from 10
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6), # Reduced from 10
+])
+
+IMAGE_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    # Adding box around images to look more "medical monitor" like
+    ('BOX', (0, 0), (0, 0), 1, colors.black),
+    ('BOX', (1, 0), (1, 0), 1, colors.black),
+    ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Oblique'),
+    ('FONTSIZE', (0, 1), (-1, 1), 7.5),
+    ('TOPPADDING', (0, 1), (-1, 1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4), # Reduced from 8
+])
+
+HEADER_SUBTITLE_COLOR = colors.HexColor("#4a5568") # Darker grey
+DISCLAIMER = (
+    "IMPORTANT: This AI-generated report is intended for clinical decision support only. "
+    "Final diagnosis rests with qualified healthcare professionals."
+)
+
+
 class PDFReportGenerator:
     """Service to generate professional AI diagnostic reports in PDF format."""
 
     @staticmethod
     def draw_bounding_box(raw_bytes: bytes, bbox: dict) -> io.BytesIO:
         """Draws a red bounding box over the ultrasound image."""
-        img = PILImage.open(io.BytesIO(raw_bytes)).convert("RGB")
-        draw = ImageDraw.Draw(img)
+        _, boxed = PDFReportGenerator.prepare_scan_images(raw_bytes, bbox)
+        return boxed
 
-        x, y = bbox["x"], bbox["y"]
-        w, h = bbox["width"], bbox["height"]
-        
-        draw.rectangle([x, y, x + w, y + h], outline="red", width=4)
+    @staticmethod
+    def prepare_scan_images(raw_bytes: bytes, bbox: dict = None):
+        """
+        Decodes the scan once, downscales it to the print resolution and
+        returns (original, annotated) as JPEG buffers. `annotated` is None
+        when no bbox is given.
+        """
+        target_px = int(IMAGE_DISPLAY_SIZE / inch * IMAGE_TARGET_DPI)
+
+        img = PILImage.open(io.BytesIO(raw_bytes))
+        raw_w, raw_h = img.size
+        # JPEG: let the decoder downscale in the DCT domain (1/2, 1/4, 1/8)
+        img.draft("RGB" if img.mode not in ("L", "I;16", "I") else "L", (target_px, target_px))
+        img = img.convert("L" if img.mode in ("L", "I;16", "I") else "RGB")
+        img.thumbnail((target_px, target_px), PILImage.BILINEAR)
+
+        def to_jpeg(image) -> io.BytesIO:
+            buf = io.BytesIO()
+            image.save(buf, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+            buf.seek(0)
+            return buf
+
+        original = to_jpeg(img)
+        if not bbox:
+            return original, None
+
+        # bbox is in raw-image pixels
+        sx, sy = img.width / raw_w, img.height / raw_h
+        x, y = bbox["x"] * sx, bbox["y"] * sy
+        w, h = bbox["width"] * sx, bbox["height"] * sy
 
-        buf = io.BytesIO()
-        img.save(buf, format="PNG")
-        buf.seek(0)
-        return buf
+        boxed = img.convert("RGB")
+        draw = ImageDraw.Draw(boxed)
+        draw.rectangle([x, y, x + w, y + h], outline="red", width=max(2, round(4 * sx)))
+
+        return original, to_jpeg(boxed)
 
     @staticmethod
-    def _header_footer(canvas, doc, report_id):
+    def _header_footer(canvas, doc, report_id, report_date):
         """Draws the header and footer on each page."""
         canvas.saveState()
         
@@ -41,14 +178,14 @@ class PDFReportGenerator:
         canvas.drawString(40, 810, "ThyroSight")
         
         canvas.setFont("Helvetica-Oblique", 9)
-        canvas.setFillColor(colors.HexColor("#4a5568")) # Darker grey
+        canvas.setFillColor(HEADER_SUBTITLE_COLOR)
         canvas.drawString(40, 796, "Radiology Wingman")
         canvas.setFillColor(colors.black)
 
         canvas.setFont("Helvetica", 9)
         canvas.drawRightString(555, 810, "AI Diagnostic Report")
         canvas.drawRightString(555, 798, f"Report ID: {report_id}")
-        canvas.drawRightString(555, 786, f"Data: {datetime.date.today().strftime('%d %b %Y')}")
+        canvas.drawRightString(555, 786, f"Data: {report_date}")
 
         canvas.setStrokeColor(colors.grey)
         canvas.setLineWidth(0.5)
@@ -57,20 +194,16 @@ class PDFReportGenerator:
         # --- Footer ---
         canvas.setFont("Helvetica", 7)
         canvas.setFillColor(colors.grey)
-        disclaimer = (
-            "IMPORTANT: This AI-generated report is intended for clinical decision support only. "
-            "Final diagnosis rests with qualified healthcare professionals."
-        )
-        canvas.drawString(40, 30, disclaimer)
+        canvas.drawString(40, 30, DISCLAIMER)
         canvas.drawRightString(555, 30, f"Page {doc.page}")
         
         canvas.restoreState()
 
     @classmethod
-    def generate_pdf(cls, data: dict, raw_image_bytes: bytes) -> bytes:
+    def generate_pdf(cls, data: dict, raw_image_bytes: bytes, report_id: str = None) -> bytes:
         """Generates a complete PDF report from prediction data and image bytes."""
         buffer = io.BytesIO()
-        report_id = f"THY-{uuid.uuid4().hex[:8].upper()}"
+        report_id = report_id or f"THY-{uuid.uuid4().hex[:8].upper()}"
 
         doc = SimpleDocTemplate(
             buffer,
@@ -81,18 +214,9 @@ class PDFReportGenerator:
             bottomMargin=40 # Reduced from 50
         )
 
-        styles = getSampleStyleSheet()
-        section_style = ParagraphStyle(
-            "section",
-            parent=styles["Heading2"],
-            fontSize=10.5, # Slightly reduced from 11
-            fontName="Helvetica-Bold",
-            spaceBefore=10, # Reduced from 14
-            spaceAfter=4,  # Reduced from 6
-            textColor=colors.HexColor("#1a365d") # Professional dark blue
-        )
-        
-        normal_style = styles["Normal"]
+        section_style = SECTION_STYLE
+        normal_style = NORMAL_STYLE
+        report_date = datetime.date.today().strftime("%d %b %Y")
         elements = []
 
         # --- Data Extraction ---
@@ -106,16 +230,10 @@ class PDFReportGenerator:
         patient_data = [
             ["Patient Name", patient.get("name", "N/A")],
             ["Age / Gender", f"{patient.get('age', 'N/A')} / {patient.get('gender', 'N/A')}"],
-            ["Examination Date", datetime.date.today().strftime("%d %b %Y")]
+            ["Examination Date", report_date]
         ]
         pt_table = Table(patient_data, colWidths=[2 * inch, 4 * inch])
-        pt_table.setStyle(TableStyle([
-            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4), # Reduced from 6
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-        ]))
+        pt_table.setStyle(PATIENT_TABLE_STYLE)
         elements.append(pt_table)
 
         # --- Section 2: Clinical Summary ---
@@ -135,62 +253,30 @@ class PDFReportGenerator:
             f"Confidence: {confidence:.1f}%"
         ]]
         summ_table = Table(summary_data, colWidths=[3 * inch, 3 * inch])
-        summ_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6), # Reduced from 10
-            ('TOPPADDING', (0, 0), (-1, -1), 6),    # Reduced from 10
-        ]))
+        summ_table.setStyle(SUMMARY_TABLE_STYLE)
         elements.append(summ_table)
         elements.append(Spacer(1, 4)) # Reduced from 8
 
         # --- TI-RADS Risk Scale (Color Bar) ---
-        risk_colors = [
-            colors.HexColor("#7AC27D"), # TR1: Benign (Lighter green)
-            colors.HexColor("#C1E1C1"), # TR2: Not Suspicious
-            colors.HexColor("#F9E2AF"), # TR3: Mildly Suspicious
-            colors.HexColor("#FDAD4E"), # TR4: Moderately Suspicious
-            colors.HexColor("#F94144")  # TR5: Highly Suspicious
-        ]
-        
         indicators = ["", "", "", "", ""]
         if 1 <= tirads_score <= 5:
             indicators[tirads_score - 1] = "▼"
             
-        scale_data = [
-            indicators,
-            ["TR 1", "TR 2", "TR 3", "TR 4", "TR 5"],
-            ["Benign", "Not Susp.", "Mildly Susp.", "Mod. Susp.", "Highly Susp."]
-        ]
+        scale_data = [indicators, *SCALE_LABELS]
         
         scale_table = Table(scale_data, colWidths=[1.1 * inch] * 5)
         
-        scale_styles = [
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8), # Reduced arrow size
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 1), (-1, 1), 8), # TR Labels
-            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 2), (-1, 2), 6), # Descriptions
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
-            ('TOPPADDING', (0, 0), (-1, -1), 1),
-        ]
-        
-        for i in range(5):
-            scale_styles.append(('BACKGROUND', (i, 1), (i, 1), risk_colors[i]))
-            if i >= 3:
-               scale_styles.append(('TEXTCOLOR', (i, 1), (i, 1), colors.white))
-            
-            if i == tirads_score - 1:
-                scale_styles.append(('BOX', (i, 1), (i, 1), 1.5, colors.black))
-                scale_styles.append(('FONTNAME', (i, 2), (i, 2), 'Helvetica-Bold'))
+        scale_styles = list(SCALE_BASE_STYLES)
+        if 1 <= tirads_score <= 5:
+            i = tirads_score - 1
+            scale_styles.append(('BOX', (i, 1), (i, 1), 1.5, colors.black))
+            scale_styles.append(('FONTNAME', (i, 2), (i, 2), 'Helvetica-Bold'))
 
         scale_table.setStyle(TableStyle(scale_styles))
         elements.append(scale_table)
         
         elements.append(Spacer(1, 2)) # Reduced from 4
-        elements.append(Paragraph(f"Model ID: {pred.get('model_version', 'v2.1')}", ParagraphStyle("small", fontSize=7, textColor=colors.grey)))
+        elements.append(Paragraph(f"Model ID: {pred.get('model_version', 'v2.1')}", SMALL_STYLE))
 
         # --- Section 3: Ultrasound Findings ---
         elements.append(Paragraph("Section 3 – Ultrasound Findings", section_style))
@@ -199,14 +285,7 @@ class PDFReportGenerator:
             feature_rows.append([k.capitalize(), str(v).capitalize()])
         
         f_table = Table(feature_rows, colWidths=[2.5 * inch, 3.5 * inch])
-        f_table.setStyle(TableStyle([
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3), # Reduced padding
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ]))
+        f_table.setStyle(FEATURE_TABLE_STYLE)
         elements.append(f_table)
 
         # --- Section 4: AI Interpretation ---
@@ -214,23 +293,17 @@ class PDFReportGenerator:
         explanation = pred.get("ai_explanation") or pred.get("explanation", "No detailed interpretation generated.")
         
         exp_table = Table([[Paragraph(explanation, normal_style)]], colWidths=[6 * inch])
-        exp_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.whitesmoke),
-            ('LEFTPADDING', (0, 0), (-1, -1), 8),  # Reduced from 10
-            ('RIGHTPADDING', (0, 0), (-1, -1), 8), # Reduced from 10
-            ('TOPPADDING', (0, 0), (-1, -1), 6),    # Reduced from 10
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6), # Reduced from 10
-        ]))
+        exp_table.setStyle(EXPLANATION_TABLE_STYLE)
         elements.append(exp_table)
 
         # --- Section 5: Imaging ---
         elements.append(Paragraph("Section 5 – Imaging", section_style))
 
-        img_w, img_h = 2.7 * inch, 2.7 * inch # Slightly reduced for a safer single-page fit
-        img1 = Image(io.BytesIO(raw_image_bytes), width=img_w, height=img_h)
+        img_w, img_h = IMAGE_DISPLAY_SIZE, IMAGE_DISPLAY_SIZE # Slightly reduced for a safer single-page fit
+        original_buf, boxed_buf = cls.prepare_scan_images(raw_image_bytes, bbox)
+        img1 = Image(original_buf, width=img_w, height=img_h)
         
-        if bbox:
-            boxed_buf = cls.draw_bounding_box(raw_image_bytes, bbox)
+        if boxed_buf is not None:
             img2 = Image(boxed_buf, width=img_w, height=img_h)
         else:
             img2 = Paragraph("Nodule localization not available.", normal_style)
@@ -242,23 +315,52 @@ class PDFReportGenerator:
         ]
         
         img_table = Table(img_table_data, colWidths=[3.1 * inch, 3.1 * inch])
-        img_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            # Adding box around images to look more "medical monitor" like
-            ('BOX', (0, 0), (0, 0), 1, colors.black),
-            ('BOX', (1, 0), (1, 0), 1, colors.black),
-            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Oblique'),
-            ('FONTSIZE', (0, 1), (-1, 1), 7.5),
-            ('TOPPADDING', (0, 1), (-1, 1), 5),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4), # Reduced from 8
-        ]))
+        img_table.setStyle(IMAGE_TABLE_STYLE)
         elements.append(img_table)
 
         def on_page(canvas, doc):
-            cls._header_footer(canvas, doc, report_id)
+            cls._header_footer(canvas, doc, report_id, report_date)
 
         doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
         
         buffer.seek(0)
         return buffer.getvalue()
+
+
+# ---------------------------
+# Render pool
+# ---------------------------
+# ReportLab is pure-Python and CPU bound, so reports render in worker
+# processes instead of on the event loop / GIL.
+# Workers are spawned, not forked: the server process is multithreaded and
+# holds torch/OpenMP state and open HTTP pools, which a fork would copy
+# (deadlock-prone, duplicated model memory). A spawned worker only imports
+# this module - ReportLab and PIL, nothing from app/ - so keep it that way.
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            workers = int(os.getenv("REPORT_RENDER_WORKERS", "2"))
+            _render_pool = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _render_pool
+
+
+def render_pdf(data: dict, raw_image_bytes: bytes, report_id: str = None) -> bytes:
+    """Renders a report in the process pool (blocking - use from worker threads)."""
+    return _get_render_pool().submit(
+        PDFReportGenerator.generate_pdf, data, raw_image_bytes, report_id
+    ).result()
+
+
+async def render_pdf_async(data: dict, raw_image_bytes: bytes, report_id: str = None) -> bytes:
+    """Renders a report in the process pool without blocking the event loop."""
+    future = _get_render_pool().submit(
+        PDFReportGenerator.generate_pdf, data, raw_image_bytes, report_id
+    )
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,96 @@
+# app/services/reports/report_cache.py
+import os
+import json
+import hashlib
+import tempfile
+from typing import Optional
+
+from app.utils.disk_cache import DiskCacheBound, subdirectories
+
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 ** 2)))
+REPORT_CACHE_MAX_AGE_SECONDS = float(os.getenv("REPORT_CACHE_MAX_AGE_SECONDS", str(2 * 24 * 3600)))
+REPORT_CACHE_SWEEP_SECONDS = float(os.getenv("REPORT_CACHE_SWEEP_SECONDS", "300"))
+
+# Bump when the PDF layout changes so every cached report is re-rendered
+REPORT_TEMPLATE_VERSION = "report-v1"
+
+
+def compute_report_version(prediction: dict, raw_image: dict, patient: dict, feedback: Optional[dict]) -> str:
+    """
+    Content version of a report.
+    Changes whenever anything rendered into the PDF (prediction/explanation,
+    patient data, source image) or the feedback on it changes.
+    """
+    payload = {
+        "template": REPORT_TEMPLATE_VERSION,
+        "prediction": {
+            k: prediction.get(k) for k in (
+                "id", "tirads", "confidence", "model_version", "features",
+                "bounding_box", "ai_explanation", "explanation", "updated_at",
+            )
+        },
+        "raw_image": {
+            k: raw_image.get(k) for k in ("id", "file_path", "created_at")
+        },
+        "patient": {
+            k: (patient or {}).get(k) for k in (
+                "id", "first_name", "last_name", "age", "dob", "gender", "updated_at",
+            )
+        },
+        "feedback": feedback or None,
+    }
+    canonical = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class ReportCache:
+    """
+    Local-disk cache of rendered PDF reports.
+    Layout: <root>/<prediction_id>/<version>.pdf  (only the latest version is kept)
+    Bounded by REPORT_CACHE_MAX_BYTES / REPORT_CACHE_MAX_AGE_SECONDS (LRU).
+    """
+
+    def __init__(self, root: str, max_bytes: int = REPORT_CACHE_MAX_BYTES,
+                 max_age_seconds: float = REPORT_CACHE_MAX_AGE_SECONDS,
+                 sweep_seconds: float = REPORT_CACHE_SWEEP_SECONDS):
+        self.root = root
+        self.bound = DiskCacheBound(lambda: subdirectories(self.root), max_bytes, max_age_seconds, sweep_seconds)
+
+    def _dir(self, prediction_id: str) -> str:
+        return os.path.join(self.root, str(prediction_id))
+
+    def _path(self, prediction_id: str, version: str) -> str:
+        return os.path.join(self._dir(prediction_id), f"{version}.pdf")
+
+    def get(self, prediction_id: str, version: str) -> Optional[bytes]:
+        try:
+            with open(self._path(prediction_id, version), "rb") as f:
+                pdf_bytes = f.read()
+        except FileNotFoundError:
+            return None
+        self.bound.touch(self._dir(prediction_id))
+        return pdf_bytes
+
+    def put(self, prediction_id: str, version: str, pdf_bytes: bytes) -> None:
+        directory = self._dir(prediction_id)
+        os.makedirs(directory, exist_ok=True)
+
+        # Atomic write: concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, self._path(prediction_id, version))
+
+        # Drop stale versions of this report
+        for name in os.listdir(directory):
+            if name != f"{version}.pdf" and not name.endswith(".tmp"):
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+        self.bound.touch(directory)
+        self.bound.written(len(pdf_bytes))
+
+
+report_cache = ReportCache(os.getenv("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "thyrosight-reports")))
@@ -0,0 +1,96 @@
+# backend/app/utils/disk_cache.py
+
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Dict, Iterable
+
+
+class DiskCacheBound:
+    """
+    Size and age bound of a local-disk cache (stage cache, report cache).
+
+    An entry is one directory - everything cached for one image / report -
+    and its mtime is its last use: the cache touch()es it on every hit and
+    write. sweep() drops the entries unused for max_age_seconds, then the
+    least recently used ones until the cache is under max_bytes. Writes
+    start a background sweep every sweep_seconds, or sooner once a tenth
+    of max_bytes has been written since the last one.
+    """
+
+    def __init__(self, list_entries: Callable[[], Iterable[str]], max_bytes: int,
+                 max_age_seconds: float, sweep_seconds: float):
+        self.list_entries = list_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_seconds = sweep_seconds
+        self._last_sweep = time.monotonic()
+        self._written = 0
+        self._sweeping = threading.Lock()
+
+    @staticmethod
+    def touch(entry: str):
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+
+    def written(self, nbytes: int):
+        """Called after every write; never blocks on a sweep."""
+        self._written += nbytes
+        due = (
+            time.monotonic() - self._last_sweep >= self.sweep_seconds
+            or self._written >= self.max_bytes // 10
+        )
+        if due and self._sweeping.acquire(blocking=False):
+            threading.Thread(target=self._background_sweep, daemon=True).start()
+
+    def _background_sweep(self):
+        try:
+            self.sweep()
+        except Exception as e:
+            print(f"Cache sweep failed: {e}")
+        finally:
+            self._sweeping.release()
+
+    def sweep(self) -> Dict[str, int]:
+        self._last_sweep = time.monotonic()
+        self._written = 0
+        now = time.time()
+
+        entries = []
+        for entry in self.list_entries():
+            try:
+                used = os.stat(entry).st_mtime
+            except OSError:
+                continue
+            size = 0
+            for directory, _, files in os.walk(entry):
+                for name in files:
+                    try:
+                        size += os.path.getsize(os.path.join(directory, name))
+                    except OSError:
+                        pass
+            entries.append((used, size, entry))
+
+        # Least recently used first: evict while too old or over budget
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for used, size, entry in entries:
+            if now - used <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+        return {"entries": len(entries) - evicted, "bytes": total, "evicted": evicted}
+
+
+def subdirectories(path: str) -> Iterable[str]:
+    try:
+        with os.scandir(path) as it:
+            return [entry.path for entry in it if entry.is_dir()]
+    except FileNotFoundError:
+        return []
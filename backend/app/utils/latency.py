@@ -0,0 +1,71 @@
+# backend/app/utils/latency.py
+
+import os
+import time
+import threading
+from collections import deque
+from typing import Optional, Dict, Any
+
+LATENCY_WINDOW_SECONDS = float(os.getenv("LATENCY_WINDOW_SECONDS", "60"))
+LATENCY_WINDOW_MAX_SAMPLES = int(os.getenv("LATENCY_WINDOW_MAX_SAMPLES", "5000"))
+
+
+class LatencyWindow:
+    """
+    Latencies of the requests finished in the last `window_seconds`, and
+    the number of interactive requests being served right now (per worker
+    process). Fed by the request middleware and the live feed; read by
+    background jobs that must not slow interactive traffic down - the p99
+    reacts after the fact, in_flight as soon as a request arrives.
+    """
+
+    def __init__(self, window_seconds: float = LATENCY_WINDOW_SECONDS, max_samples: int = LATENCY_WINDOW_MAX_SAMPLES):
+        self.window_seconds = window_seconds
+        self._samples: deque = deque(maxlen=max_samples)   # (finished_at, ms)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+
+    def record(self, latency_ms: float):
+        with self._lock:
+            self._samples.append((time.monotonic(), latency_ms))
+
+    def started(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, latency_ms: Optional[float] = None):
+        """Ends a started() request; its latency is recorded when given."""
+        with self._lock:
+            self.in_flight -= 1
+            if latency_ms is not None:
+                self._samples.append((time.monotonic(), latency_ms))
+
+    def _recent(self) -> list:
+        cutoff = time.monotonic() - self.window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            return sorted(ms for _, ms in self._samples)
+
+    @staticmethod
+    def _pick(samples: list, q: float) -> Optional[float]:
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q in [0, 100]; None when no request finished inside the window."""
+        return self._pick(self._recent(), q)
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = self._recent()
+        return {
+            "window_seconds": self.window_seconds,
+            "requests": len(samples),
+            "in_flight": self.in_flight,
+            "p50_ms": self._pick(samples, 50),
+            "p99_ms": self._pick(samples, 99),
+        }
+
+
+request_latency = LatencyWindow()
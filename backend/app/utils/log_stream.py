@@ -0,0 +1,138 @@
+# backend/app/utils/log_stream.py
+
+import asyncio
+import json
+import os
+import threading
+from typing import Dict, Any, Optional
+
+from app.db.supabase import supabase_admin
+
+# Direct (session-mode) Postgres connection string. When set, every worker
+# LISTENs for the rows all workers write (migration 006); without it the
+# live tail only sees the rows written by its own process.
+LOG_STREAM_DATABASE_URL = os.getenv("LOG_STREAM_DATABASE_URL")
+LOG_STREAM_CHANNEL = "system_logs"
+LOG_STREAM_RECONNECT_SECONDS = float(os.getenv("LOG_STREAM_RECONNECT_SECONDS", "5"))
+LOG_STREAM_PING_SECONDS = float(os.getenv("LOG_STREAM_PING_SECONDS", "30"))
+
+
+class LogSubscription:
+    """One live-tail listener (an SSE connection) with its own bounded queue."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def _offer(self, row: Dict[str, Any]):
+        # Runs on the subscriber's loop. Slow consumers lose the oldest rows.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(row)
+
+    async def get(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await asyncio.wait_for(self.queue.get(), timeout=timeout)
+
+
+class LogBroadcaster:
+    """
+    Fan-out of freshly written system_logs rows to this process's live-tail
+    viewers.
+
+    With LOG_STREAM_DATABASE_URL, rows arrive from the database
+    (listen_for_logs) whatever process wrote them. Otherwise - or while the
+    listener is reconnecting - log_event() publishes the rows it inserted
+    itself. publish() is thread-safe: it is called from the event loop and
+    from threadpool / background tasks.
+    """
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.db_fanout = False   # True while a LISTEN connection is up
+
+    def subscribe(self) -> LogSubscription:
+        sub = LogSubscription(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: LogSubscription):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, row: Dict[str, Any]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, row)
+            except RuntimeError:
+                # Loop already closed
+                self.unsubscribe(sub)
+
+    def publish_notification(self, payload: str):
+        """Publishes a row announced by the system_logs_notify trigger."""
+        try:
+            row = json.loads(payload)
+        except ValueError:
+            print(f"Log stream: unreadable notification {payload[:100]!r}")
+            return
+        if row.get("truncated"):
+            # Too large for a NOTIFY payload: read it back off the loop
+            threading.Thread(target=self._publish_stored, args=(row,), daemon=True).start()
+        else:
+            self.publish(row)
+
+    def _publish_stored(self, key: Dict[str, Any]):
+        try:
+            res = (
+                supabase_admin.table("system_logs").select("*")
+                .eq("id", key["id"]).eq("created_at", key["created_at"])
+                .limit(1).execute()
+            )
+            if res.data:
+                self.publish(res.data[0])
+        except Exception as e:
+            print(f"Log stream: could not read log {key.get('id')}: {e}")
+
+
+log_broadcaster = LogBroadcaster()
+
+
+async def listen_for_logs(broadcaster: LogBroadcaster = log_broadcaster, dsn: Optional[str] = LOG_STREAM_DATABASE_URL):
+    """
+    Started from main.py in every worker: holds a LISTEN connection and
+    publishes each notified row; reconnects until cancelled.
+    """
+    import asyncpg
+
+    def on_notify(connection, pid, channel, payload):
+        broadcaster.publish_notification(payload)
+
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            await conn.add_listener(LOG_STREAM_CHANNEL, on_notify)
+            broadcaster.db_fanout = True
+            while True:
+                # A dead connection only shows up when it is used
+                await asyncio.sleep(LOG_STREAM_PING_SECONDS)
+                await conn.fetchval("SELECT 1")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Log stream: LISTEN connection lost: {e}")
+        finally:
+            broadcaster.db_fanout = False
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        await asyncio.sleep(LOG_STREAM_RECONNECT_SECONDS)
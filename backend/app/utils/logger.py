@@ -4,6 +4,7 @@ import os
 import uuid
 from typing import Optional, Dict, Any
 from app.db.supabase import supabase_admin
+from app.utils.log_stream import log_broadcaster
 
 
 LOGGING_ENABLED = os.getenv("SYSTEM_LOGGING_ENABLED", "false").lower() == "true"
@@ -61,7 +62,12 @@ def log_event(
         }
 
         # 3. Insert and ignore failures (don't break API if logging fails)
-        supabase_admin.table("system_logs").insert(payload).execute()
+        res = supabase_admin.table("system_logs").insert(payload).execute()
+
+        # 4. Fan out to live-tail viewers (no DB polling). With the LISTEN
+        #    connection up, the row comes back through the database instead.
+        if res.data and not log_broadcaster.db_fanout:
+            log_broadcaster.publish(res.data[0])
     except Exception as e:
         print(f"Logging Error: {e}") # Print to console for debugging
         pass
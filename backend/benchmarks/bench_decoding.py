@@ -0,0 +1,128 @@
+"""
+Image decoding: PIL vs cv2.imdecode vs reduced-scale JPEG
+=========================================================
+
+Decode time per megapixel of the raw upload for:
+
+- pil:      Image.open(BytesIO(data)).convert("RGB") + np.array (the old path)
+- decode:   decoding.decode_image(data) - cv2.imdecode on the byte buffer
+- reduced:  decode_image(data, target_size=(800, 1333)) - what the pipeline
+            uses; large JPEGs decode at 1/2-1/8 scale in the DCT domain
+
+on grayscale and RGB JPEGs and 16-bit grayscale PNG / TIFF. The `exact`
+column says whether the decoded pixels equal PIL's decode (16-bit inputs:
+the original uint16 frame); "-" marks reduced-scale decodes.
+
+Usage (from backend/):
+    python -m benchmarks.bench_decoding
+    python -m benchmarks.bench_decoding --sizes 800x600,3200x2400 --json
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+from typing import Callable, Dict
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.fixtures import synthetic_frame
+from app.services.preprocessing.decoding import decode_image
+
+DETECTOR_INPUT_SIZE = (800, 1333)
+
+
+def inputs(width: int, height: int) -> Dict[str, tuple]:
+    """name -> (encoded bytes, source pixels or None)."""
+    gray_jpeg = synthetic_frame(width, height, seed=0)
+    gray = np.array(Image.open(io.BytesIO(gray_jpeg)))
+
+    # Colour: tint the speckle so the chroma planes are not flat
+    rgb = np.dstack([gray, (gray * 0.8).astype(np.uint8), np.roll(gray, 7, axis=1)])
+    buf = io.BytesIO()
+    Image.fromarray(rgb).save(buf, format="JPEG", quality=90)
+
+    # 16-bit: the 8-bit frame widened, plus low-order detail 8-bit cannot hold
+    rng = np.random.default_rng(0)
+    gray16 = (gray.astype(np.uint16) * 257 + rng.integers(0, 257, gray.shape)).astype(np.uint16)
+
+    return {
+        "jpeg gray": (gray_jpeg, None),
+        "jpeg rgb": (buf.getvalue(), None),
+        "png 16-bit": (cv2.imencode(".png", gray16)[1].tobytes(), gray16),
+        "tiff 16-bit": (cv2.imencode(".tiff", gray16)[1].tobytes(), gray16),
+    }
+
+
+def time_ms(fn: Callable[[], object], runs: int) -> float:
+    fn()
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def pil_decode(data: bytes) -> np.ndarray:
+    return np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def run(width: int, height: int, runs: int) -> Dict:
+    megapixels = width * height / 1e6
+    results = {}
+    for name, (data, source) in inputs(width, height).items():
+        paths = {
+            "pil": lambda: pil_decode(data),
+            "decode": lambda: decode_image(data).array,
+            "reduced": lambda: decode_image(data, target_size=DETECTOR_INPUT_SIZE).array,
+        }
+        reference = pil_decode(data)
+        for path, fn in paths.items():
+            array = fn()
+            ms = time_ms(fn, runs)
+            expected = source if source is not None else reference
+            if array.shape[:2] != expected.shape[:2]:
+                exact = None        # reduced-scale decode, smaller by design
+            elif array.ndim == 2:
+                exact = np.array_equal(array, expected if expected.ndim == 2 else expected[..., 0])
+            else:
+                exact = np.array_equal(array, expected)
+            results[f"{name} / {path}"] = {
+                "median_ms": round(ms, 3),
+                "ms_per_megapixel": round(ms / megapixels, 3),
+                "shape": list(array.shape),
+                "dtype": str(array.dtype),
+                "exact": exact if exact is None else bool(exact),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="800x600,1280x960,3200x2400", help="Comma-separated WxH frame sizes")
+    parser.add_argument("--runs", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.lower().split("x"))
+        report[size] = run(width, height, args.runs)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'size':<12}{'input / path':<26}{'median':>10}{'ms/MP':>9}{'decoded':>18}{'exact':>7}")
+    for size, rows in report.items():
+        for name, r in rows.items():
+            shape = "x".join(str(v) for v in r["shape"]) + " " + r["dtype"]
+            print(f"{size:<12}{name:<26}{r['median_ms']:>8.2f}ms{r['ms_per_megapixel']:>9.2f}{shape:>18}{'-' if r['exact'] is None else 'yes' if r['exact'] else 'no':>7}")
+
+
+if __name__ == "__main__":
+    main()
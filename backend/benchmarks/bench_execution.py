@@ -0,0 +1,150 @@
+"""
+Model execution modes
+=====================
+
+Times FeatureClassifier.classify and FasterRCNNDetector.detect under each
+execution mode (app/services/inference/execution.py): memory format x
+no_grad / inference_mode, plus torch.compile with --compile. The mode is
+read from the environment at import, so every mode runs in its own
+subprocess. All modes load the same random (or real) weights; outputs are
+compared against the first mode.
+
+Usage (from backend/):
+    python -m benchmarks.bench_execution
+    python -m benchmarks.bench_execution --compile            # adds the compiled mode (slow start)
+    python -m benchmarks.bench_execution --skip-detector --json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "nchw+no_grad": {"MODEL_MEMORY_FORMAT": "contiguous", "MODEL_INFERENCE_MODE": "false"},
+    "nchw+inference_mode": {"MODEL_MEMORY_FORMAT": "contiguous", "MODEL_INFERENCE_MODE": "true"},
+    "channels_last+no_grad": {"MODEL_MEMORY_FORMAT": "channels_last", "MODEL_INFERENCE_MODE": "false"},
+    "channels_last+inference_mode": {"MODEL_MEMORY_FORMAT": "channels_last", "MODEL_INFERENCE_MODE": "true"},
+}
+COMPILED_MODE = {"channels_last+inference_mode+compile": {
+    "MODEL_MEMORY_FORMAT": "channels_last", "MODEL_INFERENCE_MODE": "true", "MODEL_COMPILE": "true",
+}}
+
+CLASSIFY_BATCH_SIZES = (1, 4)
+
+
+def worker(args):
+    """Runs inside the subprocess: one execution mode, results as JSON on stdout."""
+    import torch
+    from benchmarks.bench_micro import measure
+    from benchmarks.fixtures import synthetic_frame
+    from PIL import Image
+    import numpy as np
+
+    # FeatureClassifier leaves heads missing from the checkpoint at their
+    # random init - seed so every mode gets the same ones
+    torch.manual_seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app.services.inference.execution import describe
+        from app.services.inference.feature_classifier import FeatureClassifier
+        from app.services.preprocessing.fused_preprocessing import PreprocessWorkspace
+        classifier = FeatureClassifier()
+        detector = None
+        if not args.skip_detector:
+            from app.services.inference.roi_detector import FasterRCNNDetector
+            detector = FasterRCNNDetector()
+
+    width, height = 800, 600
+    frame = np.array(Image.open(io.BytesIO(synthetic_frame(width, height, seed=0))).convert("L"))
+    bbox = [width * 0.35, height * 0.3, width * 0.65, height * 0.6]
+    workspace = PreprocessWorkspace()
+
+    results = {"execution": describe(), "timings": {}, "outputs": {}}
+    slow = {"min_time": args.min_time, "min_runs": 3, "max_runs": 50, "warmup": 1}
+
+    for n in CLASSIFY_BATCH_SIZES:
+        batch = workspace.xception_batch(frame, [bbox] * n).clone()
+        name = f"FeatureClassifier.classify[batch={n}]"
+
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = classifier.classify(batch)
+        results["timings"][name] = {"first_call_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        results["timings"][name].update(measure(lambda: classifier.classify(batch), **slow))
+        if n == 1:
+            results["outputs"]["tirads_confidences"] = output["tirads_confidences"]
+
+    if detector is not None:
+        name = "FasterRCNNDetector.detect[800x600]"
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = detector.detect(frame)
+        results["timings"][name] = {"first_call_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        results["timings"][name].update(measure(lambda: detector.detect(frame), **slow))
+        results["outputs"]["roi_score"] = output["score"]
+
+    results["torch_threads"] = torch.get_num_threads()
+    print(json.dumps(results))
+
+
+def run_mode(name: str, overrides: dict, args) -> dict:
+    env = {**os.environ, **overrides}
+    cmd = [sys.executable, "-m", "benchmarks.bench_execution", "--worker", "--min-time", str(args.min_time)]
+    if args.skip_detector:
+        cmd.append("--skip-detector")
+    print(f"▶ {name}", file=sys.stderr)
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def max_output_diff(a: dict, b: dict) -> float:
+    diff = max(abs(a["tirads_confidences"][k] - b["tirads_confidences"][k]) for k in a["tirads_confidences"])
+    if "roi_score" in a and "roi_score" in b:
+        diff = max(diff, abs(a["roi_score"] - b["roi_score"]))
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--compile", action="store_true", help="Also run the torch.compile mode")
+    parser.add_argument("--skip-detector", action="store_true")
+    parser.add_argument("--min-time", type=float, default=3.0, help="Seconds per benchmark (at least)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    from benchmarks.fixtures import ensure_model_weights
+    with contextlib.redirect_stdout(io.StringIO()):
+        ensure_model_weights(tempfile.mkdtemp(prefix="thyrosight-bench-"))   # sets the *_MODEL_PATH env vars inherited by the workers
+
+    modes = {**MODES, **(COMPILED_MODE if args.compile else {})}
+    report = {name: run_mode(name, overrides, args) for name, overrides in modes.items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    reference_name = next(iter(report))
+    reference = report[reference_name]
+    print(f"\n{'mode':<40}{'benchmark':<40}{'first call':>12}{'median':>12}{'vs ' + reference_name:>22}")
+    for name, result in report.items():
+        for bench, timing in result["timings"].items():
+            base = reference["timings"][bench]["median_ms"]
+            speedup = base / timing["median_ms"]
+            print(f"{name:<40}{bench:<40}{timing['first_call_ms']:>10.0f}ms{timing['median_ms']:>10.1f}ms{speedup:>21.2f}x")
+        print(f"{'':<40}{'max |output diff| vs ' + reference_name:<40}{max_output_diff(result['outputs'], reference['outputs']):>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Live probe feed: latest-frame-wins + ROI reuse vs full pipeline per frame
+=========================================================================
+
+Feeds a simulated probe (synthetic frames drifting 2 px per frame, JPEG,
+at --fps) into the same LatestFrame mailbox /inference/live uses, for
+--seconds, and scores it with:
+
+- per-frame: detector + classifier on every frame taken (what running
+             the upload pipeline per frame would cost)
+- live:      LiveSession - ROI reused / tracked on every frame, detector
+             every LIVE_REDETECT_EVERY frames and the classifier on the
+             newest crop, both in the background
+- live+run:  live, while the same worker serves back-to-back
+             InferencePipeline.run calls (an /inference/run upload stream)
+
+Reports results per second, classifier passes per second, frames
+dropped, receive -> result latency, how many frames the TI-RADS result
+lags the box, detector passes, and the longest gap between two frames
+being received (how long the event loop was stalled).
+
+Usage (from backend/):
+    python -m benchmarks.bench_live
+    python -m benchmarks.bench_live --fps 15 --seconds 60 --json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+from starlette.concurrency import run_in_threadpool
+
+from benchmarks.fixtures import ensure_model_weights, synthetic_frame
+
+
+def probe_frames(width: int, height: int, count: int):
+    """JPEG frames of one synthetic scan, shifted sideways like a moving probe."""
+    import numpy as np
+    from PIL import Image
+
+    base = np.array(Image.open(io.BytesIO(synthetic_frame(width, height, seed=0))))
+    frames = []
+    for i in range(count):
+        buf = io.BytesIO()
+        Image.fromarray(np.roll(base, 2 * i, axis=1)).save(buf, format="JPEG", quality=90)
+        frames.append(buf.getvalue())
+    return frames
+
+
+async def feed(frames, mailbox, fps: float, seconds: float) -> float:
+    """Returns the longest gap between two frames being received (ms)."""
+    interval = 1.0 / fps
+    start = last = time.perf_counter()
+    max_gap = 0.0
+    i = 0
+    while time.perf_counter() - start < seconds:
+        now = time.perf_counter()
+        max_gap = max(max_gap, now - last)
+        last = now
+        mailbox.put(frames[i % len(frames)])
+        i += 1
+        await asyncio.sleep(max(0.0, start + i * interval - time.perf_counter()))
+    mailbox.close()
+    return max_gap * 1000
+
+
+async def uploads(pipeline, image: bytes, stop: asyncio.Event) -> int:
+    """Back-to-back pipeline runs on the event loop, as /inference/run does them."""
+    runs = 0
+    while not stop.is_set():
+        # Distinct bytes per upload: the stage cache never answers it
+        await pipeline.run(image + runs.to_bytes(4, "big"))
+        runs += 1
+    return runs
+
+
+async def run_mode(mode: str, frames, args) -> dict:
+    from app.services.inference.live import LatestFrame, LiveSession
+    from app.services.inference.inference_pipeline import InferencePipeline
+    from app.services.preprocessing.decoding import decode_image
+    from app.services.preprocessing.fused_preprocessing import fused_xception_batch
+
+    pipeline = InferencePipeline()
+    mailbox = LatestFrame()
+    session = LiveSession(pipeline.roi_detector, pipeline.feature_classifier)
+
+    def full_pipeline(data: bytes) -> dict:
+        frame = decode_image(data, pipeline.roi_detector.input_size).array
+        box = pipeline.roi_detector.detect(frame)["bounding_box"]
+        bbox = [box["xmin"], box["ymin"], box["xmax"], box["ymax"]]
+        pipeline.feature_classifier.classify(fused_xception_batch(frame, [bbox]))
+        return {"roi_source": "detected", "classified_seq": None}
+
+    latencies, lags, sources = [], [], Counter()
+    stop = asyncio.Event()
+    uploader = None
+    if mode == "live+run":
+        uploader = asyncio.create_task(uploads(pipeline, frames[1], stop))
+    producer = asyncio.create_task(feed(frames, mailbox, args.fps, args.seconds))
+    start = time.perf_counter()
+    while (item := await mailbox.get()) is not None:
+        seq, received_at, data = item
+        if mode.startswith("live"):
+            result = await session.process(data, seq)
+        else:
+            result = await run_in_threadpool(full_pipeline, data)
+        latencies.append((time.perf_counter() - received_at) * 1000)
+        lags.append(seq - result["classified_seq"] if result["classified_seq"] is not None else 0)
+        sources[result["roi_source"]] += 1
+    elapsed = time.perf_counter() - start
+    max_gap_ms = await producer
+    stop.set()
+    upload_runs = await uploader if uploader else 0
+    session.cancel()
+
+    latencies.sort()
+    classified = session.classifier_runs if mode.startswith("live") else len(latencies)
+    return {
+        "frames_sent": mailbox.received,
+        "frames_scored": len(latencies),
+        "frames_dropped": mailbox.dropped,
+        "scored_per_s": round(len(latencies) / elapsed, 2),
+        "classified_per_s": round(classified / elapsed, 2),
+        "classification_lag_p50_frames": statistics.median(lags),
+        "latency_p50_ms": round(statistics.median(latencies), 1),
+        "latency_p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 1),
+        "detector_runs": session.detector_runs if mode.startswith("live") else len(latencies),
+        "roi_sources": dict(sources),
+        "ingest_max_gap_ms": round(max_gap_ms, 1),
+        "upload_runs": upload_runs,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fps", type=float, default=10.0, help="Probe frame rate")
+    parser.add_argument("--seconds", type=float, default=30.0, help="Feed duration per mode")
+    parser.add_argument("--size", default="800x600", help="WxH probe frame size")
+    parser.add_argument("--modes", default="per-frame,live,live+run")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    with contextlib.redirect_stdout(io.StringIO()):
+        ensure_model_weights(tempfile.mkdtemp(prefix="thyrosight-bench-"))
+    frames = probe_frames(width, height, count=int(args.fps * 10))
+
+    report = {}
+    for mode in args.modes.split(","):
+        with contextlib.redirect_stdout(io.StringIO()):
+            report[mode] = asyncio.run(run_mode(mode, frames, args))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'mode':<12}{'sent':>7}{'scored':>8}{'dropped':>9}{'scored/s':>10}{'classif/s':>11}{'lag':>6}"
+          f"{'p50':>11}{'p95':>11}{'detector':>10}{'max gap':>11}{'uploads':>9}  roi sources")
+    for mode, r in report.items():
+        print(f"{mode:<12}{r['frames_sent']:>7}{r['frames_scored']:>8}{r['frames_dropped']:>9}{r['scored_per_s']:>10.2f}"
+              f"{r['classified_per_s']:>11.2f}{r['classification_lag_p50_frames']:>6.0f}"
+              f"{r['latency_p50_ms']:>9.0f}ms{r['latency_p95_ms']:>9.0f}ms{r['detector_runs']:>10}"
+              f"{r['ingest_max_gap_ms']:>9.0f}ms{r['upload_runs']:>9}  {r['roi_sources']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+System logs pagination benchmark
+================================
+
+Compares OFFSET paging (+ exact count) with keyset paging on
+(created_at, id) as the system_logs table grows. Uses the same indexes as
+app/db/migrations/001_system_logs_indexes.sql on an in-memory SQLite
+database, so it runs without a Postgres instance.
+
+Usage (from backend/):
+    python -m benchmarks.bench_logs_pagination --sizes 10000,100000,1000000
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta
+
+LEVELS = ["INFO"] * 8 + ["WARN", "ERROR"]
+ACTIONS = ["MODEL_INFERENCE", "UPLOAD_RAW_IMAGE", "EXPORT_PDF", "GENERATE_EXPLANATION", "SUBMIT_FEEDBACK"]
+PAGE_SIZE = 50
+
+
+def seed(conn: sqlite3.Connection, rows: int):
+    conn.execute("""
+        CREATE TABLE system_logs (
+            id TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            level TEXT NOT NULL,
+            action TEXT NOT NULL,
+            request_id TEXT,
+            metadata TEXT
+        )
+    """)
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(rows):
+        # Several rows share a timestamp so the id tiebreaker matters
+        ts = (start + timedelta(milliseconds=i * 250 // 3)).isoformat()
+        batch.append((str(uuid.UUID(int=rng.getrandbits(128))), ts, rng.choice(LEVELS),
+                      rng.choice(ACTIONS), str(uuid.uuid4()), '{"inference_time_ms": 400}'))
+        if len(batch) == 50_000:
+            conn.executemany("INSERT INTO system_logs VALUES (?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO system_logs VALUES (?, ?, ?, ?, ?, ?)", batch)
+
+    conn.execute("CREATE INDEX system_logs_created_at_id_idx ON system_logs (created_at DESC, id DESC)")
+    conn.execute("CREATE INDEX system_logs_level_created_at_idx ON system_logs (level, created_at DESC, id DESC)")
+    conn.execute("CREATE INDEX system_logs_action_created_at_idx ON system_logs (action, created_at DESC, id DESC)")
+    conn.execute("CREATE INDEX system_logs_request_id_idx ON system_logs (request_id)")
+    conn.execute("ANALYZE")
+
+
+def _time_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def bench_size(rows: int) -> dict:
+    conn = sqlite3.connect(":memory:")
+    seed(conn, rows)
+
+    depth = int(rows * 0.9)  # a page near the end of the table
+    cursor_row = conn.execute(
+        "SELECT created_at, id FROM system_logs ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET ?",
+        (depth,),
+    ).fetchone()
+
+    def offset_page():
+        conn.execute("SELECT COUNT(*) FROM system_logs").fetchone()
+        conn.execute(
+            "SELECT * FROM system_logs ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            (PAGE_SIZE, depth),
+        ).fetchall()
+
+    def keyset_page():
+        conn.execute(
+            "SELECT * FROM system_logs WHERE (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*cursor_row, PAGE_SIZE + 1),
+        ).fetchall()
+
+    def keyset_page_filtered():
+        conn.execute(
+            "SELECT * FROM system_logs WHERE level = 'ERROR' AND (created_at, id) < (?, ?) "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*cursor_row, PAGE_SIZE + 1),
+        ).fetchall()
+
+    result = {
+        "rows": rows,
+        "offset_plus_count_ms": _time_ms(offset_page),
+        "keyset_ms": _time_ms(keyset_page),
+        "keyset_level_filter_ms": _time_ms(keyset_page_filtered),
+    }
+    conn.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="system_logs pagination benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    results = [bench_size(int(s)) for s in args.sizes.split(",")]
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""
+Micro-benchmarks for the inference hot path
+===========================================
+
+Times the preprocessing functions, both models, the TI-RADS rule engine and
+PDF generation on synthetic inputs. Models use randomly initialised weights
+of the production architectures unless XCEPTION_MODEL_PATH /
+FASTER_RCNN_MODEL_PATH point at real checkpoints.
+
+Results are written as JSON and compared against a stored baseline:
+
+Usage (from backend/):
+    python -m benchmarks.bench_micro                         # run + compare to baseline
+    python -m benchmarks.bench_micro --only classify,tirads  # subset (substring match)
+    python -m benchmarks.bench_micro --save-baseline         # accept current numbers
+    python -m benchmarks.bench_micro --fail-on-regression    # exit 1 past --tolerance
+
+Baselines are machine specific - regenerate one per runner.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.fixtures import synthetic_frame, synthetic_rgb, ensure_model_weights
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baselines", "micro.json")
+DEFAULT_OUTPUT = os.path.join(HERE, "results", "micro.json")
+
+CLASSIFY_BATCH_SIZES = (1, 4, 8)
+
+
+def measure(fn: Callable[[], object], *, min_time: float, min_runs: int, max_runs: int, warmup: int) -> Dict:
+    """Repeat fn until min_time has passed (within [min_runs, max_runs])."""
+    with contextlib.redirect_stdout(io.StringIO()):  # the detector prints per call
+        for _ in range(warmup):
+            fn()
+
+        samples = []
+        start = time.perf_counter()
+        while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - start < min_time):
+            t0 = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - t0) * 1000)
+
+    return {
+        "runs": len(samples),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "min_ms": round(min(samples), 4),
+        "stdev_ms": round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+    }
+
+
+def sample_feature_results() -> Dict:
+    from app.models.xception_model import FEATURE_DEFINITIONS
+    picks = {"composition": 3, "echogenicity": 3, "shape": 0, "margin": 3, "echogenic_foci": 0}
+    return {
+        name: {
+            "index": idx,
+            "value": FEATURE_DEFINITIONS[name]["classes"][idx],
+            "confidence": 0.8,
+        }
+        for name, idx in picks.items()
+    }
+
+
+def build_cases(args) -> Dict[str, tuple]:
+    """
+    name -> (setup, timing overrides). setup() does the untimed work
+    (model loading, inputs) and returns the callable to time; it only runs
+    for selected benchmarks.
+    """
+    from app.services.preprocessing.bbox_preprocessing import detection_preprocess_from_array
+    from app.services.preprocessing.feature_preprocessing import xception_preprocess_from_array, crop_roi
+    from app.services.preprocessing.fused_preprocessing import PreprocessWorkspace
+    from app.services.rules.tirads import calculate_tirads
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    image = synthetic_rgb(width, height)
+    bbox = [width * 0.35, height * 0.3, width * 0.65, height * 0.6]
+    slow = {"min_runs": 3, "max_runs": 20, "warmup": 1}
+
+    def detector_case():
+        from app.services.inference.roi_detector import FasterRCNNDetector
+        detector = FasterRCNNDetector()
+        return lambda: detector.detect(image)
+
+    def classify_case(n: int):
+        def setup():
+            from app.services.inference.feature_classifier import FeatureClassifier
+            classifier = FeatureClassifier()
+            roi = xception_preprocess_from_array(image, bbox)
+            batch = roi.unsqueeze(0).repeat(n, 1, 1, 1) if n > 1 else roi
+            return lambda: classifier.classify(batch)
+        return setup
+
+    def pdf_case():
+        from app.services.reports.pdf_generator import PDFReportGenerator
+        from benchmarks.bench_pdf_report import sample_report_data
+        raw = synthetic_frame(width, height, seed=0)
+        data = sample_report_data(width, height)
+        return lambda: PDFReportGenerator.generate_pdf(data, raw)
+
+    def tirads_case():
+        features = sample_feature_results()
+        return lambda: calculate_tirads(features)
+
+    workspace = PreprocessWorkspace()
+
+    cases = {
+        f"detection_preprocess_from_array[{args.size}]": (lambda: lambda: detection_preprocess_from_array(image), {}),
+        f"xception_preprocess_from_array[{args.size}]": (lambda: lambda: xception_preprocess_from_array(image, bbox), {}),
+        f"fused_detection_input[{args.size}]": (lambda: lambda: workspace.detection_input(image), {}),
+        f"fused_xception_batch[{args.size}]": (lambda: lambda: workspace.xception_batch(image, [bbox]), {}),
+        f"crop_roi[{args.size}]": (lambda: lambda: crop_roi(image, bbox), {}),
+        f"FasterRCNNDetector.detect[{args.size}]": (detector_case, slow),
+    }
+    for n in CLASSIFY_BATCH_SIZES:
+        cases[f"FeatureClassifier.classify[batch={n}]"] = (classify_case(n), slow)
+    cases["calculate_tirads"] = (tirads_case, {})
+    cases[f"PDFReportGenerator.generate_pdf[{args.size}]"] = (pdf_case, {"warmup": 1})
+    return cases
+
+
+def environment() -> Dict:
+    import torch
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "processor": platform.processor() or platform.platform(),
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, partial: bool = False) -> list:
+    """Print a delta table; returns the names that regressed past tolerance."""
+    regressions = []
+    print(f"\n{'benchmark':<50}{'baseline':>12}{'current':>12}{'delta':>9}")
+    for name, current in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<50}{'-':>12}{current['median_ms']:>12.3f}{'new':>9}")
+            continue
+        delta = (current["median_ms"] - base["median_ms"]) / base["median_ms"] * 100
+        flag = ""
+        if delta > tolerance:
+            flag = "  << regression"
+            regressions.append(name)
+        elif delta < -tolerance:
+            flag = "  faster"
+        print(f"{name:<50}{base['median_ms']:>12.3f}{current['median_ms']:>12.3f}{delta:>+8.1f}%{flag}")
+    for name in baseline.get("results", {}):
+        if name not in results:
+            status = "skipped" if partial else "gone"
+            print(f"{name:<50}{baseline['results'][name]['median_ms']:>12.3f}{'-':>12}{status:>9}")
+    return regressions
+
+
+def write_json(path: str, payload: Dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="800x600", help="Synthetic frame size WxH")
+    parser.add_argument("--only", help="Comma-separated substrings of benchmark names")
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds per benchmark (at least)")
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT, help="Where to write this run's JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="Allowed median slowdown in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    cases = build_cases(args)
+    if args.only:
+        wanted = [w.strip().lower() for w in args.only.split(",")]
+        cases = {n: c for n, c in cases.items() if any(w in n.lower() for w in wanted)}
+
+    if any(n.startswith(("FasterRCNNDetector", "FeatureClassifier")) for n in cases):
+        with contextlib.redirect_stdout(io.StringIO()):
+            ensure_model_weights(tempfile.mkdtemp(prefix="thyrosight-bench-"))
+
+    torch.set_grad_enabled(False)
+    results = {}
+    for name, (setup, overrides) in cases.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn = setup()
+        timing = {"min_time": args.min_time, "min_runs": 10, "max_runs": 10_000, "warmup": 3, **overrides}
+        results[name] = measure(fn, **timing)
+        print(f"{name:<50}{results[name]['median_ms']:>12.3f} ms  ({results[name]['runs']} runs)")
+
+    payload = {"environment": environment(), "config": {"size": args.size}, "results": results}
+    write_json(args.out, payload)
+    print(f"\nWrote {args.out}")
+
+    if args.save_baseline:
+        if args.only and os.path.exists(args.baseline):
+            # Partial run: only replace the selected entries
+            with open(args.baseline) as f:
+                merged = json.load(f)
+            merged["results"].update(results)
+            merged["environment"] = payload["environment"]
+            payload = merged
+        write_json(args.baseline, payload)
+        print(f"Saved baseline {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline} (run with --save-baseline)")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != payload["config"]:
+        print(f"⚠️ Baseline config {baseline.get('config')} differs from this run {payload['config']}")
+
+    regressions = compare(results, baseline, args.tolerance, partial=bool(args.only))
+    if regressions and args.fail_on_regression:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+PDF report rendering benchmark
+==============================
+
+Measures reports/sec and PDF size for PDFReportGenerator on a synthetic
+ultrasound frame.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pdf_report --reports 30 --size 1280x960
+    python -m benchmarks.bench_pdf_report --workers 4   # also measure the process pool
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from app.services.reports.pdf_generator import PDFReportGenerator
+
+
+def synthetic_ultrasound(width: int, height: int, fmt: str = "JPEG") -> bytes:
+    """Speckle-like grayscale frame with a dark elliptical 'nodule'."""
+    rng = np.random.default_rng(0)
+    noise = rng.gamma(2.0, 40.0, size=(height, width)).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(noise, mode="L").filter(ImageFilter.GaussianBlur(1.5))
+
+    yy, xx = np.mgrid[0:height, 0:width]
+    cx, cy, rx, ry = width * 0.5, height * 0.45, width * 0.12, height * 0.1
+    mask = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1.0
+    arr = np.array(img)
+    arr[mask] = (arr[mask] * 0.35).astype(np.uint8)
+
+    buf = io.BytesIO()
+    Image.fromarray(arr, mode="L").save(buf, format=fmt, quality=92)
+    return buf.getvalue()
+
+
+def sample_report_data(width: int, height: int) -> dict:
+    return {
+        "patient": {"name": "Benchmark Patient", "age": "45", "gender": "Female", "date": "2024-01-01"},
+        "prediction": {
+            "id": "00000000-0000-0000-0000-000000000000",
+            "tirads": 4,
+            "confidence": 0.91,
+            "model_version": "production-pipeline-v1-xception",
+            "features": {
+                "composition": "solid",
+                "echogenicity": "hypoechoic",
+                "shape": "wider_than_tall",
+                "margin": "irregular",
+                "echogenic_foci": "none",
+            },
+            "ai_explanation": "The nodule is solid and hypoechoic with irregular margins. " * 4,
+            "bounding_box": {
+                "x": int(width * 0.38), "y": int(height * 0.35),
+                "width": int(width * 0.24), "height": int(height * 0.2),
+            },
+        },
+    }
+
+
+def bench_sequential(data: dict, raw: bytes, n: int) -> dict:
+    PDFReportGenerator.generate_pdf(data, raw)  # warm-up (fonts, styles)
+    start = time.perf_counter()
+    for _ in range(n):
+        pdf = PDFReportGenerator.generate_pdf(data, raw)
+    elapsed = time.perf_counter() - start
+    return {"reports_per_sec": round(n / elapsed, 2), "ms_per_report": round(elapsed / n * 1000, 1), "pdf_bytes": len(pdf)}
+
+
+async def _bench_pool(data: dict, raw: bytes, n: int) -> dict:
+    from app.services.reports.pdf_generator import render_pdf_async
+    await render_pdf_async(data, raw)  # spin up workers
+    start = time.perf_counter()
+    pdfs = await asyncio.gather(*(render_pdf_async(data, raw) for _ in range(n)))
+    elapsed = time.perf_counter() - start
+    return {"reports_per_sec": round(n / elapsed, 2), "pdf_bytes": len(pdfs[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF report rendering benchmark")
+    parser.add_argument("--reports", type=int, default=20)
+    parser.add_argument("--size", default="1280x960", help="Synthetic frame size WxH")
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "PNG"])
+    parser.add_argument("--workers", type=int, default=0, help="Also benchmark the render process pool")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    raw = synthetic_ultrasound(width, height, args.format)
+    data = sample_report_data(width, height)
+
+    results = {
+        "frame": {"size": args.size, "format": args.format, "bytes": len(raw)},
+        "sequential": bench_sequential(data, raw, args.reports),
+    }
+
+    if args.workers:
+        import os
+        os.environ["REPORT_RENDER_WORKERS"] = str(args.workers)
+        results["process_pool"] = asyncio.run(_bench_pool(data, raw, args.reports))
+        results["process_pool"]["workers"] = args.workers
+
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
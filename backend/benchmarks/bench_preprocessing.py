@@ -0,0 +1,174 @@
+"""
+Preprocessing allocations: legacy vs fused
+==========================================
+
+One request's preprocessing - detector input plus the Xception ROI tensor -
+done the old way (detection_preprocess_from_array +
+xception_preprocess_from_array on RGB) and through the fused workspace
+(fused_preprocessing.py) on RGB and on single-channel frames. The "+io"
+rows cover the whole request from JPEG bytes: decode, preprocessing and the
+processed grayscale JPEG (legacy decodes the upload a second time for it).
+Reports per request:
+
+- time (median)
+- numpy/OpenCV allocations: peak bytes via tracemalloc (numpy traces its
+  data buffers there)
+- torch allocations: count, bytes and peak via torch.profiler memory events
+- workspace buffer (re)allocations (fused only; 0 in steady state)
+
+Outputs are checked for bit-identical results first.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preprocessing
+    python -m benchmarks.bench_preprocessing --sizes 800x600,1280x960 --json
+"""
+
+import argparse
+import io
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.profiler import ProfilerActivity, profile
+
+from benchmarks.fixtures import synthetic_frame
+from app.services.preprocessing.bbox_preprocessing import detection_preprocess_from_array
+from app.services.preprocessing.feature_preprocessing import xception_preprocess_from_array
+from app.services.preprocessing.fused_preprocessing import PreprocessWorkspace
+
+
+def legacy_request(image, bbox):
+    return detection_preprocess_from_array(image), xception_preprocess_from_array(image, bbox)
+
+
+def fused_request(workspace: PreprocessWorkspace, image, bbox):
+    return workspace.detection_input(image), workspace.xception_batch(image, [bbox])
+
+
+def legacy_request_from_bytes(data: bytes, bbox):
+    image = np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+    tensors = legacy_request(image, bbox)
+    processed = io.BytesIO()
+    Image.open(io.BytesIO(data)).convert("L").save(processed, format="JPEG")
+    return tensors, processed.getvalue()
+
+
+def gray_request_from_bytes(workspace: PreprocessWorkspace, data: bytes, bbox):
+    img = Image.open(io.BytesIO(data)).convert("L")
+    tensors = fused_request(workspace, np.array(img), bbox)
+    processed = io.BytesIO()
+    img.save(processed, format="JPEG")
+    return tensors, processed.getvalue()
+
+
+def time_ms(fn: Callable[[], object], runs: int) -> float:
+    fn()
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def allocation_profile(fn: Callable[[], object]) -> Dict:
+    """Allocations made by one call of fn (after a warm-up call)."""
+    fn()
+
+    # Separate passes: the profiler's own start-up allocations would
+    # otherwise show up in tracemalloc
+    tracemalloc.start()
+    fn()
+    _, numpy_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+
+    count = total = live = peak = 0
+    for event in prof.events():
+        if event.name != "[memory]":
+            continue
+        delta = event.cpu_memory_usage
+        if delta > 0:
+            count += 1
+            total += delta
+        live += delta
+        peak = max(peak, live)
+
+    return {
+        "numpy_peak_bytes": numpy_peak,
+        "torch_allocations": count,
+        "torch_bytes": total,
+        "torch_peak_bytes": peak,
+        "peak_bytes": numpy_peak + peak,
+    }
+
+
+def run(width: int, height: int, runs: int) -> Dict:
+    data = synthetic_frame(width, height, seed=0)
+    rgb = np.array(Image.open(io.BytesIO(data)).convert("RGB"))
+    gray = np.array(Image.open(io.BytesIO(data)).convert("L"))
+    bbox = [width * 0.35, height * 0.3, width * 0.65, height * 0.6]
+    workspace = PreprocessWorkspace()
+
+    det_legacy, roi_legacy = legacy_request(rgb, bbox)
+    for frame in (rgb, gray):
+        det_fused, roi_fused = fused_request(workspace, frame, bbox)
+        if not (torch.equal(det_legacy, det_fused) and torch.equal(roi_legacy, roi_fused[0])):
+            raise AssertionError(f"Fused preprocessing differs from legacy at {width}x{height}")
+
+    paths = {
+        "legacy": lambda: legacy_request(rgb, bbox),
+        "fused": lambda: fused_request(workspace, rgb, bbox),
+        "gray": lambda: fused_request(workspace, gray, bbox),
+        "legacy+io": lambda: legacy_request_from_bytes(data, bbox),
+        "gray+io": lambda: gray_request_from_bytes(workspace, data, bbox),
+    }
+
+    results = {}
+    for name, fn in paths.items():
+        before = workspace.allocations
+        results[name] = {"median_ms": round(time_ms(fn, runs), 4), **allocation_profile(fn)}
+        if name != "legacy" and name != "legacy+io":
+            results[name]["workspace_allocations"] = workspace.allocations - before
+    return results
+
+
+def fmt_bytes(n: int) -> str:
+    return f"{n / 1e6:.2f} MB" if n >= 1e5 else f"{n} B"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="800x600,1280x960", help="Comma-separated WxH frame sizes")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    report = {}
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.lower().split("x"))
+        report[size] = run(width, height, args.runs)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'size':<12}{'path':<11}{'median':>10}{'numpy peak':>12}{'torch allocs':>14}{'torch bytes':>13}{'total peak':>12}")
+    for size, paths in report.items():
+        for name, r in paths.items():
+            print(
+                f"{size:<12}{name:<11}{r['median_ms']:>8.3f}ms{fmt_bytes(r['numpy_peak_bytes']):>12}"
+                f"{r['torch_allocations']:>14}{fmt_bytes(r['torch_bytes']):>13}{fmt_bytes(r['peak_bytes']):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,617 @@
+"""
+In-process stand-ins for Supabase and Gemini
+============================================
+
+Just enough of the supabase-py / google-genai client surface for the API to
+run end to end without the network, with configurable latency and error
+injection. Used by benchmarks.loadtest.
+
+    from benchmarks import fakes
+    fake_db = fakes.install(db=fakes.Latency(15), llm=fakes.Latency(900, error_rate=0.05))
+    from main import app   # import the app only AFTER install()
+
+Covered: table().select/insert/update/upsert/delete with eq/neq/gt/gte/lt/lte/
+in_/is_/or_ filters, order/limit/range/single/maybe_single, embedded selects
+(`*, raw_images!inner(*, patients(*))`) with filters on embedded columns,
+count=, rpc(), storage buckets and auth.get_user().
+"""
+
+import asyncio
+import copy
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+# ---------------------------
+# Latency / error injection
+# ---------------------------
+
+class InjectedError(Exception):
+    pass
+
+
+class Latency:
+    """
+    Log-normal latency around `ms` (sigma = `jitter`) plus a failure
+    probability. `error` is the exception message, e.g. "429 RESOURCE_EXHAUSTED".
+    """
+
+    def __init__(self, ms: float = 0.0, jitter: float = 0.3, error_rate: float = 0.0, error: str = "503 injected failure"):
+        self.ms = ms
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error = error
+
+    def sample(self) -> float:
+        if self.ms <= 0:
+            return 0.0
+        return self.ms * random.lognormvariate(0.0, self.jitter) / 1000.0
+
+    def maybe_fail(self, what: str):
+        if self.error_rate and random.random() < self.error_rate:
+            raise InjectedError(f"{self.error} ({what})")
+
+    def wait(self, what: str):
+        delay = self.sample()
+        if delay:
+            time.sleep(delay)
+        self.maybe_fail(what)
+
+    async def async_wait(self, what: str):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        self.maybe_fail(what)
+
+
+# ---------------------------
+# PostgREST
+# ---------------------------
+
+def _singular(name: str) -> str:
+    return name[:-1] if name.endswith("s") else name
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that are not inside parentheses or quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0 and not quoted:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def parse_select(columns: str) -> Dict[str, Any]:
+    """
+    "*, raw_images!inner(*, patients(*))" ->
+    {"columns": ["*"], "embeds": [{"name": "raw_images", "inner": True, "select": {...}}]}
+    """
+    spec = {"columns": [], "embeds": []}
+    for item in _split_top_level(columns or "*"):
+        match = re.fullmatch(r"(?:(\w+):)?(\w+)(?:!(\w+))?\((.*)\)", item, re.S)
+        if match:
+            alias, name, hint, inner = match.groups()
+            spec["embeds"].append({
+                "alias": alias or name,
+                "name": name,
+                "inner": hint == "inner",
+                "select": parse_select(inner),
+            })
+        else:
+            spec["columns"].append(item)
+    return spec
+
+
+def _comparable(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _compare(op: str, actual, expected) -> bool:
+    actual, expected = _comparable(actual), _comparable(expected)
+    if op == "is":
+        return actual is None if str(expected).lower() == "null" else actual == expected
+    if op == "in":
+        return str(actual) in {str(v) for v in expected}
+    if actual is None:
+        return op == "neq" and expected is not None
+    if isinstance(actual, (int, float)) and not isinstance(expected, (int, float)):
+        try:
+            expected = float(expected)
+        except (TypeError, ValueError):
+            actual = str(actual)
+    elif not isinstance(actual, (int, float)):
+        actual, expected = str(actual), str(expected)
+    if op == "eq":
+        return actual == expected
+    if op == "neq":
+        return actual != expected
+    if op == "gt":
+        return actual > expected
+    if op == "gte":
+        return actual >= expected
+    if op == "lt":
+        return actual < expected
+    if op == "lte":
+        return actual <= expected
+    raise NotImplementedError(f"Fake PostgREST: unsupported operator {op}")
+
+
+def _parse_or(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    """PostgREST or=(...) syntax: `a.lt."x",and(a.eq."x",id.lt."y")`."""
+    terms = []
+    for term in _split_top_level(expr):
+        group = re.fullmatch(r"(and|or)\((.*)\)", term, re.S)
+        if group:
+            kind, inner = group.groups()
+            children = [_parse_or(part) for part in _split_top_level(inner)]
+            if kind == "and":
+                terms.append(lambda row, c=children: all(f(row) for f in c))
+            else:
+                terms.append(lambda row, c=children: any(f(row) for f in c))
+            continue
+        column, op, value = term.split(".", 2)
+        value = value[1:-1] if value.startswith('"') and value.endswith('"') else value
+        terms.append(lambda row, c=column, o=op, v=value: _compare(o, row.get(c), v))
+    return lambda row: any(f(row) for f in terms)
+
+
+class FakeResponse:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeStore:
+    """Tables as lists of dicts, guarded by one lock."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.RLock()
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def seed(self, table: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self.lock:
+            inserted = [_with_defaults(r) for r in rows]
+            self.rows(table).extend(inserted)
+            return copy.deepcopy(inserted)
+
+
+def _with_defaults(row: Dict[str, Any]) -> Dict[str, Any]:
+    row = {k: _comparable(v) for k, v in row.items()}
+    row.setdefault("id", str(uuid.uuid4()))
+    row.setdefault("created_at", datetime.datetime.now(datetime.timezone.utc).isoformat())
+    return row
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeSupabase", table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._select = parse_select("*")
+        self._count = None
+        self._payload = None
+        self._on_conflict = "id"
+        self._filters: List[tuple] = []   # (column, predicate)
+        self._order: List[tuple] = []
+        self._offset = 0
+        self._limit = None
+        self._single = None               # "single" | "maybe"
+
+    # ---- operations ----
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        if self._op == "select":
+            self._select = parse_select(columns)
+        self._count = count
+        return self
+
+    def insert(self, payload):
+        self._op, self._payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "id", **_):
+        self._op, self._payload, self._on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload):
+        self._op, self._payload = "update", payload
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    # ---- filters ----
+    def _add(self, column: str, op: str, value):
+        self._filters.append((column, lambda row, c=column.split(".")[-1]: _compare(op, row.get(c), value)))
+        return self
+
+    def eq(self, column, value): return self._add(column, "eq", value)
+    def neq(self, column, value): return self._add(column, "neq", value)
+    def gt(self, column, value): return self._add(column, "gt", value)
+    def gte(self, column, value): return self._add(column, "gte", value)
+    def lt(self, column, value): return self._add(column, "lt", value)
+    def lte(self, column, value): return self._add(column, "lte", value)
+    def in_(self, column, values): return self._add(column, "in", list(values))
+    def is_(self, column, value): return self._add(column, "is", value)
+
+    def or_(self, expr: str, reference_table: Optional[str] = None):
+        column = f"{reference_table}.*" if reference_table else "*"
+        self._filters.append((column, _parse_or(expr)))
+        return self
+
+    # ---- modifiers ----
+    def order(self, column: str, desc: bool = False, **_):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, n: int, **_):
+        self._limit = n
+        return self
+
+    def range(self, start: int, end: int, **_):
+        self._offset, self._limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self._single = "single"
+        return self
+
+    def maybe_single(self):
+        self._single = "maybe"
+        return self
+
+    # ---- execution ----
+    def _filters_for(self, prefix: Optional[str]):
+        """Base-table filters (prefix None) or those on an embedded relation."""
+        out = []
+        for column, predicate in self._filters:
+            owner = column.rsplit(".", 1)[0] if "." in column else None
+            if owner == prefix:
+                out.append(predicate)
+        return out
+
+    def _embed(self, table: str, row: Dict[str, Any], spec: Dict[str, Any], path: str) -> Optional[Dict[str, Any]]:
+        """Returns the row with embeds attached, or None if an !inner embed is empty."""
+        store = self._client.store
+        out = dict(row)
+        for embed in spec["embeds"]:
+            child_path = f"{path}.{embed['alias']}" if path else embed["alias"]
+            predicates = self._filters_for(child_path)
+            fk = f"{_singular(embed['name'])}_id"
+
+            if fk in row:   # many-to-one
+                candidates = [c for c in store.rows(embed["name"]) if str(c.get("id")) == str(row.get(fk))]
+                to_one = True
+            else:           # one-to-many
+                back = f"{_singular(table)}_id"
+                candidates = [c for c in store.rows(embed["name"]) if str(c.get(back)) == str(row.get("id"))]
+                to_one = False
+
+            children = []
+            for child in candidates:
+                if not all(p(child) for p in predicates):
+                    continue
+                child = self._embed(embed["name"], child, embed["select"], child_path)
+                if child is not None:
+                    children.append(_project(child, embed["select"]))
+
+            if embed["inner"] and not children:
+                return None
+            out[embed["alias"]] = (children[0] if children else None) if to_one else children
+        return out
+
+    def _matching(self) -> List[Dict[str, Any]]:
+        predicates = self._filters_for(None)
+        return [r for r in self._client.store.rows(self._table) if all(p(r) for p in predicates)]
+
+    def execute(self) -> FakeResponse:
+        self._client.db_latency.wait(f"{self._op} {self._table}")
+        store = self._client.store
+
+        with store.lock:
+            if self._op == "insert":
+                payload = self._payload if isinstance(self._payload, list) else [self._payload]
+                inserted = [_with_defaults(r) for r in payload]
+                store.rows(self._table).extend(inserted)
+                return FakeResponse(copy.deepcopy(inserted))
+
+            if self._op == "upsert":
+                payload = self._payload if isinstance(self._payload, list) else [self._payload]
+                keys = self._on_conflict.split(",")
+                result = []
+                for incoming in payload:
+                    existing = next(
+                        (r for r in store.rows(self._table)
+                         if all(str(r.get(k)) == str(incoming.get(k)) for k in keys)),
+                        None
+                    )
+                    if existing is not None:
+                        existing.update({k: _comparable(v) for k, v in incoming.items()})
+                        result.append(existing)
+                    else:
+                        row = _with_defaults(incoming)
+                        store.rows(self._table).append(row)
+                        result.append(row)
+                return FakeResponse(copy.deepcopy(result))
+
+            if self._op == "update":
+                rows = self._matching()
+                for row in rows:
+                    row.update({k: _comparable(v) for k, v in self._payload.items()})
+                return FakeResponse(copy.deepcopy(rows))
+
+            if self._op == "delete":
+                rows = self._matching()
+                store.tables[self._table] = [r for r in store.rows(self._table) if r not in rows]
+                return FakeResponse(copy.deepcopy(rows))
+
+            # select
+            rows = []
+            for row in self._matching():
+                row = self._embed(self._table, row, self._select, "")
+                if row is not None:
+                    rows.append(row)
+
+            for column, desc in reversed(self._order):
+                rows.sort(key=lambda r: (r.get(column) is None, "" if r.get(column) is None else _comparable(r.get(column))), reverse=desc)
+
+            count = len(rows) if self._count else None
+            end = None if self._limit is None else self._offset + self._limit
+            rows = [_project(r, self._select) for r in rows[self._offset:end]]
+            rows = copy.deepcopy(rows)
+
+        if self._single:
+            if len(rows) == 1:
+                return FakeResponse(rows[0], count)
+            if self._single == "maybe" and not rows:
+                return None
+            raise InjectedError(
+                json.dumps({"code": "PGRST116", "message": "JSON object requested, multiple (or no) rows returned"})
+            )
+        return FakeResponse(rows, count)
+
+
+def _project(row: Dict[str, Any], spec: Dict[str, Any]) -> Dict[str, Any]:
+    embeds = {e["alias"] for e in spec["embeds"]}
+    if "*" in spec["columns"]:
+        return row
+    return {k: v for k, v in row.items() if k in spec["columns"] or k in embeds}
+
+
+class FakeRpc:
+    def __init__(self, client: "FakeSupabase", name: str, params: Dict[str, Any]):
+        self._client, self._name, self._params = client, name, params
+
+    def execute(self) -> FakeResponse:
+        self._client.db_latency.wait(f"rpc {self._name}")
+        handler = self._client.rpc_handlers.get(self._name)
+        if handler is None:
+            raise InjectedError(f"Fake PostgREST: no handler for rpc {self._name}")
+        with self._client.store.lock:
+            return FakeResponse(handler(self._client.store, **self._params))
+
+
+def _apply_prediction_explanations(store: FakeStore, items: List[Dict[str, Any]]) -> int:
+    """Mirror of apply_prediction_explanations() in migration 004."""
+    by_id = {str(i["id"]): i for i in items}
+    written = 0
+    for row in store.rows("predictions"):
+        item = by_id.get(str(row["id"]))
+        if item and row.get("ai_explanation") is None:
+            row["ai_explanation"] = item["ai_explanation"]
+            row["explanation_metadata"] = {**(row.get("explanation_metadata") or {}), **(item.get("explanation_metadata") or {})}
+            written += 1
+    return written
+
+
+# ---------------------------
+# Storage
+# ---------------------------
+
+class FakeBucket:
+    def __init__(self, client: "FakeSupabase", bucket: str):
+        self._client, self._bucket = client, bucket
+
+    def _objects(self) -> Dict[str, bytes]:
+        return self._client.objects.setdefault(self._bucket, {})
+
+    def upload(self, path: str, file: bytes, file_options: Optional[Dict[str, Any]] = None):
+        self._client.storage_latency.wait(f"upload {path}")
+        with self._client.store.lock:
+            if path in self._objects():
+                raise InjectedError('{"statusCode": 409, "error": "Duplicate", "message": "The resource already exists"}')
+            self._objects()[path] = bytes(file)
+        return SimpleNamespace(path=path, full_path=f"{self._bucket}/{path}")
+
+    def download(self, path: str) -> bytes:
+        self._client.storage_latency.wait(f"download {path}")
+        data = self._objects().get(path)
+        if data is None:
+            raise InjectedError('{"statusCode": 404, "error": "not_found", "message": "Object not found"}')
+        return data
+
+    def create_signed_url(self, path: str, expires_in: int, options: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+        self._client.storage_latency.wait(f"sign {path}")
+        url = f"http://fake-storage.local/{self._bucket}/{path}?token={uuid.uuid4().hex}&expires_in={expires_in}"
+        return {"signedURL": url, "signedUrl": url}
+
+    def remove(self, paths: List[str]):
+        self._client.storage_latency.wait("remove")
+        with self._client.store.lock:
+            return [{"name": p} for p in paths if self._objects().pop(p, None) is not None]
+
+
+class FakeStorage:
+    def __init__(self, client: "FakeSupabase"):
+        self._client = client
+
+    def from_(self, bucket: str) -> FakeBucket:
+        return FakeBucket(self._client, bucket)
+
+
+# ---------------------------
+# Auth
+# ---------------------------
+
+class FakeAuth:
+    """auth.get_user(token) for tokens registered via add_user()."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.users: Dict[str, SimpleNamespace] = {}
+
+    def add_user(self, token: str, user_id: str, email: str = "doctor@bench.local"):
+        self.users[token] = SimpleNamespace(id=user_id, email=email, role="authenticated", app_metadata={}, user_metadata={})
+
+    def get_user(self, token: str):
+        self.latency.wait("auth.get_user")
+        user = self.users.get(token)
+        if user is None:
+            raise InjectedError("401 invalid JWT")
+        return SimpleNamespace(user=user)
+
+
+class FakeSupabase:
+    def __init__(self, store: Optional[FakeStore] = None, db: Latency = None, storage: Latency = None, auth: Latency = None):
+        self.store = store or FakeStore()
+        self.db_latency = db or Latency()
+        self.storage_latency = storage or Latency()
+        self.objects: Dict[str, Dict[str, bytes]] = {}
+        self.storage = FakeStorage(self)
+        self.auth = FakeAuth(auth or Latency())
+        self.rpc_handlers: Dict[str, Callable] = {
+            "apply_prediction_explanations": _apply_prediction_explanations,
+        }
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def from_(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> FakeRpc:
+        return FakeRpc(self, name, params or {})
+
+
+# ---------------------------
+# Gemini
+# ---------------------------
+
+FAKE_EXPLANATION = (
+    "The nodule was assigned TI-RADS {tirads} based on the listed features. "
+    "Composition and echogenicity were identified with {confidence} confidence, "
+    "and the margin and echogenic foci findings contribute the remaining points."
+)
+
+
+def _fake_text(prompt: str) -> str:
+    tirads = re.search(r"TI-RADS score of (\d)", prompt)
+    return FAKE_EXPLANATION.format(tirads=tirads.group(1) if tirads else "3", confidence="moderate")
+
+
+class FakeGeminiModels:
+    def __init__(self, latency: Latency, chunk_ms: float = 40.0, chunks: int = 8):
+        self.latency = latency
+        self.chunk_ms = chunk_ms
+        self.chunks = chunks
+        self.calls = 0
+
+    async def generate_content(self, *, model: str, contents, config=None):
+        self.calls += 1
+        await self.latency.async_wait(f"generate_content {model}")
+        prompt = contents[-1] if isinstance(contents, list) else str(contents)
+
+        if config is not None and getattr(config, "response_mime_type", None) == "application/json":
+            labels = sorted(set(re.findall(r'"(P\d+)"\s*:', prompt)), key=lambda l: int(l[1:]))
+            return SimpleNamespace(text=json.dumps({label: _fake_text("") for label in labels}))
+        return SimpleNamespace(text=_fake_text(prompt))
+
+    async def generate_content_stream(self, *, model: str, contents, config=None):
+        self.calls += 1
+        # Time to first token
+        await self.latency.async_wait(f"generate_content_stream {model}")
+        words = _fake_text(contents[-1] if isinstance(contents, list) else str(contents)).split(" ")
+        step = max(1, len(words) // self.chunks)
+
+        async def stream():
+            for i in range(0, len(words), step):
+                if i:
+                    await asyncio.sleep(self.chunk_ms / 1000.0)
+                yield SimpleNamespace(text=" ".join(words[i:i + step]) + " ")
+
+        return stream()
+
+
+class FakeGeminiClient:
+    def __init__(self, latency: Latency, **kwargs):
+        self.aio = SimpleNamespace(models=FakeGeminiModels(latency, **kwargs))
+
+
+# ---------------------------
+# Wiring
+# ---------------------------
+
+BENCH_JWT_SECRET = "benchmark-jwt-secret-not-for-production-use"
+
+
+def install(
+    *,
+    db: Latency = None,
+    storage: Latency = None,
+    auth: Latency = None,
+    llm: Latency = None,
+    jwt_secret: str = BENCH_JWT_SECRET,
+) -> FakeSupabase:
+    """
+    Replaces the Supabase clients and the Gemini client with fakes.
+    Must run before `main` / `app.api.*` are imported (they bind the
+    clients at import time).
+    """
+    for key, value in {
+        "SUPABASE_URL": "http://fake-supabase.local",
+        # JWT-shaped so create_client() accepts them
+        "SUPABASE_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.fake",
+        "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.fake",
+    }.items():
+        os.environ.setdefault(key, value)
+    os.environ["SUPABASE_JWT_SECRET"] = jwt_secret
+
+    import app.db.supabase as supabase_module
+    fake = FakeSupabase(db=db, storage=storage, auth=auth)
+    supabase_module.supabase_admin = fake
+    supabase_module.supabase_auth = fake
+
+    import app.db.auth as auth_module
+    auth_module.JWT_SECRET = jwt_secret
+    auth_module.supabase_auth = fake
+
+    import app.services.explainability.llm_client as llm_module
+    llm_module.client = FakeGeminiClient(llm or Latency())
+
+    return fake
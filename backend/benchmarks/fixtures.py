@@ -0,0 +1,118 @@
+"""
+Shared benchmark inputs: synthetic ultrasound frames and randomly
+initialised model checkpoints (same architectures as production, so the
+compute matches even without the real weight files).
+"""
+
+import io
+import os
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+
+def synthetic_frame(width: int, height: int, seed: int) -> bytes:
+    """
+    B-mode-like JPEG: Rayleigh speckle inside a fan-shaped sector, darker
+    with depth, with one hypoechoic nodule (bright rim) at a random spot.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+
+    speckle = rng.rayleigh(45.0, size=(height, width)).astype(np.float32)
+    speckle *= 1.0 - 0.5 * (yy / height)                       # depth attenuation
+
+    # Sector: apex above the top edge, +-35 degrees
+    apex_x, apex_y = width / 2, -height * 0.15
+    angle = np.degrees(np.arctan2(xx - apex_x, yy - apex_y))
+    radius = np.hypot(xx - apex_x, yy - apex_y)
+    sector = (np.abs(angle) < 35) & (radius < height * 1.1)
+
+    # Nodule
+    cx = rng.uniform(0.35, 0.65) * width
+    cy = rng.uniform(0.35, 0.65) * height
+    rx = rng.uniform(0.07, 0.14) * width
+    ry = rng.uniform(0.06, 0.12) * height
+    dist = ((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2
+    speckle[dist <= 1.0] *= rng.uniform(0.25, 0.5)
+    speckle[(dist > 1.0) & (dist <= 1.25)] *= 1.6
+
+    frame = np.where(sector, speckle, 0).clip(0, 255).astype(np.uint8)
+    img = Image.fromarray(frame, mode="L").filter(ImageFilter.GaussianBlur(1.2))
+
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def synthetic_rgb(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """H×W×3 uint8 RGB array, as the pipeline sees a decoded upload."""
+    frame = Image.open(io.BytesIO(synthetic_frame(width, height, seed))).convert("RGB")
+    return np.array(frame)
+
+
+def ensure_model_weights(workdir: str, seed: int = 0):
+    """Point the model env vars at random checkpoints if real ones are absent."""
+    import torch
+
+    torch.manual_seed(seed)
+
+    if not os.path.exists(os.getenv("XCEPTION_MODEL_PATH") or ""):
+        from app.models.xception_model import XceptionMultiOutput
+        path = os.path.join(workdir, "xception_random.pth")
+        torch.save(XceptionMultiOutput(pretrained=False).state_dict(), path)
+        os.environ["XCEPTION_MODEL_PATH"] = path
+        print(f"Using random Xception weights ({path})")
+
+    if not os.path.exists(os.getenv("FASTER_RCNN_MODEL_PATH") or ""):
+        from torchvision.models.detection import FasterRCNN
+        from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
+        path = os.path.join(workdir, "faster_rcnn_random.pth")
+        model = FasterRCNN(resnet_fpn_backbone(backbone_name="resnet101", weights=None), num_classes=2)
+        torch.save(model.state_dict(), path)
+        os.environ["FASTER_RCNN_MODEL_PATH"] = path
+        print(f"Using random Faster R-CNN weights ({path})")
+
+
+def synthetic_dicom(frames: int, width: int, height: int, seed: int = 0, rgb: bool = False, compress: bool = False) -> bytes:
+    """
+    Multi-frame ultrasound DICOM: the synthetic frame drifting sideways by
+    2 px per frame (probe motion). rgb=True stores the grayscale content as
+    RGB, as many scanners do; compress=True uses RLE Lossless.
+    """
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, RLELossless, UltrasoundMultiFrameImageStorage, generate_uid
+
+    base = np.array(Image.open(io.BytesIO(synthetic_frame(width, height, seed))))
+    clip = np.stack([np.roll(base, 2 * i, axis=1) for i in range(frames)])
+    if rgb:
+        clip = np.repeat(clip[..., None], 3, axis=-1)
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = UltrasoundMultiFrameImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "US"
+    ds.Rows, ds.Columns = height, width
+    ds.NumberOfFrames = frames
+    ds.FrameTime = 33.3
+    ds.SamplesPerPixel = 3 if rgb else 1
+    ds.PhotometricInterpretation = "RGB" if rgb else "MONOCHROME2"
+    if rgb:
+        ds.PlanarConfiguration = 0
+    ds.BitsAllocated = ds.BitsStored = 8
+    ds.HighBit = 7
+    ds.PixelRepresentation = 0
+    ds.PixelData = clip.tobytes()
+
+    if compress:
+        ds.compress(RLELossless)
+
+    buf = io.BytesIO()
+    ds.save_as(buf, enforce_file_format=True)
+    return buf.getvalue()
@@ -0,0 +1,338 @@
+"""
+End-to-end API load test
+========================
+
+Runs the real FastAPI app (real inference pipeline, PDF rendering, caches,
+auth) against in-process Supabase and Gemini fakes (benchmarks.fakes), and
+drives it over HTTP with an open-loop arrival rate:
+
+    POST /images/upload-raw
+    POST /inference/run
+    POST /inference/{id}/explain
+    GET  /export/pdf/{id}
+
+Latency is measured from each request's *scheduled* start, so a saturated
+server shows up as queueing delay instead of a quietly lower request rate.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest --rate 4 --duration 60
+    python -m benchmarks.loadtest --rate 2 --mix upload=1,run=1,explain=2,pdf=4 \\
+        --db-ms 15 --storage-ms 60 --llm-ms 1200 --llm-error-rate 0.05
+    python -m benchmarks.loadtest --json results.json
+
+Without XCEPTION_MODEL_PATH / FASTER_RCNN_MODEL_PATH the models run with
+randomly initialised weights: same compute, meaningless predictions.
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+from benchmarks import fakes
+from benchmarks.fixtures import synthetic_frame, ensure_model_weights
+
+ENDPOINTS = ("upload", "run", "explain", "pdf")
+
+
+# ---------------------------
+# Environment
+# ---------------------------
+
+def mint_token(user_id: str, secret: str) -> str:
+    import jwt
+    now = int(time.time())
+    return jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "role": "authenticated",
+         "email": "loadtest@bench.local", "iat": now, "exp": now + 24 * 3600},
+        secret,
+        algorithm="HS256",
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app, port: int):
+    """uvicorn in a background thread: keeps the server's event loop
+    (and any blocking work on it) separate from the load generator."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+# ---------------------------
+# Workload
+# ---------------------------
+
+class Workload:
+    """Request builders plus the pools that chain them (upload -> run -> explain / pdf)."""
+
+    def __init__(self, client, token: str, patient_ids, frames):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.patient_ids = patient_ids
+        self.frames = frames
+        self.unrun_images = collections.deque()
+        self.images = []
+        self.unexplained = collections.deque()
+        self.predictions = []
+
+    async def upload(self):
+        frame = random.choice(self.frames)
+        res = await self.client.post(
+            "/images/upload-raw",
+            headers=self.headers,
+            data={"patient_id": random.choice(self.patient_ids)},
+            files={"file": (f"scan_{uuid.uuid4().hex[:8]}.jpg", frame, "image/jpeg")},
+        )
+        if res.status_code == 200:
+            image_id = res.json()["image_id"]
+            self.unrun_images.append(image_id)
+            self.images.append(image_id)
+        return res
+
+    async def run(self):
+        if self.unrun_images:
+            image_id = self.unrun_images.popleft()
+        elif self.images:
+            image_id = random.choice(self.images)
+        else:
+            return await self.upload()
+        res = await self.client.post("/inference/run", headers=self.headers, json={"image_id": image_id})
+        if res.status_code == 200:
+            prediction_id = res.json()["prediction"]["id"]
+            self.unexplained.append(prediction_id)
+            self.predictions.append(prediction_id)
+        return res
+
+    async def explain(self):
+        if self.unexplained:
+            prediction_id = self.unexplained.popleft()
+        elif self.predictions:
+            prediction_id = random.choice(self.predictions)
+        else:
+            return None
+        return await self.client.post(
+            f"/inference/{prediction_id}/explain", headers=self.headers, json={"use_llm": True}
+        )
+
+    async def pdf(self):
+        if not self.predictions:
+            return None
+        return await self.client.get(f"/export/pdf/{random.choice(self.predictions)}", headers=self.headers)
+
+
+def parse_mix(text: str) -> dict:
+    mix = {name: 0.0 for name in ENDPOINTS}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        if name not in mix:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (expected {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+async def drive(workload: Workload, rate: float, duration: float, mix: dict, poisson: bool, seed: int = 0):
+    """Open loop: arrivals follow the schedule no matter how slow responses are."""
+    # Own generator: the schedule stays reproducible whatever the fakes draw
+    rng = random.Random(seed)
+    names = [n for n in ENDPOINTS if mix[n] > 0]
+    weights = [mix[n] for n in names]
+    samples = []   # (endpoint, status, latency_s)
+    tasks = []
+
+    async def one(name: str, scheduled: float):
+        try:
+            res = await getattr(workload, name)()
+            if res is None:
+                return  # nothing to act on yet (empty pool)
+            status = res.status_code
+        except Exception as e:
+            status = type(e).__name__
+        samples.append((name, status, time.perf_counter() - scheduled))
+
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < duration:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        name = rng.choices(names, weights)[0]
+        tasks.append(asyncio.create_task(one(name, next_at)))
+        next_at += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - start
+
+
+def percentile(values, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(samples, elapsed: float, offered_rate: float) -> dict:
+    by_endpoint = collections.defaultdict(list)
+    for name, status, latency in samples:
+        by_endpoint[name].append((status, latency))
+
+    report = {"elapsed_s": round(elapsed, 2), "offered_rps": offered_rate, "endpoints": {}}
+    for name in ENDPOINTS:
+        rows = by_endpoint.get(name)
+        if not rows:
+            continue
+        ok = [lat * 1000 for status, lat in rows if isinstance(status, int) and 200 <= status < 400]
+        errors = collections.Counter(str(status) for status, _ in rows if not (isinstance(status, int) and 200 <= status < 400))
+        report["endpoints"][name] = {
+            "requests": len(rows),
+            "ok": len(ok),
+            "errors": dict(errors),
+            "throughput_rps": round(len(ok) / elapsed, 3),
+            "p50_ms": _round(percentile(ok, 0.50)),
+            "p95_ms": _round(percentile(ok, 0.95)),
+            "p99_ms": _round(percentile(ok, 0.99)),
+            "max_ms": _round(max(ok) if ok else None),
+        }
+    return report
+
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+
+def print_report(report: dict):
+    print(f"\n{report['elapsed_s']} s at {report['offered_rps']} req/s offered")
+    print(f"{'endpoint':<10}{'reqs':>6}{'ok':>6}{'err':>6}{'ok/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in report["endpoints"].items():
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        print(
+            f"{name:<10}{row['requests']:>6}{row['ok']:>6}{sum(row['errors'].values()):>6}"
+            f"{row['throughput_rps']:>8.2f}{fmt(row['p50_ms']):>10}{fmt(row['p95_ms']):>10}"
+            f"{fmt(row['p99_ms']):>10}{fmt(row['max_ms']):>10}"
+        )
+        if row["errors"]:
+            print(f"{'':<10}errors: {row['errors']}")
+
+
+# ---------------------------
+# Entry point
+# ---------------------------
+
+async def main_async(args, app, fake):
+    import httpx
+
+    doctor_id = str(uuid.uuid4())
+    token = mint_token(doctor_id, fakes.BENCH_JWT_SECRET)
+    fake.auth.add_user(token, doctor_id)
+
+    fake.store.seed("doctors", [{"id": doctor_id, "email": "loadtest@bench.local"}])
+    patients = fake.store.seed("patients", [
+        {"doctor_id": doctor_id, "first_name": f"Bench{i}", "last_name": "Patient",
+         "age": 30 + i % 40, "gender": "Female" if i % 2 else "Male"}
+        for i in range(args.patients)
+    ])
+
+    width, height = (int(v) for v in args.size.lower().split("x"))
+    frames = [synthetic_frame(width, height, seed) for seed in range(args.frames)]
+
+    port = free_port()
+    server, thread = start_server(app, port)
+
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout, limits=limits) as client:
+        workload = Workload(client, token, [p["id"] for p in patients], frames)
+
+        # Warm-up: fill the pools and load the models (not measured)
+        for _ in range(args.warmup):
+            await workload.upload()
+            await workload.run()
+
+        samples, elapsed = await drive(workload, args.rate, args.duration, parse_mix(args.mix), args.poisson, args.seed)
+
+    server.should_exit = True
+    thread.join(timeout=10)
+
+    report = summarize(samples, elapsed, args.rate)
+    report["config"] = {k: v for k, v in vars(args).items() if k != "json"}
+    report["llm_calls"] = fake_llm_calls()
+    return report
+
+
+def fake_llm_calls() -> int:
+    import app.services.explainability.llm_client as llm_module
+    return llm_module.client.aio.models.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=2.0, help="Offered requests/sec (all endpoints)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Measured seconds")
+    parser.add_argument("--mix", default="upload=1,run=1,explain=1,pdf=1", help="Endpoint weights")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times")
+    parser.add_argument("--warmup", type=int, default=3, help="Upload+run pairs before measuring")
+    parser.add_argument("--size", default="800x600", help="Synthetic frame size WxH")
+    parser.add_argument("--frames", type=int, default=16, help="Distinct synthetic frames")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    # Fakes
+    parser.add_argument("--db-ms", type=float, default=10.0, help="PostgREST latency per request")
+    parser.add_argument("--storage-ms", type=float, default=40.0, help="Storage latency per operation")
+    parser.add_argument("--auth-ms", type=float, default=80.0, help="auth.get_user latency (fallback path only)")
+    parser.add_argument("--llm-ms", type=float, default=1200.0, help="Gemini latency (time to first token when streaming)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Log-normal sigma for all latencies")
+    parser.add_argument("--db-error-rate", type=float, default=0.0)
+    parser.add_argument("--storage-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of Gemini calls failing with 429")
+    parser.add_argument("--llm-rpm", type=float, default=6000.0, help="LLM_RATE_LIMIT_RPM for the run")
+    parser.add_argument("--no-logging", action="store_true", help="Disable system_logs writes")
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="thyrosight-loadtest-")
+
+    # Read at import time by the app modules
+    os.environ["LLM_RATE_LIMIT_RPM"] = str(args.llm_rpm)
+    os.environ["SYSTEM_LOGGING_ENABLED"] = "false" if args.no_logging else "true"
+    os.environ["REPORT_CACHE_DIR"] = os.path.join(workdir, "reports")
+    os.environ["EXPLANATION_BACKFILL_ENABLED"] = "false"
+
+    fake = fakes.install(
+        db=fakes.Latency(args.db_ms, args.jitter, args.db_error_rate),
+        storage=fakes.Latency(args.storage_ms, args.jitter, args.storage_error_rate),
+        auth=fakes.Latency(args.auth_ms, args.jitter),
+        llm=fakes.Latency(args.llm_ms, args.jitter, args.llm_error_rate, error="429 RESOURCE_EXHAUSTED"),
+    )
+    ensure_model_weights(workdir)
+
+    from main import app
+
+    report = asyncio.run(main_async(args, app, fake))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
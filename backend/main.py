@@ -1,4 +1,5 @@
 import os
+import asyncio
 import logging
 from dotenv import load_dotenv
 from fastapi import FastAPI, Request
@@ -12,8 +13,16 @@ from app.api.patients import router as patients_router
 from app.api.inference import router as inference_router
 from app.api.feedback import router as feedback_router
 from app.api.logs import router as logs_router
+from app.api.metrics import router as metrics_router
+from app.api.models import router as models_router
 from app.middleware.request_id import request_id_middleware
 from app.api import reports
+from app.services.explainability.backfill import BACKFILL_ENABLED, BACKFILL_WINDOW, backfill_worker
+from app.services.inference.rescoring import RESCORE_ENABLED, RESCORE_MAX_IN_FLIGHT, RESCORE_MAX_P99_MS, rescoring_worker
+from app.services.inference.execution import MODEL_WARMUP, describe as describe_execution
+from app.services.inference.model_registry import model_registry
+from app.utils.log_stream import LOG_STREAM_DATABASE_URL, listen_for_logs
+from starlette.concurrency import run_in_threadpool
 
 
 # ---------------------------
@@ -64,6 +73,8 @@ app.include_router(inference_router)
 app.include_router(feedback_router)
 app.include_router(logs_router)
 app.include_router(reports.router)
+app.include_router(metrics_router)
+app.include_router(models_router)
 
 # ---------------------------
 # Error Handlers
@@ -152,3 +163,45 @@ async def startup_validation():
         logger.error("❌ ThyroSight Backend failed to start")
         logger.error(str(e))
         raise  # re-raise so Render fails deployment
+
+
+# ---------------------------
+# Model warm-up
+# ---------------------------
+@app.on_event("startup")
+async def warmup_models():
+    logger.info(f"Model execution: {describe_execution()}")
+    if MODEL_WARMUP:
+        # Blocks startup until compiled, so the instance only reports ready
+        # once the first request will be fast
+        seconds = await run_in_threadpool(model_registry.active.pipeline.warmup)
+        logger.info(f"Models warmed up in {seconds:.1f}s")
+
+
+# ---------------------------
+# Background workers
+# ---------------------------
+@app.on_event("startup")
+async def start_background_workers():
+    # Enable on ONE instance only - each worker process would run its own loop
+    if BACKFILL_ENABLED:
+        app.state.backfill_task = asyncio.create_task(backfill_worker())
+        logger.info(f"Explanation backfill enabled (window {BACKFILL_WINDOW} UTC)")
+    if RESCORE_ENABLED:
+        # Throttled on this process's requests (in flight and p99)
+        app.state.rescoring_task = asyncio.create_task(rescoring_worker())
+        logger.info(f"Re-scoring to {model_registry.active.pipeline.PIPELINE_VERSION} enabled (p99 budget {RESCORE_MAX_P99_MS:.0f}ms, max {RESCORE_MAX_IN_FLIGHT} requests in flight)")
+
+
+    # Every worker: its live-tail viewers get the rows of all workers
+    if LOG_STREAM_DATABASE_URL:
+        app.state.log_stream_task = asyncio.create_task(listen_for_logs())
+        logger.info("Log stream fan-out via LISTEN/NOTIFY enabled")
+
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    for name in ("backfill_task", "rescoring_task", "log_stream_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
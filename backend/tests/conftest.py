@@ -0,0 +1,18 @@
+"""
+Test configuration. Run from backend/:
+
+    python -m pytest -q tests
+
+Importing the app creates the Supabase clients, which only need the
+variables to be set (nothing is contacted at import time).
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("SUPABASE_URL", "http://localhost")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "test-service-key")
+os.environ.setdefault("GEMINI_API_KEY", "")
@@ -0,0 +1,70 @@
+import time
+import uuid
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import app.db.auth as auth
+
+SECRET = "test-jwt-secret-with-enough-bytes-for-hs256"
+
+
+def _claims(**extra):
+    return {"sub": str(uuid.uuid4()), "aud": "authenticated", "exp": int(time.time()) + 3600, **extra}
+
+
+class _JWKSClient:
+    def __init__(self, signing_key):
+        self.signing_key = signing_key
+
+    def get_signing_key_from_jwt(self, token):
+        return self.signing_key
+
+
+@pytest.fixture
+def rsa_key(monkeypatch):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.PyJWK(jwt.algorithms.RSAAlgorithm.to_jwk(private.public_key(), as_dict=True), "RS256")
+    monkeypatch.setattr(auth, "_jwks_client", _JWKSClient(jwk))
+    return private
+
+
+def test_hs256_uses_the_shared_secret(monkeypatch):
+    monkeypatch.setattr(auth, "JWT_SECRET", SECRET)
+    claims = _claims()
+    assert auth._decode_locally(jwt.encode(claims, SECRET, algorithm="HS256"))["sub"] == claims["sub"]
+
+
+def test_jwks_token_is_verified_with_the_keys_algorithm(rsa_key):
+    claims = _claims()
+    assert auth._decode_locally(jwt.encode(claims, rsa_key, algorithm="RS256"))["sub"] == claims["sub"]
+
+    # Header claims another algorithm than the key's: rejected
+    forged = jwt.encode(claims, rsa_key, algorithm="RS512")
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        auth._decode_locally(forged)
+
+
+def test_jwks_algorithm_outside_the_allow_list_is_rejected(monkeypatch, rsa_key):
+    monkeypatch.setattr(auth, "JWT_ASYMMETRIC_ALGORITHMS", ["ES256"])
+    with pytest.raises(jwt.InvalidAlgorithmError):
+        auth._decode_locally(jwt.encode(_claims(), rsa_key, algorithm="RS256"))
+
+
+def test_remote_verified_user_is_cached_until_token_exp(monkeypatch):
+    cache = auth.TokenCache(max_size=8, ttl_seconds=300)
+    monkeypatch.setattr(auth, "token_cache", cache)
+    monkeypatch.setattr(auth, "JWT_SECRET", None)
+    monkeypatch.setattr(auth, "_verify_remote", lambda token: "remote-user")
+
+    # Local verification fails (no secret), Supabase accepts it
+    exp = int(time.time()) + 60
+    token = jwt.encode(_claims(exp=exp), SECRET, algorithm="HS256")
+    credentials = type("Credentials", (), {"credentials": token})()
+    assert auth.verify_user(credentials) == "remote-user"
+    assert cache.get(token) == "remote-user"
+
+    # Well inside the 300 s TTL, but past the token's exp
+    monkeypatch.setattr(auth.time, "time", lambda: exp + 1)
+    assert cache.get(token) is None
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+import app.services.explainability.backfill as backfill
+
+
+class _Budget:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def try_spend(self):
+        if self.calls <= 0:
+            return False
+        self.calls -= 1
+        return True
+
+
+class _NoCache:
+    async def lookup(self, structured_data, model_id):
+        return None
+
+    async def store(self, structured_data, model_id, text):
+        pass
+
+
+def _prediction(n):
+    return {"id": f"pred-{n}", "tirads": "TR3", "confidence": 0.5,
+            "features": {"composition": {"value": "solid"}, "echogenicity": {"value": f"iso-{n}"}}}
+
+
+@pytest.fixture
+def backfill_run(monkeypatch):
+    monkeypatch.setattr(backfill, "explanation_cache", _NoCache())
+    monkeypatch.setattr(backfill, "BACKFILL_BATCH_SIZE", 2)
+    monkeypatch.setattr(backfill, "log_event", lambda **kwargs: None)
+    written, attempts = [], []
+    monkeypatch.setattr(backfill, "write_explanations", lambda items: written.extend(items) or len(items))
+    monkeypatch.setattr(backfill, "record_attempts", lambda ids: attempts.extend(ids) or len(ids))
+
+    def run(predictions, answer, budget):
+        monkeypatch.setattr(backfill, "fetch_missing_explanations", lambda: predictions)
+        monkeypatch.setattr(backfill, "generate_batch_explanations", answer)
+        return asyncio.run(backfill.run_backfill_once(budget))
+
+    return run, written, attempts
+
+
+def test_failed_and_unanswered_predictions_count_an_attempt(backfill_run):
+    run, written, attempts = backfill_run
+    predictions = [_prediction(n) for n in range(4)]
+
+    calls = []
+
+    async def answer(items):
+        calls.append(items)
+        if len(calls) == 1:
+            raise RuntimeError("bad response")
+        return {"P1": "explained"}   # P2 left unanswered
+
+    summary = run(predictions, answer, _Budget(10))
+
+    assert summary["failed_batches"] == 1 and summary["generated"] == 1
+    assert [item["id"] for item in written] == ["pred-2"]
+    assert sorted(attempts) == ["pred-0", "pred-1", "pred-3"]
+
+
+def test_budget_is_spent_before_each_call(backfill_run):
+    run, written, attempts = backfill_run
+    calls = []
+
+    async def answer(items):
+        calls.append(items)
+        return {label: "explained" for label in items}
+
+    summary = run([_prediction(n) for n in range(4)], answer, _Budget(1))
+
+    assert len(calls) == 1
+    assert summary["stopped"] == "budget_exhausted"
+    # Not attempted (budget) is not a failed attempt
+    assert attempts == []
@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+import pytest
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+import app.services.inference.execution as execution
+import app.services.inference.rescoring as rescoring
+from app.utils.latency import LatencyWindow
+
+
+@pytest.fixture
+def traffic(monkeypatch):
+    window = LatencyWindow(window_seconds=60)
+    monkeypatch.setattr(rescoring, "request_latency", window)
+    return window
+
+
+def test_headroom_gates_on_in_flight_and_p99(traffic):
+    assert rescoring.has_headroom(max_p99_ms=1000, max_in_flight=0)
+
+    traffic.started()
+    assert not rescoring.has_headroom(max_p99_ms=1000, max_in_flight=0)
+    traffic.finished(50)
+    assert rescoring.has_headroom(max_p99_ms=1000, max_in_flight=0)
+
+    traffic.record(5000)
+    assert not rescoring.has_headroom(max_p99_ms=1000, max_in_flight=0)
+
+
+@pytest.fixture
+def interactive_threads(monkeypatch):
+    """Request threads run at 3 torch threads, background passes at 1."""
+    before = torch.get_num_threads()
+    monkeypatch.setattr(execution, "INTERACTIVE_TORCH_THREADS", 3)
+    monkeypatch.setattr(execution, "BACKGROUND_TORCH_THREADS", 1)
+    torch.set_num_threads(3)
+    yield 3
+    torch.set_num_threads(before)
+
+
+def forward_pass_threads() -> int:
+    with execution.inference_context():
+        return torch.get_num_threads()
+
+
+def in_new_thread(fn):
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(fn).result()
+
+
+def test_background_passes_do_not_leak_into_request_threads(interactive_threads):
+    assert rescoring.scoring_executor().submit(forward_pass_threads).result() == 1
+
+    # torch.set_num_threads is inherited by threads started afterwards
+    assert torch.get_num_threads() == interactive_threads
+    assert in_new_thread(torch.get_num_threads) == interactive_threads
+    assert in_new_thread(forward_pass_threads) == interactive_threads
+
+
+def test_interactive_pass_waits_for_a_capped_pass(interactive_threads):
+    inside, release = threading.Event(), threading.Event()
+
+    def background_pass():
+        with execution.inference_context():
+            inside.set()
+            release.wait(5)
+
+    future = rescoring.scoring_executor().submit(background_pass)
+    assert inside.wait(5)
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        interactive = pool.submit(forward_pass_threads)
+        time.sleep(0.2)
+        assert not interactive.done()      # never runs while the count is capped
+        release.set()
+        assert interactive.result(5) == interactive_threads
+    future.result(5)
+
+
+class _Pipeline:
+    PIPELINE_VERSION = "v2"
+
+    def __init__(self, traffic):
+        self.traffic = traffic
+        self.in_flight_at_batch = []
+
+    def score_batch(self, images):
+        self.in_flight_at_batch.append(self.traffic.in_flight)
+        return [{"error": "not a real image"} for _ in images]
+
+
+class _Registry:
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.active = type("Active", (), {"pipeline": pipeline})()
+
+    def lease(self):
+        registry = self
+
+        class Lease:
+            def __enter__(self):
+                return registry.pipeline
+
+            def __exit__(self, *exc):
+                return False
+        return Lease()
+
+
+def test_job_pauses_while_requests_are_in_flight(monkeypatch, traffic):
+    pipeline = _Pipeline(traffic)
+    pages = [[{"id": f"img-{n}", "file_path": f"{n}.jpg"} for n in range(4)], []]
+    monkeypatch.setattr(rescoring, "model_registry", _Registry(pipeline))
+    monkeypatch.setattr(rescoring, "RESCORE_BATCH_SIZE", 2)
+    monkeypatch.setattr(rescoring, "RESCORE_THROTTLE_SECONDS", 0.01)
+    monkeypatch.setattr(rescoring, "load_job", lambda job_id: None)
+    monkeypatch.setattr(rescoring, "save_job", lambda job: None)
+    monkeypatch.setattr(rescoring, "fetch_raw_images_page", lambda after_id: pages[0] if after_id is None else pages[1])
+    monkeypatch.setattr(rescoring, "fetch_scored_ids", lambda ids, version: set())
+    monkeypatch.setattr(rescoring, "download_image", lambda path: b"\xff\xd8 not dicom")
+    monkeypatch.setattr(rescoring, "insert_predictions", lambda records: len(records))
+    monkeypatch.setattr(rescoring, "log_event", lambda **kwargs: None)
+
+    # Interactive load: one request in flight for the first 0.3 s
+    traffic.started()
+    threading.Timer(0.3, traffic.finished, args=(10,)).start()
+
+    start = time.monotonic()
+    job = asyncio.run(rescoring.run_rescoring_job("job-1"))
+
+    assert job["status"] == "completed"
+    assert pipeline.in_flight_at_batch == [0, 0]    # never scored under load
+    assert job["throttled_seconds"] > 0
+    assert time.monotonic() - start >= 0.3
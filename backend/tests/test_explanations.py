@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+import app.services.explainability.llm_client as llm_client
+from app.services.explainability.explanation_cache import ExplanationCache, cache_key, canonical_input
+from app.services.explainability.llm_client import generate_fallback_explanation
+from app.utils.resilience import CircuitBreaker
+
+PIPELINE_FEATURES = {
+    "composition": "Solid",
+    "echogenicity": "Hypoechoic",
+    "shape": "Wider-than-tall",
+    "margin": "Smooth",
+    "echogenic_foci": "None",
+}
+
+STORED_FEATURES = {
+    "clinical_features": {
+        name: {"value": value, "points": 1, "description": "..."}
+        for name, value in PIPELINE_FEATURES.items()
+    },
+    "total_points": 5,
+    "measurements": {"nodule_area_relative": 0.12},
+}
+
+
+def test_fallback_lists_findings():
+    text = generate_fallback_explanation(canonical_input(STORED_FEATURES, 4, 0.81))
+    assert "TI-RADS 4" in text
+    assert "composition is solid" in text
+    assert "echogenicity is hypoechoic" in text
+    assert "margins are smooth" in text
+    assert "standard AC-TIRADS" not in text
+
+
+def test_pipeline_and_stored_shapes_share_a_cache_key():
+    from_pipeline = canonical_input(PIPELINE_FEATURES, 4, 0.81)
+    from_stored = canonical_input(STORED_FEATURES, 4, 0.82)
+    assert from_pipeline == from_stored
+    assert cache_key(from_pipeline, "model") == cache_key(from_stored, "model")
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """One-slot client whose calls take 100 ms, with a fresh breaker and stats."""
+    class Models:
+        async def generate_content(self, **kwargs):
+            await asyncio.sleep(0.1)
+            return type("Response", (), {"text": "LLM explanation"})()
+
+    async def admitted():
+        return None
+
+    monkeypatch.setattr(llm_client, "client", type("Client", (), {"aio": type("Aio", (), {"models": Models()})()})())
+    monkeypatch.setattr(llm_client, "admit_llm_call", admitted)
+    monkeypatch.setattr(llm_client, "LLM_TIMEOUT_SECONDS", 0.2)
+    monkeypatch.setattr(llm_client, "llm_circuit_breaker", CircuitBreaker("test"))
+    monkeypatch.setattr(llm_client, "llm_stats", dict.fromkeys(llm_client.llm_stats, 0))
+    return llm_client
+
+
+def hold_slot(seconds):
+    async def hold():
+        await llm_client.llm_semaphore.acquire()
+        await asyncio.sleep(seconds)
+        llm_client.llm_semaphore.release()
+    return hold()
+
+
+def test_waiting_for_a_slot_is_not_part_of_the_deadline(gemini, monkeypatch):
+    async def main():
+        monkeypatch.setattr(llm_client, "llm_semaphore", asyncio.Semaphore(1))
+        holder = asyncio.create_task(hold_slot(0.15))
+        await asyncio.sleep(0)
+        # 0.15 s queued + 0.1 s call > the 0.2 s deadline - but only the call counts
+        text = await gemini.generate_explanation({"tirads": 4})
+        await holder
+        return text
+
+    assert asyncio.run(main()) == "LLM explanation"
+    assert gemini.llm_circuit_breaker.stats["failures"] == 0
+
+
+def test_no_free_slot_falls_back_without_a_breaker_failure(gemini, monkeypatch):
+    async def main():
+        monkeypatch.setattr(llm_client, "llm_semaphore", asyncio.Semaphore(1))
+        holder = asyncio.create_task(hold_slot(0.5))
+        await asyncio.sleep(0)
+        text = await gemini.generate_explanation({"tirads": 4})
+        await holder
+        return text
+
+    assert "Rule-Based" in asyncio.run(main())
+    assert gemini.llm_stats["fallback_busy"] == 1
+    assert gemini.llm_stats["fallback_timeout"] == 0
+    assert gemini.llm_circuit_breaker.stats["failures"] == 0
+
+
+def test_cache_stats():
+    cache = ExplanationCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache._lru_put(key, "text")
+    assert cache.stats() == {"entries": 2, "max_entries": 2, "inflight": 0}
@@ -0,0 +1,61 @@
+import asyncio
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+import app.services.inference.live as live
+from app.services.inference.live import LiveSession
+
+
+def frame(i):
+    buf = io.BytesIO()
+    Image.fromarray(np.full((64, 80, 3), i, dtype=np.uint8)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+class Detector:
+    input_size = None
+
+    def detect(self, frame):
+        return {
+            "bounding_box": {"xmin": 0, "ymin": 0, "xmax": 80, "ymax": 64},
+            "detector": {"version": "fallback-whole-image"},
+            "score": 0.0,
+        }
+
+
+class Classifier:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def classify(self, crop):
+        self.calls += 1
+        if self.calls > 1:
+            self.release.wait(5)     # a background pass still running
+        return {"feature_results": {}, "features": {}, "tirads_confidences": {f"TIRADS_{self.calls}": 1.0}}
+
+
+def test_frames_are_answered_while_the_classifier_runs(monkeypatch):
+    monkeypatch.setattr(live, "fused_xception_batch", lambda frame, boxes: None)
+    monkeypatch.setattr(live, "calculate_tirads", lambda features: {"total_points": 0, "confidence": 0.0})
+    classifier = Classifier()
+    session = LiveSession(Detector(), classifier)
+
+    async def main():
+        # The first frame waits for a classification; later ones carry it
+        results = [await session.process(frame(seq), seq) for seq in range(1, 6)]
+        assert classifier.calls == 2          # one pass on frame 1, one pending on frame 2
+        classifier.release.set()
+        while session._classification_task is not None:
+            await asyncio.sleep(0.01)
+        results.append(await session.process(frame(6), 6))
+        session.cancel()
+        return results
+
+    results = asyncio.run(main())
+    assert [r["classified_seq"] for r in results] == [1, 1, 1, 1, 1, 2]
+    assert [r["tirads"] for r in results] == [1, 1, 1, 1, 1, 2]
+    assert all(r["bounding_box"]["width"] == 80 for r in results)
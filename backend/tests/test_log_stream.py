@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import app.utils.log_stream as log_stream
+import app.utils.logger as logger
+from app.utils.log_stream import LogBroadcaster
+
+ROW = {"id": "7b0c1c7e-0000-4000-8000-000000000001", "created_at": "2026-10-19T12:00:00.5",
+       "level": "INFO", "action": "INFERENCE_RUN", "metadata": {"inference_time_ms": 120}}
+
+
+class _Query:
+    def __init__(self, rows, inserted=None):
+        self.rows = rows
+        self.inserted = inserted
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def insert(self, payload):
+        self.inserted.append(payload)
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": self.rows})()
+
+
+class _Supabase:
+    def __init__(self, rows, inserted=None):
+        self.rows = rows
+        self.inserted = inserted
+
+    def table(self, name):
+        assert name == "system_logs"
+        return _Query(self.rows, self.inserted)
+
+
+def _received(broadcaster, publish):
+    """Rows a subscriber of `broadcaster` gets when `publish` runs."""
+    async def run():
+        sub = broadcaster.subscribe()
+        publish()
+        rows = []
+        try:
+            while True:
+                rows.append(await sub.get(timeout=0.5))
+        except asyncio.TimeoutError:
+            return rows
+    return asyncio.run(run())
+
+
+def test_notified_row_reaches_subscribers():
+    broadcaster = LogBroadcaster()
+    rows = _received(broadcaster, lambda: broadcaster.publish_notification(json.dumps(ROW)))
+    assert rows == [ROW]
+
+
+def test_truncated_notification_is_read_back(monkeypatch):
+    monkeypatch.setattr(log_stream, "supabase_admin", _Supabase([ROW]))
+    broadcaster = LogBroadcaster()
+    key = {"id": ROW["id"], "created_at": ROW["created_at"], "truncated": True}
+    rows = _received(broadcaster, lambda: broadcaster.publish_notification(json.dumps(key)))
+    assert rows == [ROW]
+
+
+def test_writer_publishes_locally_only_without_db_fanout(monkeypatch):
+    broadcaster = LogBroadcaster()
+    monkeypatch.setattr(logger, "log_broadcaster", broadcaster)
+    monkeypatch.setattr(logger, "supabase_admin", _Supabase([ROW], inserted=[]))
+    monkeypatch.setattr(logger, "LOGGING_ENABLED", True)
+
+    def write():
+        logger.log_event(level="INFO", action="INFERENCE_RUN", actor_role="system")
+
+    assert _received(broadcaster, write) == [ROW]
+
+    # The row comes back through LISTEN/NOTIFY instead - no duplicate
+    broadcaster.db_fanout = True
+    assert _received(broadcaster, write) == []
@@ -0,0 +1,31 @@
+import base64
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.logs import decode_log_cursor, encode_log_cursor
+
+ROW = {"created_at": "2026-10-19T12:00:00.123456+00:00", "id": str(uuid.uuid4())}
+
+
+def _raw_cursor(value: str) -> str:
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    assert decode_log_cursor(encode_log_cursor(ROW)) == (ROW["created_at"], ROW["id"])
+
+
+@pytest.mark.parametrize("raw", [
+    # PostgREST filter injection through either field
+    f'2026-10-19T12:00:00",level.eq."ERROR|{ROW["id"]}',
+    f'{ROW["created_at"]}|{ROW["id"]}"),id.gt.("0',
+    f'yesterday|{ROW["id"]}',
+    f'{ROW["created_at"]}|42',
+    "no separator",
+])
+def test_malformed_cursor_is_a_400(raw):
+    with pytest.raises(HTTPException) as exc:
+        decode_log_cursor(_raw_cursor(raw))
+    assert exc.value.status_code == 400
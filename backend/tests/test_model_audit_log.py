@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+
+import app.api.models as models_api
+import app.utils.logger as logger
+from app.api.models import ModelLoad, _load_models
+
+# system_logs CHECK constraints (supabase_schema.sql)
+ALLOWED_ROLES = {"doctor", "radiologist", "system"}
+ALLOWED_LEVELS = {"INFO", "WARN", "ERROR", "FATAL"}
+
+ADMIN_ID = str(uuid.uuid4())
+
+
+class _Insert:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def insert(self, payload):
+        self.rows.append(payload)
+        return self
+
+    def execute(self):
+        return type("Result", (), {"data": [self.rows[-1]]})()
+
+
+class _Supabase:
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name):
+        assert name == "system_logs"
+        return _Insert(self.rows)
+
+
+class _ModelSet:
+    def describe(self):
+        return {"generation": 1, "pipeline_version": "v2"}
+
+
+class _Registry:
+    last_load = {"status": "activated", "generation": 1}
+
+    def __init__(self, fail: bool):
+        self.fail = fail
+
+    def load(self, **kwargs):
+        if self.fail:
+            raise FileNotFoundError("Weights not found: x.pth")
+        return _ModelSet()
+
+
+@pytest.fixture
+def system_logs(monkeypatch):
+    fake = _Supabase()
+    monkeypatch.setattr(logger, "supabase_admin", fake)
+    monkeypatch.setattr(logger, "LOGGING_ENABLED", True)
+    return fake.rows
+
+
+@pytest.mark.parametrize("fail, action, level", [
+    (False, "MODELS_ACTIVATED", "INFO"),
+    (True, "MODELS_LOAD_FAILED", "ERROR"),
+])
+def test_model_swap_is_audited_with_an_allowed_role(monkeypatch, system_logs, fail, action, level):
+    monkeypatch.setattr(models_api, "model_registry", _Registry(fail))
+    body = ModelLoad(feature_classifier={"path": "x.pth", "version": "xception-v2"})
+
+    _load_models(uuid.uuid4(), ADMIN_ID, body)
+
+    assert len(system_logs) == 1
+    row = system_logs[0]
+    assert row["action"] == action
+    assert row["level"] in ALLOWED_LEVELS and row["level"] == level
+    assert row["actor_role"] in ALLOWED_ROLES
+    assert row["actor_id"] == ADMIN_ID
+    assert row["metadata"]["admin_id"] == ADMIN_ID
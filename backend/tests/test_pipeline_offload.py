@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from app.services.inference.inference_pipeline import InferencePipeline
+
+
+def test_run_keeps_the_event_loop_free(monkeypatch):
+    """Model work runs in the threadpool: other coroutines keep being served."""
+    pipeline = InferencePipeline.__new__(InferencePipeline)
+
+    def score(image_bytes):
+        time.sleep(0.5)   # stands in for detection + classification
+        return {}, {}, {}, None, type("Stages", (), {"status": {}})()
+
+    async def assemble(start_time, class_result, roi_result, final_bounding_box):
+        return {}
+
+    monkeypatch.setattr(pipeline, "_score", score, raising=False)
+    monkeypatch.setattr(pipeline, "_assemble", assemble, raising=False)
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await pipeline.run(b"image")
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(main())
+    assert result == {"processed_image": None, "stages": {}}
+    assert ticks >= 20   # a blocked loop would not tick at all during the run
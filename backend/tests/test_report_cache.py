@@ -0,0 +1,36 @@
+import os
+import time
+
+import app.api.reports as reports
+from app.services.reports.report_cache import ReportCache
+
+PDF = b"%PDF" + b"x" * 96
+
+
+def test_report_cache_evicts_least_recently_used(tmp_path):
+    cache = ReportCache(str(tmp_path), max_bytes=10_000, max_age_seconds=3600, sweep_seconds=3600)
+    for n, prediction_id in enumerate(("p1", "p2", "p3")):
+        cache.put(prediction_id, "v1", PDF)
+        t = time.time() - (300 - n * 100)
+        os.utime(cache._dir(prediction_id), (t, t))
+    assert cache.get("p1", "v1") == PDF
+
+    cache.bound.max_bytes = 250
+    assert cache.bound.sweep()["evicted"] == 1
+    assert cache.get("p2", "v1") is None
+    assert cache.get("p3", "v1") == PDF
+
+
+def test_prerender_runs_for_every_prediction_unless_disabled(monkeypatch):
+    loaded = []
+    monkeypatch.setattr(reports, "load_report_context", lambda prediction_id: loaded.append(prediction_id))
+
+    # Renders every prediction (the fake context then fails and is only logged)
+    monkeypatch.setattr(reports, "REPORT_PRERENDER_ENABLED", True)
+    reports.prerender_report("p1")
+    reports.prerender_report("p2")
+    assert loaded == ["p1", "p2"]
+
+    monkeypatch.setattr(reports, "REPORT_PRERENDER_ENABLED", False)
+    reports.prerender_report("p3")
+    assert loaded == ["p1", "p2"]
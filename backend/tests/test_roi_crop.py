@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from app.services.inference.inference_pipeline import InferencePipeline
+from app.services.preprocessing.decoding import decode_image, scale_box
+from app.services.preprocessing.fused_preprocessing import fused_xception_batch, get_workspace
+
+
+def _large_jpeg(width=3200, height=2400) -> bytes:
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, size=(height // 16, width // 16), dtype=np.uint8)
+    frame = np.kron(pixels, np.ones((16, 16), dtype=np.uint8))   # blocky, survives JPEG
+    buf = io.BytesIO()
+    Image.fromarray(frame).save(buf, format="JPEG", quality=95)
+    return buf.getvalue()
+
+
+def test_crop_uses_full_resolution_when_detection_ran_on_reduced_decode():
+    data = _large_jpeg()
+    reduced = decode_image(data, target_size=(800, 1333))
+    assert reduced.scale > 1
+
+    box = {"xmin": 300.0, "ymin": 200.0, "xmax": 500.0, "ymax": 400.0}   # reduced-frame pixels
+    detection = {"roi_voc": scale_box(box, reduced)}
+
+    crop, decoded = InferencePipeline._roi_crop(data, detection, reduced)
+    crop = crop.copy()
+
+    full = decode_image(data)
+    raw = detection["roi_voc"]
+    fused_xception_batch(full.array, [[raw["xmin"], raw["ymin"], raw["xmax"], raw["ymax"]]])
+    expected = get_workspace().resized_crop()
+
+    assert decoded.scale == 1
+    np.testing.assert_array_equal(crop, expected)
+
+
+def test_crop_reuses_full_scale_frame():
+    data = _large_jpeg(640, 480)
+    decoded = decode_image(data, target_size=(800, 1333))
+    assert decoded.scale == 1
+
+    detection = {"roi_voc": {"xmin": 10.0, "ymin": 20.0, "xmax": 210.0, "ymax": 220.0}}
+    _, reused = InferencePipeline._roi_crop(data, detection, decoded)
+    assert reused is decoded
@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import pytest
+import torch
+
+import app.services.inference.execution as execution
+import app.services.inference.shadow as shadow
+from app.services.inference.shadow import ShadowEvaluator
+from app.utils.latency import LatencyWindow
+
+IMAGE = b"\xff\xd8 not dicom"
+
+
+@pytest.fixture
+def traffic(monkeypatch):
+    window = LatencyWindow(window_seconds=60)
+    monkeypatch.setattr(shadow, "request_latency", window)
+    return window
+
+
+@pytest.fixture
+def evaluator(monkeypatch):
+    evaluator = ShadowEvaluator(fraction=1.0, max_p99_ms=1000, max_in_flight=0)
+    evaluator.release = threading.Event()
+    evaluator.torch_threads = []
+
+    def run(image_bytes, production, prediction_id):
+        with execution.inference_context():      # a candidate forward pass
+            evaluator.torch_threads.append(torch.get_num_threads())
+        evaluator.release.wait(5)
+        evaluator._slot.release()
+
+    monkeypatch.setattr(evaluator, "_run", run)
+    yield evaluator
+    evaluator.release.set()
+
+
+def test_samples_are_dropped_while_requests_are_in_flight(traffic, evaluator):
+    traffic.started()
+    assert evaluator.submit(IMAGE, {}) == "dropped_load"
+    traffic.finished(20)
+
+    traffic.record(5000)    # p99 over budget
+    assert evaluator.submit(IMAGE, {}) == "dropped_load"
+    assert evaluator.counters["dropped_load"] == 2
+    assert evaluator._executor is None
+
+
+@pytest.fixture
+def interactive_threads(monkeypatch):
+    """Request threads run at 3 torch threads, background passes at 1."""
+    before = torch.get_num_threads()
+    monkeypatch.setattr(execution, "INTERACTIVE_TORCH_THREADS", 3)
+    monkeypatch.setattr(execution, "BACKGROUND_TORCH_THREADS", 1)
+    torch.set_num_threads(3)
+    yield 3
+    torch.set_num_threads(before)
+
+
+def test_samples_are_dropped_while_a_shadow_run_is_going(traffic, evaluator, interactive_threads):
+    assert evaluator.submit(IMAGE, {}) == "sampled"
+    assert evaluator.submit(IMAGE, {}) == "dropped_busy"
+
+    evaluator.release.set()
+    evaluator._executor.shutdown(wait=True)
+    assert evaluator.counters["sampled"] == 1 and evaluator.counters["dropped_busy"] == 1
+    # The shadow pass ran capped; request threads started afterwards are not
+    assert evaluator.torch_threads == [1]
+    assert torch.get_num_threads() == interactive_threads
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        assert pool.submit(torch.get_num_threads).result() == interactive_threads
+
+
+def test_failed_shadow_run_is_logged(monkeypatch, traffic):
+    logged = []
+    monkeypatch.setattr(shadow, "log_event", lambda **kwargs: logged.append(kwargs))
+    evaluator = ShadowEvaluator(fraction=1.0)
+    class Registry:
+        def lease(self):
+            return nullcontext()
+
+    monkeypatch.setattr(shadow, "model_registry", Registry())
+    monkeypatch.setattr(evaluator, "_candidate_pipeline", lambda production: 1 / 0)
+
+    evaluator._slot.acquire()
+    evaluator._run(IMAGE, {}, "pred-1")
+
+    assert evaluator.counters["failed"] == 1
+    assert logged[0]["action"] == "SHADOW_EVALUATION_ERROR" and logged[0]["level"] == "WARN"
+    assert logged[0]["resource_id"] == "pred-1"
+    assert isinstance(logged[0]["exception"], ZeroDivisionError)
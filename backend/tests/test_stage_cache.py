@@ -0,0 +1,60 @@
+import os
+import time
+
+from app.services.inference.stage_cache import StageCache
+
+PAYLOAD = b"x" * 100
+
+
+def _cache(tmp_path, **bounds):
+    bounds = {"max_bytes": 10_000, "max_age_seconds": 3600, "sweep_seconds": 3600, **bounds}
+    return StageCache(str(tmp_path), **bounds)
+
+
+def _last_used(cache, key, seconds_ago):
+    t = time.time() - seconds_ago
+    os.utime(cache._entry(key), (t, t))
+
+
+def _keys(cache):
+    return sorted(os.path.basename(entry) for entry in cache._entries())
+
+
+def test_sweep_evicts_least_recently_used_over_budget(tmp_path):
+    cache = _cache(tmp_path)
+    for n, key in enumerate(("aa01", "bb02", "cc03")):
+        cache.put(key, "processed", "v1", PAYLOAD)
+        _last_used(cache, key, 300 - n * 100)
+
+    # A hit makes the oldest entry the most recently used one
+    assert cache.get("aa01", "processed", "v1") == PAYLOAD
+
+    # Lowered after the writes, so no background sweep races the test
+    cache.bound.max_bytes = 250
+    assert cache.bound.sweep() == {"entries": 2, "bytes": 200, "evicted": 1}
+    assert _keys(cache) == ["aa01", "cc03"]
+
+
+def test_sweep_evicts_entries_past_max_age(tmp_path):
+    cache = _cache(tmp_path, max_age_seconds=60)
+    cache.put("aa01", "processed", "v1", PAYLOAD)
+    cache.put("bb02", "processed", "v1", PAYLOAD)
+    _last_used(cache, "aa01", 120)
+
+    assert cache.bound.sweep()["evicted"] == 1
+    assert _keys(cache) == ["bb02"]
+
+
+def test_writes_keep_the_cache_bounded(tmp_path):
+    cache = _cache(tmp_path, max_bytes=500)
+    for n in range(20):
+        cache.put(f"{n:04x}", "processed", "v1", PAYLOAD)
+        _last_used(cache, f"{n:04x}", 1000 - n)
+
+        # Sweeps run in the background: wait for the one this write started
+        deadline = time.time() + 5
+        while cache.bound._sweeping.locked() and time.time() < deadline:
+            time.sleep(0.01)
+
+    assert len(_keys(cache)) <= 5
+    assert "0013" in _keys(cache)   # the newest entry survives
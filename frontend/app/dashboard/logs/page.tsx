@@ -31,6 +31,9 @@ export default function SystemLogsPage() {
   );
   const [selectedLog, setSelectedLog] = useState<SystemLog | null>(null);
   const [currentPage, setCurrentPage] = useState(1);
+  // Keyset cursors: pageCursors[n] is the cursor that loads page n + 1
+  const [pageCursors, setPageCursors] = useState<(string | null)[]>([null]);
+  const [hasMore, setHasMore] = useState(false);
   const [filters, setFilters] = useState<LogFilters>({
     level: "ALL",
     action: "ALL",
@@ -66,11 +69,13 @@ export default function SystemLogsPage() {
   const fetchLogs = async (page: number, currentFilters: LogFilters) => {
     setIsLoading(true);
     try {
-      const offset = (page - 1) * ITEMS_PER_PAGE;
+      const cursor = page > 1 ? pageCursors[page - 1] : null;
       const queryParams = new URLSearchParams({
         limit: ITEMS_PER_PAGE.toString(),
-        offset: offset.toString(),
       });
+      if (cursor) queryParams.append("cursor", cursor);
+      // Approximate total only for the first page
+      if (page === 1) queryParams.append("count", "true");
 
       if (currentFilters.level !== "ALL")
         queryParams.append("level", currentFilters.level);
@@ -86,7 +91,14 @@ export default function SystemLogsPage() {
       const data = await response.json();
 
       setAllLogs(data.logs || []);
-      setTotalLogs(data.total || 0);
+      if (data.total !== null && data.total !== undefined)
+        setTotalLogs(data.total);
+      setHasMore(!!data.has_more);
+      setPageCursors((prev) => {
+        const next = prev.slice(0, page);
+        next[page] = data.next_cursor ?? null;
+        return next;
+      });
     } catch (error) {
       toast.error("Failed to fetch logs");
     } finally {
@@ -100,6 +112,33 @@ export default function SystemLogsPage() {
     }
   }, [currentPage, filters, isLoggingEnabled]);
 
+  // Live tail: newest page is kept current over SSE instead of re-polling
+  useEffect(() => {
+    if (!isLoggingEnabled || currentPage !== 1) return;
+
+    const backendUrl =
+      process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:8000";
+    const params = new URLSearchParams();
+    if (filters.level !== "ALL") params.append("level", filters.level);
+    if (filters.action !== "ALL") params.append("action", filters.action);
+
+    // EventSource reconnects on its own and resumes via Last-Event-ID
+    const source = new EventSource(
+      `${backendUrl}/api/logs/stream?${params.toString()}`,
+    );
+    source.addEventListener("log", (event) => {
+      const log: SystemLog = JSON.parse((event as MessageEvent).data);
+      setAllLogs((prev) =>
+        prev.some((l) => l.id === log.id)
+          ? prev
+          : [log, ...prev].slice(0, ITEMS_PER_PAGE),
+      );
+      setTotalLogs((prev) => prev + 1);
+    });
+
+    return () => source.close();
+  }, [isLoggingEnabled, currentPage, filters.level, filters.action]);
+
   const handleRefresh = () => {
     fetchLogs(currentPage, filters);
     toast.success("Logs refreshed from server");
@@ -113,6 +152,7 @@ export default function SystemLogsPage() {
       startDate: undefined,
       endDate: undefined,
     });
+    setPageCursors([null]);
     setCurrentPage(1);
   };
 
@@ -180,7 +220,10 @@ export default function SystemLogsPage() {
     );
   }
 
-  const totalPages = Math.max(1, Math.ceil(totalLogs / ITEMS_PER_PAGE));
+  // Total is approximate - the cursor chain decides whether a next page exists
+  const totalPages = hasMore
+    ? Math.max(currentPage + 1, Math.ceil(totalLogs / ITEMS_PER_PAGE))
+    : currentPage;
 
   return (
     <div className="container mx-auto py-8 px-4 md:px-6 max-w-7xl animate-in fade-in duration-500">
@@ -272,6 +315,7 @@ export default function SystemLogsPage() {
         filters={filters}
         onFilterChange={(f) => {
           setFilters(f);
+          setPageCursors([null]);
           setCurrentPage(1);
         }}
         onClearFilters={clearFilters}
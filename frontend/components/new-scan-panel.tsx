@@ -213,45 +213,22 @@ export default function NewScanPanel({
         setCreatedPatientId(patientId);
       }
 
-      // 2. Upload Image
+      // 2. Upload Image + Trigger Inference (single round trip)
       const imageFormData = new FormData();
       imageFormData.append("patient_id", patientId as string);
       imageFormData.append("file", imageFile!);
 
-      const imageResponse = await fetch(`${backendUrl}/images/upload-raw`, {
-        method: "POST",
-        headers: { Authorization: `Bearer ${token}` },
-        body: imageFormData,
-      });
-
-      if (!imageResponse.ok) {
-        const err = await imageResponse.json();
-        const detail =
-          typeof err.detail === "string"
-            ? err.detail
-            : JSON.stringify(err.detail);
-        throw new Error(
-          `Profile created, but image upload failed: ${
-            detail || imageResponse.statusText
-          }`,
-        );
-      }
-
-      const imageData = await imageResponse.json();
-      const imageId = imageData.image_id;
-
-      // 3. Trigger Inference
       toast.info("Starting AI Analysis...", {
         icon: <Loader2 className="h-4 w-4 animate-spin" />,
       });
-      const inferenceResponse = await fetch(`${backendUrl}/inference/run`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
+      const inferenceResponse = await fetch(
+        `${backendUrl}/inference/upload-and-run`,
+        {
+          method: "POST",
+          headers: { Authorization: `Bearer ${token}` },
+          body: imageFormData,
         },
-        body: JSON.stringify({ image_id: imageId }),
-      });
+      );
 
       if (!inferenceResponse.ok) {
         const err = await inferenceResponse.json();
@@ -260,14 +237,16 @@ export default function NewScanPanel({
             ? err.detail
             : JSON.stringify(err.detail);
         throw new Error(
-          `Upload success, but AI analysis failed: ${detail || "Unknown error"}`,
+          `Profile created, but image upload or AI analysis failed: ${
+            detail || inferenceResponse.statusText
+          }`,
         );
       }
 
       const inferenceData = await inferenceResponse.json();
       const predictionId = inferenceData.prediction.id;
 
-      // 4. Trigger Explanation (Gemini or Fallback based on user choice)
+      // 3. Trigger Explanation (Gemini or Fallback based on user choice)
       toast.info(
         useLlm ? "Generating AI Explanation..." : "Finalizing results...",
         {